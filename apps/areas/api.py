@@ -2,10 +2,10 @@ from drf_spectacular.utils import (
     extend_schema,
 )
 
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.filters import (
-    SearchFilter,
     OrderingFilter,
 )
 
@@ -13,25 +13,35 @@ from django_filters import rest_framework
 
 from utils.response_patterns import (
     generate_response,
+    get_conditional_response,
+    set_validators,
 )
 
 from areas.doc import (
     DefaultAreaResponse,
     AreaList200Response,
     Area200Response,
+    AreaCacheStats200Response,
     area_list_parameters,
 )
-from areas.filters import AreaFilter
+from areas.filters import (
+    AreaFilter,
+    AreaSearchFilter,
+)
+from areas.pagination import AreaCursorPagination
 from areas.services import (
     get_areas,
     get_area,
+    get_areas_validators,
+    get_area_validators,
+    get_cache_stats,
 )
 
 
 class AreaListView(APIView):
 
     filter_backends = [
-        SearchFilter,
+        AreaSearchFilter,
         OrderingFilter,
         rest_framework.DjangoFilterBackend,
     ]
@@ -50,17 +60,31 @@ class AreaListView(APIView):
         'length',
     ]
     filterset_class = AreaFilter
+    pagination_class = AreaCursorPagination
 
     @extend_schema(
         parameters=area_list_parameters,
         responses={
             200: AreaList200Response,
+            304: None,
+            400: DefaultAreaResponse,
             500: DefaultAreaResponse,
+            503: DefaultAreaResponse,
         },
         description=AreaList200Response.__doc__,
         summary='Получение списка всех площадок',
     )
     def get(self, request):
+        _, validators = get_areas_validators(
+            query_params=request.query_params,
+        )
+        response = get_conditional_response(
+            request=request,
+            validators=validators,
+        )
+        if response is not None:
+            return response
+
         status_code, response_data = get_areas(
             request=request,
             filter_backends=self.filter_backends,
@@ -70,16 +94,23 @@ class AreaListView(APIView):
             status_code=status_code,
             data=response_data,
         )
-        return Response(
+        response = Response(
             status=status,
             data=data,
         )
+        if status_code == 200:
+            set_validators(
+                response=response,
+                validators=validators,
+            )
+        return response
 
 
 class AreaView(APIView):
     @extend_schema(
         responses={
             200: Area200Response,
+            304: None,
             404: DefaultAreaResponse,
             500: DefaultAreaResponse,
         },
@@ -87,6 +118,16 @@ class AreaView(APIView):
         summary='Получение площадки по pk',
     )
     def get(self, request, pk):
+        _, validators = get_area_validators(
+            pk=pk,
+        )
+        response = get_conditional_response(
+            request=request,
+            validators=validators,
+        )
+        if response is not None:
+            return response
+
         status_code, response_data = get_area(
             pk=pk,
         )
@@ -94,6 +135,36 @@ class AreaView(APIView):
             status_code=status_code,
             data=response_data,
         )
+        response = Response(
+            status=status,
+            data=data,
+        )
+        if status_code == 200:
+            set_validators(
+                response=response,
+                validators=validators,
+            )
+        return response
+
+
+class AreaCacheStatsView(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        responses={
+            200: AreaCacheStats200Response,
+            500: DefaultAreaResponse,
+        },
+        description=AreaCacheStats200Response.__doc__,
+        summary='Получение статистики кэша площадок',
+    )
+    def get(self, request):
+        status_code, response_data = get_cache_stats()
+        status, data = generate_response(
+            status_code=status_code,
+            data=response_data,
+        )
         return Response(
             status=status,
             data=data,
@@ -5,3 +5,6 @@ class AreasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'areas'
     verbose_name = 'Площадки'
+
+    def ready(self):
+        import areas.signals  # noqa: F401
@@ -0,0 +1,208 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.http import QueryDict
+
+from utils import redis_cache
+from utils.logger import (
+    StructuredMessage,
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+GENERATION_KEY = 'areas_generation'
+LAST_MODIFIED_KEY = 'areas_last_modified'
+STATS_KEY = 'areas_cache_stats'
+CACHE_TIMEOUT = 60*60
+UNCACHED_PARAMS = (
+    'available_from',
+    'available_to',
+)
+
+
+def get_state() -> (int | None, float | None):
+    '''
+    Получение текущего поколения кэша площадок и времени
+    последнего изменения площадок
+
+    Если поколения еще нет (например, после очистки redis), оно
+    начинается с текущего времени, чтобы не повторить уже выданные ETag
+
+    Returns:
+        Номер поколения и timestamp изменения
+        или None, если redis недоступен
+    '''
+
+    status, values = redis_cache.get_many(
+        keys=[GENERATION_KEY, LAST_MODIFIED_KEY],
+    )
+    if status != 200:
+        return None, None
+
+    generation, last_modified = values
+
+    if generation is redis_cache.MISSING:
+        redis_cache.add_key(
+            key=GENERATION_KEY,
+            data=int(time.time()),
+        )
+        status, generation = redis_cache.get(
+            key=GENERATION_KEY,
+        )
+        if status != 200 or generation is None:
+            return None, None
+
+    if last_modified is redis_cache.MISSING:
+        last_modified = None
+    return generation, last_modified
+
+
+def get_generation() -> int | None:
+    '''
+    Получение текущего поколения кэша площадок
+
+    Returns:
+        Номер поколения или None, если redis недоступен
+    '''
+
+    generation, _ = get_state()
+    return generation
+
+
+def bump_generation() -> None:
+    '''
+    Инвалидация всего кэша площадок увеличением поколения
+    '''
+
+    redis_cache.incr(
+        key=GENERATION_KEY,
+    )
+    redis_cache.set_key(
+        key=LAST_MODIFIED_KEY,
+        data=time.time(),
+    )
+
+
+def get_params_hash(query_params: QueryDict) -> str:
+    '''
+    Получение хэша параметров запроса без учета их порядка
+
+    Args:
+        query_params: параметры запроса
+
+    Returns:
+        md5 от отсортированных параметров
+    '''
+
+    params = urlencode(
+        sorted(
+            (key, sorted(values))
+            for key, values in query_params.lists()
+        ),
+        doseq=True,
+    )
+    return hashlib.md5(params.encode()).hexdigest()
+
+
+def is_cacheable(query_params: QueryDict) -> bool:
+    return not any(param in query_params for param in UNCACHED_PARAMS)
+
+
+def get_list_key(query_params: QueryDict) -> str | None:
+    '''
+    Получение ключа кэша списка площадок
+
+    Args:
+        query_params: параметры запроса
+            (поиск, сортировка, фильтры, страница)
+
+    Returns:
+        Ключ или None, если ответ нельзя кэшировать
+    '''
+
+    if not is_cacheable(query_params=query_params):
+        return None
+
+    generation = get_generation()
+    if generation is None:
+        return None
+
+    params_hash = get_params_hash(query_params=query_params)
+    return f'areas_{generation}_list_{params_hash}'
+
+
+def get_detail_key(pk: int) -> str | None:
+    '''
+    Получение ключа кэша площадки
+
+    Args:
+        pk: pk площадки
+
+    Returns:
+        Ключ или None, если ответ нельзя кэшировать
+    '''
+
+    generation = get_generation()
+    if generation is None:
+        return None
+    return f'areas_{generation}_detail_{pk}'
+
+
+def record_hit() -> None:
+    redis_cache.add_stats(
+        key=STATS_KEY,
+        mapping={
+            'hits': 1,
+        },
+    )
+
+
+def record_fill(fill_time: float) -> None:
+    logger.info(
+        msg=StructuredMessage(
+            'Кэш площадок заполнен',
+            duration=fill_time,
+        ),
+    )
+    redis_cache.add_stats(
+        key=STATS_KEY,
+        mapping={
+            'misses': 1,
+            'fill_time': fill_time,
+        },
+    )
+
+
+def get_stats() -> (int, dict):
+    '''
+    Получение статистики кэша площадок
+
+    Returns:
+        Код статуса и словарь данных
+        200,
+        {
+            "hits": 950,
+            "misses": 50,
+            "hit_ratio": 0.95,
+            "fill_time_avg": 0.012
+        }
+    '''
+
+    status, stats = redis_cache.get_stats(
+        key=STATS_KEY,
+    )
+    if status != 200:
+        return status, {}
+
+    hits = stats.get('hits', 0)
+    misses = stats.get('misses', 0)
+    total = hits + misses
+    return 200, {
+        'hits': int(hits),
+        'misses': int(misses),
+        'hit_ratio': hits / total if total else 0,
+        'fill_time_avg': stats.get('fill_time', 0) / misses if misses else 0,
+    }
@@ -16,11 +16,15 @@ class AreaList200Response(DefaultAreaResponse):
     '''
     Получение списка всех площадок, поиск, фильтрация по параметрам
 
+    Список отдается страницами, для получения следующей страницы
+    значение next передается в параметре cursor
+
     '''
 
     data = serializers.JSONField(
-        default=[
-            [
+        default={
+            "next": "WyIyMDI0LTA3LTE5VDEyOjQwOjEwLjQyOFoiLCAzXQ==",
+            "results": [
                 {
                     "pk": 1,
                     "name": "Test",
@@ -47,7 +51,7 @@ class AreaList200Response(DefaultAreaResponse):
                     ]
                 },
             ]
-        ]
+        }
     )
 
 
@@ -91,7 +95,9 @@ class Area200Response(DefaultAreaResponse):
 area_list_parameters = [
     OpenApiParameter(
         name='search',
-        description='Название площадки',
+        description='Поиск по названию, адресу и описанию площадки '
+                    '(с учетом опечаток в названии, результаты '
+                    'сортируются по релевантности)',
         required=False,
         type=OpenApiTypes.STR
     ),
@@ -119,4 +125,53 @@ area_list_parameters = [
         required=False,
         type=OpenApiTypes.INT
     ),
+    OpenApiParameter(
+        name='available_from',
+        description='Свободна с даты',
+        required=False,
+        type=OpenApiTypes.DATE
+    ),
+    OpenApiParameter(
+        name='available_to',
+        description='Свободна по дату',
+        required=False,
+        type=OpenApiTypes.DATE
+    ),
+    OpenApiParameter(
+        name='ordering',
+        description='Сортировка: price, created_at, capacity (с "-" по убыванию)',
+        required=False,
+        type=OpenApiTypes.STR
+    ),
+    OpenApiParameter(
+        name='cursor',
+        description='Курсор следующей страницы (значение next)',
+        required=False,
+        type=OpenApiTypes.STR
+    ),
+    OpenApiParameter(
+        name='page_size',
+        description='Размер страницы (не больше 100)',
+        required=False,
+        type=OpenApiTypes.INT
+    ),
 ]
+
+
+class AreaCacheStats200Response(DefaultAreaResponse):
+    '''
+    Статистика кэша списка и деталей площадок, доступна администраторам
+
+    hit_ratio - доля запросов, отданных из кэша, fill_time_avg - среднее
+    время заполнения кэша при промахе в секундах
+
+    '''
+
+    data = serializers.JSONField(
+        default={
+            "hits": 950,
+            "misses": 50,
+            "hit_ratio": 0.95,
+            "fill_time_avg": 0.012
+        }
+    )
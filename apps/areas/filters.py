@@ -1,9 +1,92 @@
+from datetime import (
+    datetime,
+    time,
+)
+
 import django_filters
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import (
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+)
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django_filters.widgets import DateRangeWidget
+
+from rest_framework.exceptions import (
+    APIException,
+    ValidationError,
+)
+from rest_framework.filters import SearchFilter
 
 from areas.models import Area
+from bookings.models import BookingArea
+from bookings.services import get_areas_booking_temporary
+
+from utils.constants import SEARCH_CONFIG
+from utils.logger import (
+    StructuredMessage,
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+
+class AreaSearchFilter(SearchFilter):
+    '''
+    Полнотекстовый и нечеткий поиск площадок
+
+    Запрос ищется по search_vector (наименование, адрес и описание без
+    разметки) и по триграммам наименования, оба условия покрыты
+    GIN-индексами. Найденные площадки получают аннотацию rank,
+    по которой пагинация сортирует их, если сортировка не задана.
+    rank приводится к double precision, чтобы значение в курсоре
+    совпадало с вычисленным в базе
+    '''
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        term = ' '.join(terms)
+        query = SearchQuery(
+            term,
+            config=SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        return queryset.filter(
+            Q(search_vector=query) | Q(name__trigram_similar=term),
+        ).annotate(
+            rank=Cast(
+                SearchRank(F('search_vector'), query) + TrigramSimilarity('name', term),
+                output_field=FloatField(),
+            ),
+        )
+
+
+class TemporaryBookingsUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Не удалось получить временные брони площадок'
+
+
+class PeriodWidget(DateRangeWidget):
+    suffixes = ['from', 'to']
 
 
 class AreaFilter(django_filters.FilterSet):
+    available = django_filters.DateFromToRangeFilter(
+        method='filter_available',
+        widget=PeriodWidget,
+    )
 
     class Meta:
         model = Area
@@ -13,3 +96,51 @@ class AreaFilter(django_filters.FilterSet):
             'width': ['lte', 'gte'],
             'length': ['lte', 'gte'],
         }
+
+    def filter_available(self, queryset, name, value):
+        '''
+        Исключение площадок, занятых на период
+
+        Период задается обоими параметрами available_from и available_to.
+        Если временные брони не удалось получить, запрос завершается
+        ошибкой 503, а не возвращает занятые площадки как свободные
+        '''
+
+        if not value.start or not value.stop:
+            raise ValidationError({
+                'available': 'Нужно указать оба параметра available_from и available_to',
+            })
+
+        default_time = time(12, 0)
+        start_date = timezone.make_aware(datetime.combine(value.start.date(), default_time))
+        end_date = timezone.make_aware(datetime.combine(value.stop.date(), default_time))
+
+        queryset = queryset.filter(
+            ~Exists(
+                BookingArea.objects.filter(
+                    area=OuterRef('pk'),
+                ).overlapping(
+                    booked_from=start_date,
+                    booked_to=end_date,
+                ),
+            ),
+        )
+
+        status, area_pks = get_areas_booking_temporary(
+            start_date=start_date,
+            end_date=end_date,
+        )
+        if status != 200:
+            logger.error(
+                msg=StructuredMessage(
+                    'Не удалось исключить площадки с временными бронями',
+                    start_date=start_date,
+                    end_date=end_date,
+                    status=503,
+                ),
+            )
+            raise TemporaryBookingsUnavailable()
+
+        return queryset.exclude(
+            pk__in=area_pks,
+        )
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-18 07:28
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+SEARCH_VECTOR_TRIGGER = '''
+CREATE FUNCTION areas_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.address, '')), 'B') ||
+        setweight(to_tsvector('russian', regexp_replace(
+            coalesce(NEW.description, ''), '<[^>]*>|&[a-z0-9#]+;', ' ', 'gi'
+        )), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER areas_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, address, description ON areas
+    FOR EACH ROW EXECUTE FUNCTION areas_search_vector_update();
+
+UPDATE areas SET name = name;
+'''
+
+DROP_SEARCH_VECTOR_TRIGGER = '''
+DROP TRIGGER IF EXISTS areas_search_vector_trigger ON areas;
+DROP FUNCTION IF EXISTS areas_search_vector_update();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0007_area_updated_at_contact_updated_at_photo_updated_at'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='area',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='area',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='areas_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='area',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass('name', name='gin_trgm_ops'), name='areas_name_trgm_idx'),
+        ),
+        migrations.RunSQL(
+            sql=SEARCH_VECTOR_TRIGGER,
+            reverse_sql=DROP_SEARCH_VECTOR_TRIGGER,
+        ),
+    ]
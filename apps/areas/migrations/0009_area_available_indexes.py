@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0008_area_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='area',
+            index=models.Index(condition=models.Q(('available', True)), fields=['created_at', 'id'], name='areas_available_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='area',
+            index=models.Index(condition=models.Q(('available', True)), fields=['price', 'id'], name='areas_available_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='area',
+            index=models.Index(condition=models.Q(('available', True)), fields=['capacity', 'id'], name='areas_available_capacity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='area',
+            index=models.Index(condition=models.Q(('available', True)), fields=['width'], name='areas_available_width_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='area',
+            index=models.Index(condition=models.Q(('available', True)), fields=['length'], name='areas_available_length_idx'),
+        ),
+    ]
@@ -1,3 +1,8 @@
+from django.contrib.postgres.indexes import (
+    GinIndex,
+    OpClass,
+)
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from django_ckeditor_5.fields import CKEditor5Field
@@ -41,6 +46,15 @@ class Area(models.Model):
         verbose_name='Дата размещения',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
 
     def __str__(self):
         return self.name
@@ -50,6 +64,41 @@ class Area(models.Model):
         db_table = 'areas'
         verbose_name = 'Площадка'
         verbose_name_plural = 'Площадки'
+        indexes = [
+            models.Index(
+                name='areas_available_created_idx',
+                fields=['created_at', 'id'],
+                condition=models.Q(available=True),
+            ),
+            models.Index(
+                name='areas_available_price_idx',
+                fields=['price', 'id'],
+                condition=models.Q(available=True),
+            ),
+            models.Index(
+                name='areas_available_capacity_idx',
+                fields=['capacity', 'id'],
+                condition=models.Q(available=True),
+            ),
+            models.Index(
+                name='areas_available_width_idx',
+                fields=['width'],
+                condition=models.Q(available=True),
+            ),
+            models.Index(
+                name='areas_available_length_idx',
+                fields=['length'],
+                condition=models.Q(available=True),
+            ),
+            GinIndex(
+                name='areas_search_vector_idx',
+                fields=['search_vector'],
+            ),
+            GinIndex(
+                OpClass('name', name='gin_trgm_ops'),
+                name='areas_name_trgm_idx',
+            ),
+        ]
 
 
 class Contact(models.Model):
@@ -71,6 +120,10 @@ class Contact(models.Model):
         verbose_name='Дата размещения',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         db_table = 'area_contacts'
@@ -97,6 +150,10 @@ class Photo(models.Model):
         verbose_name='Дата размещения',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         db_table = 'area_photos'
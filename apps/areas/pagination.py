@@ -0,0 +1,184 @@
+import json
+from base64 import (
+    urlsafe_b64decode,
+    urlsafe_b64encode,
+)
+from typing import Any
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import (
+    Field,
+    Q,
+    QuerySet,
+)
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+
+
+class AreaCursorPagination(BasePagination):
+    '''
+    Keyset-пагинация списка площадок
+
+    Страница выбирается условием по значениям полей сортировки
+    последней записи предыдущей страницы и pk, поэтому время ответа
+    не зависит от номера страницы и размера каталога
+    '''
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 20
+    max_page_size = 100
+    default_ordering = ['-created_at']
+    search_ordering = ['-rank']
+
+    def get_ordering(self, request: Any, queryset: QuerySet, view: Any) -> list:
+        '''
+        Получение полей сортировки с pk в конце
+
+        Без параметра ordering результаты поиска сортируются
+        по релевантности, остальные списки - по дате размещения
+
+        Returns:
+            Список полей
+            ["-price", "-pk"]
+        '''
+
+        default_ordering = self.default_ordering
+        if 'rank' in queryset.query.annotations:
+            default_ordering = self.search_ordering
+
+        ordering = OrderingFilter().get_ordering(
+            request=request,
+            queryset=queryset,
+            view=view,
+        ) or default_ordering
+        ordering = [
+            field for field in ordering
+            if field.lstrip('-') != 'pk'
+        ] or default_ordering
+        descending = ordering[-1].startswith('-')
+        return [*ordering, '-pk' if descending else 'pk']
+
+    def get_page_size(self, request: Any) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering_field(self, queryset: QuerySet, name: str) -> Field:
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request: Any, queryset: QuerySet, ordering: list) -> list | None:
+        '''
+        Получение позиции из курсора
+
+        Значения приводятся к типам полей сортировки, чтобы курсор
+        с неверными типами давал 400, а не ошибку при выполнении запроса
+
+        Returns:
+            Список значений полей сортировки или None, если курсора нет
+            [Decimal("1000.00"), 5]
+        '''
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise ValidationError('Невалидный курсор')
+
+        if not isinstance(position, list) or len(position) != len(ordering):
+            raise ValidationError('Невалидный курсор')
+
+        values = []
+        for field, value in zip(ordering, position):
+            model_field = self.get_ordering_field(
+                queryset=queryset,
+                name=field.lstrip('-'),
+            )
+            try:
+                value = model_field.to_python(value)
+            except (DjangoValidationError, ValueError, TypeError):
+                raise ValidationError('Невалидный курсор')
+            if value is None:
+                raise ValidationError('Невалидный курсор')
+            values.append(value)
+        return values
+
+    def encode_cursor(self, position: list) -> str:
+        data = json.dumps(position, default=str)
+        return urlsafe_b64encode(data.encode()).decode()
+
+    def get_position_filter(self, ordering: list, position: list) -> Q:
+        '''
+        Получение условия для записей после позиции курсора
+
+        Для сортировки ["-price", "-pk"] и позиции [1000, 5]:
+        price <= 1000 AND (price < 1000 OR (price = 1000 AND pk < 5))
+        '''
+
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': position[0]}) & condition
+
+    def paginate_queryset(self, queryset: QuerySet, request: Any, view: Any = None) -> list:
+        ordering = self.get_ordering(
+            request=request,
+            queryset=queryset,
+            view=view,
+        )
+        page_size = self.get_page_size(request=request)
+        position = self.decode_cursor(
+            request=request,
+            queryset=queryset,
+            ordering=ordering,
+        )
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(
+                    ordering=ordering,
+                    position=position,
+                ),
+            )
+
+        results = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            self.next_cursor = self.encode_cursor(
+                position=[
+                    getattr(last, field.lstrip('-'))
+                    for field in ordering
+                ],
+            )
+        return results
+
+    def get_paginated_response_data(self, data: list) -> dict:
+        return {
+            'next': self.next_cursor,
+            'results': data,
+        }
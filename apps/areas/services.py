@@ -1,61 +1,102 @@
+import time
 from typing import Any
 
+from rest_framework.exceptions import (
+    APIException,
+    ValidationError,
+)
+
+from areas import cache
 from areas.models import Area
 from areas.serializers import AreaSerializer
 
-from utils.logger import get_logger
+from utils import redis_cache
+from utils.logger import (
+    StructuredMessage,
+    get_logger,
+)
 
 
 logger = get_logger(__name__)
 
 
-def get_areas(request: Any, filter_backends: list, view: Any) -> (int, list):
+def get_areas(request: Any, filter_backends: list, view: Any) -> (int, dict):
     '''
     Получение списка всех площадок
 
     Returns:
-        Код статуса и список данных
+        Код статуса и словарь данных
         200,
-        [
-            {
-                "pk": 1,
-                "name": "Test",
-                "description": "<p>description</p>",
-                "address": "address",
-                "price": "1000",
-                "capacity": 1000,
-                "width": 200,
-                "length": 100,
-                "contacts": [
-                    {
-                        "contact": "88005553535",
-                        "contact_type": "Phone"
-                    },
-                    {
-                        "contact": "test3@cc.com",
-                        "contact_type": "Email"
-                    },
-                ],
-                "photos": [
+        {
+            "next": "WyIyMDI0LTA3LTE5VDEyOjQwOjEwLjQyOFoiLCAzXQ==",
+            "results": [
                 {
-                    "photo": "/media/photos/test.jpeg"
-                }
+                    "pk": 1,
+                    "name": "Test",
+                    "description": "<p>description</p>",
+                    "address": "address",
+                    "price": "1000",
+                    "capacity": 1000,
+                    "width": 200,
+                    "length": 100,
+                    "contacts": [
+                        {
+                            "contact": "88005553535",
+                            "contact_type": "Phone"
+                        },
+                        {
+                            "contact": "test3@cc.com",
+                            "contact_type": "Email"
+                        },
+                    ],
+                    "photos": [
+                        {
+                            "photo": "/media/photos/test.jpeg"
+                        }
+                    ]
+                },
             ]
-            },
-        ]
+        }
     '''
 
     logger.info(
-        msg='Получение списка всех площадок',
+        msg=StructuredMessage(
+            'Получение списка всех площадок',
+            query_params=request.query_params.urlencode(),
+        ),
+    )
+
+    cache_key = cache.get_list_key(
+        query_params=request.query_params,
     )
+    if cache_key is not None:
+        status, response_data = redis_cache.get(
+            key=cache_key,
+        )
+        if status == 200 and response_data is not None:
+            cache.record_hit()
+            logger.info(
+                msg=StructuredMessage(
+                    'Список всех площадок получен из кэша',
+                    status=200,
+                ),
+            )
+            return 200, response_data
 
+    started = time.monotonic()
     try:
         areas = Area.objects.filter(
             available=True,
+        ).defer(
+            'search_vector',
         ).prefetch_related('contacts', 'photos')
     except Exception as exc:
         logger.error(
-            msg=f'Не удалось получить список всех площадок: {exc}',
+            msg=StructuredMessage(
+                'Не удалось получить список всех площадок',
+                status=500,
+                error=exc,
+            ),
         )
         return 500, {}
 
@@ -67,21 +108,156 @@ def get_areas(request: Any, filter_backends: list, view: Any) -> (int, list):
                     queryset=areas,
                     view=view,
                 )
+            except APIException as exc:
+                logger.error(
+                    msg=StructuredMessage(
+                        'Не удалось получить список всех площадок по фильтрам',
+                        backend=backend.__name__,
+                        status=exc.status_code,
+                        error=exc,
+                    ),
+                )
+                return exc.status_code, {}
             except Exception as exc:
                 logger.info(
-                    msg=f'Не удалось получить список всех площадок по фильтрам: {exc}',
+                    msg=StructuredMessage(
+                        'Не удалось получить список всех площадок по фильтрам',
+                        backend=backend.__name__,
+                        error=exc,
+                    ),
                 )
 
-    response_data = AreaSerializer(
-        instance=areas,
-        many=True,
-    ).data
+    paginator = view.pagination_class()
+    try:
+        areas = paginator.paginate_queryset(
+            queryset=areas,
+            request=request,
+            view=view,
+        )
+    except ValidationError as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Невалидные параметры пагинации списка площадок',
+                status=400,
+                error=exc,
+            ),
+        )
+        return 400, {}
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось получить список всех площадок',
+                status=500,
+                error=exc,
+            ),
+        )
+        return 500, {}
+
+    response_data = paginator.get_paginated_response_data(
+        data=AreaSerializer(
+            instance=areas,
+            many=True,
+        ).data,
+    )
+    if cache_key is not None:
+        redis_cache.set_key(
+            key=cache_key,
+            data=response_data,
+            time=cache.CACHE_TIMEOUT,
+        )
+        cache.record_fill(
+            fill_time=time.monotonic() - started,
+        )
+
     logger.info(
-        msg='Список всех площадок получен',
+        msg=StructuredMessage(
+            'Список всех площадок получен',
+            status=200,
+            count=len(response_data['results']),
+            duration=time.monotonic() - started,
+        ),
     )
     return 200, response_data
 
 
+def get_areas_validators(query_params: Any) -> (int, dict):
+    '''
+    Получение валидаторов списка площадок для условного запроса
+
+    ETag строится из поколения кэша площадок и параметров запроса,
+    поэтому проверка не требует запросов в базу
+
+    Args:
+        query_params: параметры запроса
+
+    Returns:
+        Код статуса и словарь данных
+        200,
+        {
+            "etag": "1721392810-9a0364b9e99bb480dd25e1f0284c8555",
+            "last_modified": 1721392810.428
+        }
+    '''
+
+    if not cache.is_cacheable(query_params=query_params):
+        return 200, {}
+
+    generation, last_modified = cache.get_state()
+    if generation is None:
+        logger.error(
+            msg='Не удалось получить поколение кэша площадок',
+        )
+        return 500, {}
+
+    params_hash = cache.get_params_hash(query_params=query_params)
+    return 200, {
+        'etag': f'{generation}-{params_hash}',
+        'last_modified': last_modified,
+    }
+
+
+def get_area_validators(pk: int) -> (int, dict):
+    '''
+    Получение валидаторов площадки для условного запроса
+
+    Args:
+        pk: pk площадки
+
+    Returns:
+        Код статуса и словарь данных
+        200,
+        {
+            "etag": "1-1721392810.428",
+            "last_modified": 1721392810.428
+        }
+    '''
+
+    try:
+        updated_at = Area.objects.filter(
+            pk=pk,
+            available=True,
+        ).values_list('updated_at', flat=True).first()
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось получить дату изменения площадки',
+                area_pk=pk,
+                status=500,
+                error=exc,
+            ),
+        )
+        return 500, {}
+
+    if updated_at is None:
+        return 404, {}
+
+    last_modified = updated_at.timestamp()
+    return 200, {
+        'etag': f'{pk}-{last_modified}',
+        'last_modified': last_modified,
+    }
+
+
 def get_area(pk: int) -> (int, dict):
     '''
     Получение площадки по pk
@@ -120,31 +296,110 @@ def get_area(pk: int) -> (int, dict):
     '''
 
     logger.info(
-        msg=f'Получение площадки по pk {pk}',
+        msg=StructuredMessage(
+            'Получение площадки',
+            area_pk=pk,
+        ),
     )
 
+    cache_key = cache.get_detail_key(
+        pk=pk,
+    )
+    if cache_key is not None:
+        status, response_data = redis_cache.get(
+            key=cache_key,
+        )
+        if status == 200 and response_data is not None:
+            cache.record_hit()
+            logger.info(
+                msg=StructuredMessage(
+                    'Площадка получена из кэша',
+                    area_pk=pk,
+                    status=200,
+                ),
+            )
+            return 200, response_data
+
+    started = time.monotonic()
     try:
         area = Area.objects.filter(
             pk=pk,
             available=True,
+        ).defer(
+            'search_vector',
         ).prefetch_related('contacts', 'photos').first()
     except Exception as exc:
         logger.error(
-            msg=f'Не удалось получить площадку по pk {pk}: {exc}',
+            msg=StructuredMessage(
+                'Не удалось получить площадку',
+                area_pk=pk,
+                status=500,
+                error=exc,
+            ),
         )
         return 500, {}
 
     if area is None:
         logger.error(
-            msg=f'Площадка по pk {pk} не найдена',
+            msg=StructuredMessage(
+                'Площадка не найдена',
+                area_pk=pk,
+                status=404,
+            ),
         )
         return 404, {}
 
     response_data = AreaSerializer(
         instance=area,
     ).data
+    if cache_key is not None:
+        redis_cache.set_key(
+            key=cache_key,
+            data=response_data,
+            time=cache.CACHE_TIMEOUT,
+        )
+        cache.record_fill(
+            fill_time=time.monotonic() - started,
+        )
+
     logger.info(
-        msg=f'Площадка по pk {pk} получена',
+        msg=StructuredMessage(
+            'Площадка получена',
+            area_pk=pk,
+            status=200,
+            duration=time.monotonic() - started,
+        ),
     )
     return 200, response_data
 
+
+def get_cache_stats() -> (int, dict):
+    '''
+    Получение статистики кэша площадок
+
+    Returns:
+        Код статуса и словарь данных
+        200,
+        {
+            "hits": 950,
+            "misses": 50,
+            "hit_ratio": 0.95,
+            "fill_time_avg": 0.012
+        }
+    '''
+
+    logger.info(
+        msg='Получение статистики кэша площадок',
+    )
+
+    status, response_data = cache.get_stats()
+    if status != 200:
+        logger.error(
+            msg='Не удалось получить статистику кэша площадок',
+        )
+        return status, {}
+
+    logger.info(
+        msg='Получена статистика кэша площадок',
+    )
+    return 200, response_data
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from areas import cache
+from areas.models import (
+    Area,
+    Contact,
+    Photo,
+)
+
+
+@receiver([post_save, post_delete], sender=Area)
+@receiver([post_save, post_delete], sender=Contact)
+@receiver([post_save, post_delete], sender=Photo)
+def invalidate_areas_cache(sender, **kwargs):
+    transaction.on_commit(cache.bump_generation)
+
+
+@receiver([post_save, post_delete], sender=Contact)
+@receiver([post_save, post_delete], sender=Photo)
+def touch_area(sender, instance, **kwargs):
+    Area.objects.filter(
+        pk=instance.area_id,
+    ).update(
+        updated_at=timezone.now(),
+    )
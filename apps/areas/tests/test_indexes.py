@@ -0,0 +1,87 @@
+from django.db import connection
+from django.test import TestCase
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from areas.api import AreaListView
+from areas.models import Area
+
+
+class IndexesTest(TestCase):
+    fixtures = ['contacts.json', 'areas.json']
+
+    def setUp(self):
+        # В тестовой базе несколько строк, и без этого планировщик
+        # всегда выбирает последовательное сканирование
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def get_plan(self, data: dict, paginate: bool = True) -> str:
+        view = AreaListView()
+        request = Request(APIRequestFactory().get('/', data))
+        areas = Area.objects.filter(
+            available=True,
+        )
+        for backend in view.filter_backends:
+            areas = backend().filter_queryset(
+                request=request,
+                queryset=areas,
+                view=view,
+            )
+
+        if not paginate:
+            return areas.order_by().explain()
+
+        paginator = view.pagination_class()
+        ordering = paginator.get_ordering(
+            request=request,
+            queryset=areas,
+            view=view,
+        )
+        return areas.order_by(*ordering)[:paginator.page_size + 1].explain()
+
+    def test_list_ordering(self):
+        fixtures = (
+            ('areas_available_created_idx', {}),
+            ('areas_available_created_idx', {'ordering': 'created_at'}),
+            ('areas_available_price_idx', {'ordering': 'price'}),
+            ('areas_available_price_idx', {'ordering': '-price', 'price__lte': 5000}),
+            ('areas_available_price_idx', {'ordering': 'price', 'price__gte': 1000}),
+            ('areas_available_capacity_idx', {'ordering': '-capacity'}),
+            ('areas_available_capacity_idx', {'ordering': 'capacity', 'capacity__gte': 100}),
+            ('areas_available_capacity_idx', {'ordering': 'capacity', 'capacity__lte': 1000}),
+        )
+
+        for index, data in fixtures:
+            plan = self.get_plan(data=data)
+            self.assertIn(index, plan, msg=data)
+            self.assertNotIn('Seq Scan on areas', plan, msg=data)
+
+    def test_range_filters(self):
+        fixtures = (
+            ('areas_available_price_idx', {'price__gte': 1000}),
+            ('areas_available_capacity_idx', {'capacity__lte': 1000}),
+            ('areas_available_width_idx', {'width__gte': 100}),
+            ('areas_available_width_idx', {'width__lte': 300}),
+            ('areas_available_length_idx', {'length__gte': 100}),
+            ('areas_available_length_idx', {'length__lte': 300}),
+        )
+
+        for index, data in fixtures:
+            plan = self.get_plan(
+                data=data,
+                paginate=False,
+            )
+            self.assertIn(index, plan, msg=data)
+            self.assertNotIn('Seq Scan on areas', plan, msg=data)
+
+    def test_search(self):
+        plan = self.get_plan(
+            data={
+                'search': 'test',
+            },
+            paginate=False,
+        )
+        self.assertIn('areas_search_vector_idx', plan)
+        self.assertIn('areas_name_trgm_idx', plan)
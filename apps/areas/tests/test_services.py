@@ -1,19 +1,35 @@
 import json
 import os
+from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
 from rest_framework.request import Request
-from rest_framework.test import APIRequestFactory
+from rest_framework.test import (
+    APIRequestFactory,
+    force_authenticate,
+)
 
-from areas.api import AreaListView
+from areas import cache
+from areas.api import (
+    AreaListView,
+    AreaCacheStatsView,
+)
+from areas.models import Contact
 from areas.services import (
     get_areas,
     get_area,
+    get_areas_validators,
+    get_area_validators,
+    get_cache_stats,
 )
 
+from utils import redis_cache
+
 
 CUR_DIR = os.path.dirname(__file__)
+User = get_user_model()
 
 
 class ServicesTest(TestCase):
@@ -23,6 +39,18 @@ class ServicesTest(TestCase):
     def setUpTestData(cls):
         cls.path = f'{CUR_DIR}/fixtures/services'
 
+    def setUp(self):
+        self.clear_cache()
+        self.addCleanup(self.clear_cache)
+
+    @staticmethod
+    def clear_cache():
+        # Redis общий для тестов, а TestCase не выполняет on_commit,
+        # поэтому поколение кэша само не меняется между тестами
+        keys = list(redis_cache.redis_client.scan_iter(match='areas_*'))
+        if keys:
+            redis_cache.redis_client.delete(*keys)
+
     def test_get_areas(self):
         view = AreaListView
 
@@ -31,6 +59,11 @@ class ServicesTest(TestCase):
             (200, 'valid_ordering'),
             (200, 'valid_search'),
             (200, 'valid_filters'),
+            (200, 'valid_available'),
+            (200, 'valid_page_size'),
+            (400, 'invalid_cursor'),
+            (400, 'invalid_cursor_type'),
+            (400, 'invalid_available'),
         )
 
         for code, name in fixtures:
@@ -48,7 +81,71 @@ class ServicesTest(TestCase):
                 view=view,
             )
             print(response_data)
-            self.assertEqual(status_code, status_code, msg=fixture)
+            self.assertEqual(status_code, code, msg=fixture)
+
+    def test_get_areas_pagination(self):
+        view = AreaListView
+        factory = APIRequestFactory()
+
+        for ordering in ('-created_at', 'price', '-capacity'):
+            pks = []
+            data = {
+                'ordering': ordering,
+                'page_size': 1,
+            }
+            while True:
+                request = Request(factory.get('/', data))
+                status_code, response_data = get_areas(
+                    request=request,
+                    filter_backends=view.filter_backends,
+                    view=view,
+                )
+                self.assertEqual(status_code, 200, msg=ordering)
+                pks.extend(area['pk'] for area in response_data['results'])
+                if response_data['next'] is None:
+                    break
+                data['cursor'] = response_data['next']
+
+            self.assertEqual(sorted(pks), [1, 3, 4], msg=ordering)
+
+    def test_get_areas_search(self):
+        view = AreaListView
+        factory = APIRequestFactory()
+
+        request = Request(factory.get('/', {'search': 'test3'}))
+        status_code, response_data = get_areas(
+            request=request,
+            filter_backends=view.filter_backends,
+            view=view,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data['results'][0]['pk'], 3)
+
+        request = Request(factory.get('/', {'search': 'tes3'}))
+        status_code, response_data = get_areas(
+            request=request,
+            filter_backends=view.filter_backends,
+            view=view,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertIn(3, [area['pk'] for area in response_data['results']])
+
+    @patch('areas.filters.get_areas_booking_temporary')
+    def test_get_areas_temporary_unavailable(self, mock_get_areas_booking_temporary):
+        mock_get_areas_booking_temporary.return_value = (500, set())
+        view = AreaListView
+        factory = APIRequestFactory()
+
+        request = Request(factory.get('/', {
+            'available_from': '2024-08-02',
+            'available_to': '2024-08-04',
+        }))
+        status_code, response_data = get_areas(
+            request=request,
+            filter_backends=view.filter_backends,
+            view=view,
+        )
+        self.assertEqual(status_code, 503)
 
     def test_get_area(self):
         path = f'{self.path}/get_area'
@@ -69,3 +166,87 @@ class ServicesTest(TestCase):
             print(response_data)
             self.assertEqual(status_code, code, msg=fixture)
 
+    def test_get_area_cache(self):
+        status_code, response_data = get_area(
+            pk=1,
+        )
+        self.assertEqual(status_code, 200)
+
+        status_code, stats = cache.get_stats()
+        self.assertEqual(status_code, 200)
+
+        status_code, cached_response_data = get_area(
+            pk=1,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(cached_response_data, response_data)
+
+        status_code, cached_stats = cache.get_stats()
+        self.assertEqual(cached_stats['hits'], stats['hits'] + 1)
+
+    def test_get_cache_stats(self):
+        status_code, response_data = get_cache_stats()
+        self.assertEqual(status_code, 200)
+        self.assertEqual(
+            set(response_data),
+            {'hits', 'misses', 'hit_ratio', 'fill_time_avg'},
+        )
+
+        view = AreaCacheStatsView.as_view()
+        factory = APIRequestFactory()
+        fixtures = (
+            (403, False),
+            (200, True),
+        )
+
+        for code, is_staff in fixtures:
+            user = User.objects.create_user(
+                email=f'stats{int(is_staff)}@test.com',
+                password='password',
+                is_staff=is_staff,
+            )
+            request = factory.get('/')
+            force_authenticate(request, user=user)
+            response = view(request)
+            self.assertEqual(response.status_code, code, msg=is_staff)
+
+    def test_get_areas_validators(self):
+        factory = APIRequestFactory()
+        request = Request(factory.get('/', {'search': 'Test'}))
+
+        status_code, validators = get_areas_validators(
+            query_params=request.query_params,
+        )
+        self.assertEqual(status_code, 200)
+
+        cache.bump_generation()
+        status_code, bumped_validators = get_areas_validators(
+            query_params=request.query_params,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertNotEqual(bumped_validators['etag'], validators['etag'])
+        self.assertIsNotNone(bumped_validators['last_modified'])
+
+        request = Request(factory.get('/', {'available_from': '2024-08-01'}))
+        status_code, validators = get_areas_validators(
+            query_params=request.query_params,
+        )
+        self.assertEqual(validators, {})
+
+    def test_get_area_validators(self):
+        status_code, validators = get_area_validators(
+            pk=1,
+        )
+        self.assertEqual(status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.filter(area_id=1).first().save()
+        status_code, touched_validators = get_area_validators(
+            pk=1,
+        )
+        self.assertNotEqual(touched_validators['etag'], validators['etag'])
+
+        status_code, validators = get_area_validators(
+            pk=100,
+        )
+        self.assertEqual(status_code, 404)
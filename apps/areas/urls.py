@@ -3,6 +3,7 @@ from django.urls import path
 from areas.api import (
     AreaListView,
     AreaView,
+    AreaCacheStatsView,
 )
 
 
@@ -17,4 +18,9 @@ urlpatterns = [
         AreaView.as_view(),
         name='area',
     ),
+    path(
+        'cache/stats/',
+        AreaCacheStatsView.as_view(),
+        name='areas_cache_stats',
+    ),
 ]
@@ -0,0 +1,117 @@
+from collections.abc import (
+    Iterable,
+    Iterator,
+)
+from datetime import datetime
+
+
+def parse_datetime(value: datetime | str) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def get_temporary_period(booking: dict) -> (datetime, datetime):
+    '''
+    Получение периода временной брони
+
+    Кодек msgpack возвращает даты как datetime, JSON - строками
+
+    Args:
+        booking: временная бронь из redis
+            {
+              "booked_from": "2024-08-10T12:00:00+05:00",
+              "booked_to": "2024-08-15T12:00:00+05:00",
+              ...
+            }
+
+    Returns:
+        Начало и конец периода
+    '''
+
+    return (
+        parse_datetime(booking['booked_from']),
+        parse_datetime(booking['booked_to']),
+    )
+
+
+def get_busy_periods(constant: Iterable = (), temporary: Iterable = (),
+                     user_id: int = None) -> Iterator:
+    '''
+    Получение занятых периодов площадки
+
+    Даты временных броней разбираются лениво, по мере обхода
+
+    Args:
+        constant: периоды постоянных броней (booked_from, booked_to)
+        temporary: временные брони из redis
+        user_id: пользователь, чьи временные брони не учитываются
+
+    Returns:
+        Итератор периодов (booked_from, booked_to)
+    '''
+
+    yield from constant
+    for booking in temporary:
+        if user_id is not None and booking['user_id'] == user_id:
+            continue
+        yield get_temporary_period(booking=booking)
+
+
+def get_overlapping_periods(start: datetime, end: datetime, constant: Iterable = (),
+                            temporary: Iterable = (), user_id: int = None) -> list:
+    '''
+    Получение занятых периодов, пересекающихся с периодом
+
+    Один линейный проход по броням; границы периодов включительные,
+    как и в ограничении bookings_area_exclude_overlapping
+
+    Args:
+        start: начало периода
+        end: конец периода
+        constant: периоды постоянных броней (booked_from, booked_to)
+        temporary: временные брони из redis
+        user_id: пользователь, чьи временные брони не учитываются
+
+    Returns:
+        Список периодов (booked_from, booked_to)
+    '''
+
+    return [
+        (booked_from, booked_to)
+        for booked_from, booked_to in get_busy_periods(
+            constant=constant,
+            temporary=temporary,
+            user_id=user_id,
+        )
+        if booked_from <= end and booked_to >= start
+    ]
+
+
+def is_period_free(start: datetime, end: datetime, constant: Iterable = (),
+                   temporary: Iterable = (), user_id: int = None) -> bool:
+    '''
+    Проверка, свободен ли период
+
+    Проход останавливается на первом пересечении, поэтому остальные
+    брони не разбираются
+
+    Args:
+        start: начало периода
+        end: конец периода
+        constant: периоды постоянных броней (booked_from, booked_to)
+        temporary: временные брони из redis
+        user_id: пользователь, чьи временные брони не учитываются
+
+    Returns:
+        True, если период не пересекается с занятыми
+    '''
+
+    return not any(
+        booked_from <= end and booked_to >= start
+        for booked_from, booked_to in get_busy_periods(
+            constant=constant,
+            temporary=temporary,
+            user_id=user_id,
+        )
+    )
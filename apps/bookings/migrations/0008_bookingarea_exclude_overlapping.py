@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 07:14
+
+import bookings.models
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_bookingsettings'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddConstraint(
+            model_name='bookingarea',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[(bookings.models.TsTzRange('booked_from', 'booked_to', django.contrib.postgres.fields.ranges.RangeBoundary(inclusive_upper=True)), '&&'), ('area', '=')], name='bookings_area_exclude_overlapping'),
+        ),
+    ]
@@ -1,15 +1,49 @@
 import uuid
+from functools import partial
 
-from django.db import models
+from django.db import (
+    models,
+    transaction,
+)
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
 from django.contrib.auth import get_user_model
+from django.forms import model_to_dict
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import (
+    DateTimeRangeField,
+    RangeBoundary,
+    RangeOperators,
+)
 
 from solo.models import SingletonModel
 
 from areas.models import Area
 
+from utils import redis_cache
+
 
 User = get_user_model()
 
+OVERLAPPING_CONSTRAINT = 'bookings_area_exclude_overlapping'
+
+
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class BookingAreaQuerySet(models.QuerySet):
+    def overlapping(self, booked_from, booked_to):
+        return self.annotate(
+            period=TsTzRange(
+                'booked_from',
+                'booked_to',
+                RangeBoundary(inclusive_upper=True),
+            ),
+        ).filter(
+            period__overlap=DateTimeTZRange(booked_from, booked_to, '[]'),
+        )
+
 
 class BookingArea(models.Model):
     uuid = models.UUIDField(
@@ -52,6 +86,8 @@ class BookingArea(models.Model):
         auto_now_add=True,
     )
 
+    objects = BookingAreaQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.area}'
 
@@ -59,6 +95,22 @@ class BookingArea(models.Model):
         db_table = 'bookings_area'
         verbose_name = 'Бронь площадок'
         verbose_name_plural = 'Брони площадок'
+        constraints = [
+            ExclusionConstraint(
+                name=OVERLAPPING_CONSTRAINT,
+                expressions=[
+                    (
+                        TsTzRange(
+                            'booked_from',
+                            'booked_to',
+                            RangeBoundary(inclusive_upper=True),
+                        ),
+                        RangeOperators.OVERLAPS,
+                    ),
+                    ('area', RangeOperators.EQUAL),
+                ],
+            ),
+        ]
 
 
 class BookingSettings(SingletonModel):
@@ -70,6 +122,19 @@ class BookingSettings(SingletonModel):
     def __str__(self):
         return ''
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # После отката транзакции в redis не должно остаться
+        # несохраненных настроек, поэтому кэш обновляется после фиксации
+        transaction.on_commit(
+            partial(
+                redis_cache.refresh_through,
+                key='booking_settings',
+                data=model_to_dict(self),
+                timeout=60*60,
+            ),
+        )
+
     class Meta:
         db_table = 'bookings_settings'
         verbose_name = 'Настройки брони'
@@ -1,5 +1,13 @@
 import uuid
+from datetime import (
+    datetime,
+    timezone as dt_timezone,
+)
 
+from django.db import (
+    IntegrityError,
+    transaction,
+)
 from django.http import QueryDict
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -7,10 +15,18 @@ from django.utils import timezone
 from areas.models import Area
 
 from utils import redis_cache
-from utils.logger import get_logger
+from utils.logger import (
+    StructuredMessage,
+    get_logger,
+)
 
-from bookings import check
+from bookings.availability import (
+    get_temporary_period,
+    is_period_free,
+    parse_datetime,
+)
 from bookings.models import (
+    OVERLAPPING_CONSTRAINT,
     BookingArea,
     BookingSettings,
 )
@@ -25,12 +41,25 @@ from bookings.serializers import (
 logger = get_logger(__name__)
 User = get_user_model()
 
+# Ключи временных броней под общим hash tag {temporary}: acquire_period
+# обновляет их одним скриптом, а в Redis Cluster это возможно только в одном слоте
+TEMPORARY_KEY = '{{temporary}}area{area_pk}_user{user_id}_{uuid}'
+TEMPORARY_DAY_INDEX = '{temporary}temporary_day'
+AREA_TEMPORARY_INDEX = '{{temporary}}temporary_area{area_pk}'
+USER_TEMPORARY_INDEX = '{{temporary}}temporary_user{user_id}'
+AREA_BOOKING_LOCK = 'area{area_pk}_booking_lock'
+TEMPORARY_DATE_FORMAT = '%Y-%m-%d %H:%M:%S%z'
+
 
 def booking_area(area_pk: int, data: QueryDict, user: User) -> (int, dict):
     temporary = data.get('temporary')
     logger.info(
-        msg=f'Бронирование площадки {area_pk} пользователем {user}, '
-            f'(временная бронь - {temporary})'
+        msg=StructuredMessage(
+            'Бронирование площадки',
+            area_pk=area_pk,
+            user_id=user.id,
+            temporary=temporary,
+        ),
     )
 
     serializer = BookAreaSerializer(
@@ -38,9 +67,14 @@ def booking_area(area_pk: int, data: QueryDict, user: User) -> (int, dict):
     )
     if not serializer.is_valid():
         logger.error(
-            msg=f'Невалидные данные для бронирования площадки {area_pk} '
-                f'пользователем {user} (временная бронь - {temporary}): '
-                f'{serializer.errors}',
+            msg=StructuredMessage(
+                'Невалидные данные для бронирования площадки',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=400,
+                error=serializer.errors,
+            ),
         )
         return 400, {}
 
@@ -51,125 +85,312 @@ def booking_area(area_pk: int, data: QueryDict, user: User) -> (int, dict):
         ).first()
     except Exception as exc:
         logger.error(
-            msg=f'Возникла ошибка при бронировании площадки {area_pk} '
-                f'пользователем {user} (временная бронь - {temporary}): '
-                f'{exc}'
+            msg=StructuredMessage(
+                'Возникла ошибка при бронировании площадки',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=500,
+                error=exc,
+            ),
         )
         return 500, {}
 
     if area is None:
         logger.error(
-            msg=f'Площадка для бронирования {area_pk} '
-                f'пользователем {user} (временная бронь - {temporary}) '
-                f'не найдена',
+            msg=StructuredMessage(
+                'Площадка для бронирования не найдена',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=404,
+            ),
         )
         return 404, {}
 
     validated_data = serializer.validated_data
     temporary = validated_data['temporary']
-    try:
-        constant_bookings = BookingArea.objects.filter(
-            area__pk=area_pk,
-            booked_from__lte=validated_data['end_date'],
-            booked_to__gte=validated_data['start_date'],
-        )
-    except Exception as exc:
+    start_date = validated_data['start_date']
+    end_date = validated_data['end_date']
+
+    # Временные брони живут в redis, постоянные - в postgres, поэтому
+    # проверка и запись в обоих случаях идут под общей блокировкой площадки
+    lock_key = AREA_BOOKING_LOCK.format(area_pk=area_pk)
+    status, token = redis_cache.wait_lock(
+        key=lock_key,
+    )
+    if token is None:
+        status = 409 if status == 200 else status
         logger.error(
-            msg=f'Возникла ошибка при бронировании площадки {area_pk} '
-                f'пользователем {user} (временная бронь - {temporary}): '
-                f'{exc}',
+            msg=StructuredMessage(
+                'Не удалось забронировать площадку: площадка бронируется другим запросом',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=status,
+            ),
         )
-        return 500, {}
+        return status, {}
+
+    try:
+        if temporary:
+            status = book_area_temporary(
+                area_pk=area_pk,
+                user=user,
+                start_date=start_date,
+                end_date=end_date,
+            )
+        else:
+            status = book_area_constant(
+                area_pk=area_pk,
+                user=user,
+                start_date=start_date,
+                end_date=end_date,
+            )
+    finally:
+        redis_cache.release_lock(
+            key=lock_key,
+            token=token,
+        )
+    if status != 200:
+        return status, {}
 
+    logger.info(
+        msg=StructuredMessage(
+            'Бронирование площадки прошло успешно',
+            area_pk=area_pk,
+            user_id=user.id,
+            temporary=temporary,
+            status=200,
+        ),
+    )
+    return 200, {}
+
+
+def book_area_constant(area_pk: int, user: User, start_date: datetime, end_date: datetime) -> int:
+    '''
+    Постоянное бронирование площадки
+
+    Вызывается под блокировкой площадки, которую держит booking_area
+
+    Args:
+        area_pk: id площадки
+        user: пользователь
+        start_date: начало периода
+        end_date: конец периода
+
+    Returns:
+        Статус бронирования
+    '''
+
+    temporary = False
     status, temporary_bookings = get_area_booking_temporary(
         area_pk=area_pk,
     )
     if status != 200:
         logger.error(
-            msg=f'Не удалось забронировать площадку {area_pk} '
-                f'пользователем {user} (временная бронь - {temporary})',
+            msg=StructuredMessage(
+                'Не удалось получить временные брони площадки',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=status,
+            ),
         )
-        return status, {}
+        return status
 
-    valid_booking_dates = check.booking_dates(
-        constant=constant_bookings,
+    free = is_period_free(
+        start=start_date,
+        end=end_date,
         temporary=temporary_bookings,
-        validated_data=validated_data,
         user_id=user.id,
     )
-    if not valid_booking_dates:
+    if not free:
         logger.error(
-            msg=f'Не удалось забронировать площадку {area_pk} '
-                f'пользователем {user} (временная бронь - {temporary}): '
-                f'даты бронирования заняты'
+            msg=StructuredMessage(
+                'Не удалось забронировать площадку: даты бронирования заняты',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=400,
+            ),
         )
-        return 400, {}
+        return 400
 
-    start_date = validated_data['start_date']
-    end_date = validated_data['end_date']
-    if not temporary:
-        try:
+    try:
+        with transaction.atomic():
             BookingArea.objects.create(
                 area_id=area_pk,
                 user=user,
                 booked_from=start_date,
                 booked_to=end_date,
             )
-        except Exception as exc:
+    except IntegrityError as exc:
+        # Остальные нарушения целостности - не занятые даты, а ошибка
+        diag = getattr(exc.__cause__, 'diag', None)
+        if getattr(diag, 'constraint_name', None) != OVERLAPPING_CONSTRAINT:
             logger.error(
-                msg=f'Возникла ошибка при бронировании площадки {area_pk} '
-                    f'пользователем {user} (временная бронь - {temporary}): '
-                    f'{exc}',
+                msg=StructuredMessage(
+                    'Возникла ошибка при бронировании площадки',
+                    area_pk=area_pk,
+                    user_id=user.id,
+                    temporary=temporary,
+                    status=500,
+                    error=exc,
+                ),
             )
-            return 500, {}
-    else:
-        key = f'area{area_pk}_user{user.id}_{str(uuid.uuid4())}'
-        data = {
-            'area': area_pk,
-            'booked_from': start_date.strftime('%Y-%m-%d %H:%M:%S%z'),
-            'booked_to': end_date.strftime('%Y-%m-%d %H:%M:%S%z'),
-            'user_id': user.id,
-            'created_at': timezone.now().strftime('%Y-%m-%d %H:%M:%S%z'),
-        }
+            return 500
 
-        status, booking_settings = redis_cache.get(
-            key='booking_settings',
-            model=BookingSettings,
-            timeout=60*60,
-            pk=1,
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось забронировать площадку: даты бронирования заняты',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=400,
+                error=exc,
+            ),
         )
-        if status != 200:
-            logger.error(
-                msg=f'Не удалось временно забронировать площадку {area_pk} '
-                    f'пользователем {user} (временная бронь - {temporary})'
-                    f'Настройки бронирования не найдены',
-            )
-            return status, {}
+        return 400
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при бронировании площадки',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=500,
+                error=exc,
+            ),
+        )
+        return 500
+
+
+def book_area_temporary(area_pk: int, user: User, start_date: datetime, end_date: datetime) -> int:
+    '''
+    Временное бронирование площадки
+
+    Вызывается под блокировкой площадки, которую держит booking_area
+
+    Args:
+        area_pk: id площадки
+        user: пользователь
+        start_date: начало периода
+        end_date: конец периода
+
+    Returns:
+        Статус бронирования
+    '''
 
-        status = redis_cache.set_key(
-            key=key,
-            data=data,
-            time=booking_settings['temporary_timeout'],
+    temporary = True
+    try:
+        constant_booked = BookingArea.objects.filter(
+            area_id=area_pk,
+        ).overlapping(
+            booked_from=start_date,
+            booked_to=end_date,
+        ).exists()
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при бронировании площадки',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=500,
+                error=exc,
+            ),
         )
-        if status != 200:
-            logger.error(
-                msg=f'Не удалось временно забронировать площадку {area_pk} '
-                    f'пользователем {user} (временная бронь - {temporary})',
-            )
-            return status, {}
+        return 500
 
-    logger.info(
-        msg=f'Бронирование площадки {area_pk} '
-            f'пользователем {user} (временная бронь - {temporary}) '
-            f'прошло успешно',
+    if constant_booked:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось временно забронировать площадку: даты бронирования заняты',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=400,
+            ),
+        )
+        return 400
+
+    key = TEMPORARY_KEY.format(
+        area_pk=area_pk,
+        user_id=user.id,
+        uuid=uuid.uuid4(),
     )
-    return 200, {}
+    data = {
+        'area': area_pk,
+        'booked_from': start_date,
+        'booked_to': end_date,
+        'user_id': user.id,
+        'created_at': timezone.now(),
+    }
+
+    status, booking_settings = redis_cache.get(
+        key='booking_settings',
+        model=BookingSettings,
+        timeout=60*60,
+        pk=1,
+        local=True,
+    )
+    if status != 200:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось временно забронировать площадку: настройки бронирования не найдены',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=status,
+            ),
+        )
+        return status
+
+    status, acquired = redis_cache.acquire_period(
+        key=key,
+        data=data,
+        timeout=booking_settings['temporary_timeout'],
+        period=(start_date, end_date),
+        index=AREA_TEMPORARY_INDEX.format(area_pk=area_pk),
+        indexes=[
+            USER_TEMPORARY_INDEX.format(user_id=user.id),
+        ],
+        day_index=TEMPORARY_DAY_INDEX,
+    )
+    if status != 200:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось временно забронировать площадку',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=status,
+            ),
+        )
+        return status
+
+    if not acquired:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось временно забронировать площадку: даты бронирования заняты',
+                area_pk=area_pk,
+                user_id=user.id,
+                temporary=temporary,
+                status=400,
+            ),
+        )
+        return 400
+
+    return 200
 
 
 def user_booking_history(user: User) -> (int, list):
     logger.info(
-        msg=f'Получение истории постоянного бронирования '
-            f'пользователя {user}',
+        msg=StructuredMessage(
+            'Получение истории постоянного бронирования пользователя',
+            user_id=user.id,
+        ),
     )
 
     try:
@@ -178,8 +399,12 @@ def user_booking_history(user: User) -> (int, list):
         )
     except Exception as exc:
         logger.error(
-            msg=f'Возникла ошибка при получении истории постоянного '
-                f'бронирования пользователя {user}: {exc}',
+            msg=StructuredMessage(
+                'Возникла ошибка при получении истории постоянного бронирования пользователя',
+                user_id=user.id,
+                status=500,
+                error=exc,
+            ),
         )
         return 500, []
 
@@ -188,74 +413,147 @@ def user_booking_history(user: User) -> (int, list):
         many=True
     ).data
     logger.info(
-        msg=f'Получена история постоянного бронирования '
-            f'пользователя {user}',
+        msg=StructuredMessage(
+            'Получена история постоянного бронирования пользователя',
+            user_id=user.id,
+            status=200,
+        ),
     )
     return 200, response_data
 
 
+def serialize_booking_temporary(booking: dict) -> dict:
+    '''
+    Приведение временной брони из redis к виду ответа
+
+    Кодек JSON возвращает даты строками ISO, msgpack - datetime в UTC,
+    поэтому даты форматируются явно и ответ не зависит от REDIS_CODEC:
+    период брони - в часовом поясе проекта, created_at - в UTC
+
+    Args:
+        booking: временная бронь из redis
+
+    Returns:
+        Словарь данных
+        {
+            "area": 2,
+            "booked_from": "2024-08-10 12:00:00+0500",
+            "booked_to": "2024-08-15 12:00:00+0500",
+            "user_id": 1,
+            "created_at": "2024-07-19 12:40:10+0000"
+        }
+    '''
+
+    booked_from, booked_to = get_temporary_period(booking=booking)
+    created_at = parse_datetime(booking['created_at'])
+    return {
+        **booking,
+        'booked_from': timezone.localtime(booked_from).strftime(TEMPORARY_DATE_FORMAT),
+        'booked_to': timezone.localtime(booked_to).strftime(TEMPORARY_DATE_FORMAT),
+        'created_at': created_at.astimezone(dt_timezone.utc).strftime(TEMPORARY_DATE_FORMAT),
+    }
+
+
 def user_booking_temporary(user: User) -> (int, list):
     logger.info(
-        msg=f'Получение списка временных броней пользователя {user}',
+        msg=StructuredMessage(
+            'Получение списка временных броней пользователя',
+            user_id=user.id,
+        ),
     )
 
-    key_pattern = f'*_user{user.id}_*'
-    status, matching_keys = redis_cache.get_matching_keys(
-        key_pattern=key_pattern,
+    status, bookings = redis_cache.get_indexed(
+        index=USER_TEMPORARY_INDEX.format(user_id=user.id),
     )
     if status != 200:
         logger.error(
-            msg=f'Не удалось получить список временных броней '
-                f'пользователя {user}',
+            msg=StructuredMessage(
+                'Не удалось получить список временных броней пользователя',
+                user_id=user.id,
+                status=status,
+            ),
         )
         return status, []
 
-    response_data = []
-    for key in matching_keys:
-        status, data = redis_cache.get(
-            key=key,
-        )
-        if status != 200:
-            return status, []
-
-        response_data.append(data)
+    response_data = [
+        serialize_booking_temporary(booking=booking)
+        for booking in bookings
+    ]
 
     logger.info(
-        msg=f'Получен список временных броней пользователя {user}',
+        msg=StructuredMessage(
+            'Получен список временных броней пользователя',
+            user_id=user.id,
+            status=200,
+        ),
     )
     return 200, response_data
 
 
 def get_area_booking_temporary(area_pk: int) -> (int, list):
     logger.info(
-        msg=f'Получение списка временных броней площадки {area_pk}',
+        msg=StructuredMessage(
+            'Получение списка временных броней площадки',
+            area_pk=area_pk,
+        ),
     )
 
-    key_pattern = f'*area{area_pk}*'
-    status, matching_keys = redis_cache.get_matching_keys(
-        key_pattern=key_pattern,
+    status, response_data = redis_cache.get_indexed(
+        index=AREA_TEMPORARY_INDEX.format(area_pk=area_pk),
     )
     if status != 200:
         logger.error(
-            msg=f'Не удалось получить список временных броней '
-                f'площадки {area_pk}',
+            msg=StructuredMessage(
+                'Не удалось получить список временных броней площадки',
+                area_pk=area_pk,
+                status=status,
+            ),
         )
         return status, []
 
-    response_data = []
-    for key in matching_keys:
-        status, data = redis_cache.get(
-            key=key,
-        )
-        if status != 200:
-            return status, []
+    logger.info(
+        msg=StructuredMessage(
+            'Получен список временных броней площадки',
+            area_pk=area_pk,
+            status=200,
+        ),
+    )
+    return 200, response_data
 
-        response_data.append(data)
 
+def get_areas_booking_temporary(start_date: datetime, end_date: datetime) -> (int, set):
     logger.info(
-        msg=f'Получен список временных броней площадки {area_pk}',
+        msg=StructuredMessage(
+            'Получение площадок с временными бронями на период',
+            start_date=start_date,
+            end_date=end_date,
+        ),
     )
-    return 200, response_data
+
+    status, bookings = redis_cache.get_period_indexed(
+        day_index=TEMPORARY_DAY_INDEX,
+        period=(start_date, end_date),
+    )
+    if status != 200:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось получить площадки с временными бронями на период',
+                start_date=start_date,
+                end_date=end_date,
+                status=status,
+            ),
+        )
+        return status, set()
+
+    logger.info(
+        msg=StructuredMessage(
+            'Получены площадки с временными бронями на период',
+            start_date=start_date,
+            end_date=end_date,
+            status=200,
+        ),
+    )
+    return 200, {booking['area'] for booking in bookings}
 
 
 def get_area_qr_data(data: QueryDict) -> (int, dict):
@@ -0,0 +1,123 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from bookings.availability import (
+    get_busy_periods,
+    get_overlapping_periods,
+    is_period_free,
+)
+
+
+def date(day: int, month: int = 8) -> datetime:
+    return datetime(2024, month, day, 7, tzinfo=timezone.utc)
+
+
+class AvailabilityTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.temporary = [
+            {
+                'booked_from': '2024-08-01T07:00:00Z',
+                'booked_to': '2024-08-03T07:00:00Z',
+                'user_id': 1,
+            },
+            {
+                'booked_from': '2024-08-10 12:00:00+0500',
+                'booked_to': '2024-08-12 12:00:00+0500',
+                'user_id': 2,
+            },
+        ]
+        cls.constant = [
+            (date(20), date(25)),
+            (date(5), date(30)),
+        ]
+
+    def test_is_period_free(self):
+        fixtures = (
+            (False, date(2), date(2)),
+            (False, date(3), date(4)),
+            (False, date(26), date(27)),
+            (True, date(20, month=7), date(25, month=7)),
+            (True, date(31), date(31)),
+        )
+
+        for expected, start, end in fixtures:
+            self.assertEqual(
+                is_period_free(
+                    start=start,
+                    end=end,
+                    constant=self.constant,
+                    temporary=self.temporary,
+                ),
+                expected,
+                msg=f'{start} - {end}',
+            )
+
+    def test_user_temporary_ignored(self):
+        periods = list(get_busy_periods(
+            temporary=self.temporary,
+            user_id=1,
+        ))
+        self.assertEqual(len(periods), 1)
+        self.assertTrue(is_period_free(
+            start=date(1),
+            end=date(4),
+            temporary=self.temporary,
+            user_id=1,
+        ))
+        self.assertFalse(is_period_free(
+            start=date(4),
+            end=date(10),
+            temporary=self.temporary,
+            user_id=1,
+        ))
+
+    def test_get_overlapping_periods(self):
+        self.assertEqual(
+            get_overlapping_periods(
+                start=date(21),
+                end=date(22),
+                constant=self.constant,
+                temporary=self.temporary,
+            ),
+            [(date(20), date(25)), (date(5), date(30))],
+        )
+        self.assertEqual(
+            get_overlapping_periods(
+                start=date(31),
+                end=date(31),
+                constant=self.constant,
+                temporary=self.temporary,
+            ),
+            [],
+        )
+
+    def test_stops_on_first_overlap(self):
+        temporary = [
+            self.temporary[0],
+            {
+                'booked_from': 'not a date',
+                'booked_to': 'not a date',
+                'user_id': 2,
+            },
+        ]
+        self.assertFalse(is_period_free(
+            start=date(2),
+            end=date(2),
+            temporary=temporary,
+        ))
+
+    def test_native_datetimes(self):
+        temporary = [
+            {
+                'booked_from': date(1),
+                'booked_to': date(3),
+                'user_id': 1,
+            },
+        ]
+        self.assertFalse(is_period_free(start=date(2), end=date(2), temporary=temporary))
+        self.assertTrue(is_period_free(start=date(4), end=date(5), temporary=temporary))
@@ -1,24 +1,43 @@
 import json
 import os
 from datetime import datetime
+from types import SimpleNamespace
 
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.db import IntegrityError
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+)
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
-from bookings.models import BookingSettings
+from bookings.models import (
+    OVERLAPPING_CONSTRAINT,
+    BookingArea,
+    BookingSettings,
+)
 from bookings.services import (
+    TEMPORARY_DATE_FORMAT,
+    TEMPORARY_DAY_INDEX,
+    AREA_BOOKING_LOCK,
+    AREA_TEMPORARY_INDEX,
+    USER_TEMPORARY_INDEX,
     user_booking_history,
     user_booking_temporary,
     get_area_booking_temporary,
+    get_areas_booking_temporary,
     get_area_qr_data,
     area_qr_check,
     booking_area,
+    serialize_booking_temporary,
 )
 
-from utils.redis_cache import redis_client
+from utils import (
+    redis_cache,
+    redis_codec,
+)
 
 
 CUR_DIR = os.path.dirname(__file__)
@@ -32,11 +51,39 @@ class ServicesTest(TestCase):
     def setUpTestData(cls):
         cls.path = f'{CUR_DIR}/fixtures/services'
         with open(f'{CUR_DIR}/fixtures/booking_temporary.json') as file:
-            booking_temporary = json.load(file)
-        for booking in booking_temporary:
-            redis_client.setex(booking['key'], 5, json.dumps(booking['data']))
+            cls.booking_temporary = json.load(file)
         cls.booking_settings = BookingSettings.temporary_timeout.default = 5
 
+    def setUp(self):
+        self.addCleanup(self.clear_temporary)
+        for booking in self.booking_temporary:
+            data = booking['data']
+            status_code, acquired = redis_cache.acquire_period(
+                key=booking['key'],
+                data=data,
+                timeout=5,
+                period=(
+                    datetime.fromisoformat(data['booked_from']),
+                    datetime.fromisoformat(data['booked_to']),
+                ),
+                index=AREA_TEMPORARY_INDEX.format(area_pk=data['area']),
+                indexes=[
+                    USER_TEMPORARY_INDEX.format(user_id=data['user_id']),
+                ],
+                day_index=TEMPORARY_DAY_INDEX,
+            )
+            self.assertEqual(status_code, 200, msg=booking['key'])
+            self.assertTrue(acquired, msg=booking['key'])
+
+    @staticmethod
+    def clear_temporary():
+        indexes = list(redis_cache.redis_client.scan_iter(match=f'{TEMPORARY_DAY_INDEX}*'))
+        for pk in (1, 2, 3):
+            indexes.append(AREA_TEMPORARY_INDEX.format(area_pk=pk))
+            indexes.append(f'{AREA_TEMPORARY_INDEX.format(area_pk=pk)}_periods')
+            indexes.append(USER_TEMPORARY_INDEX.format(user_id=pk))
+        redis_cache.redis_client.delete(*indexes)
+
     @patch('django.utils.timezone.now')
     def test_booking_area(self, mock_timezone):
         dt = datetime(2024, 8, 1, tzinfo=timezone.utc)
@@ -49,6 +96,8 @@ class ServicesTest(TestCase):
             (200, 'valid_constant'),
             (400, 'invalid'),
             (400, 'invalid_dates'),
+            (400, 'overlapping_constant'),
+            (400, 'temporary_conflict'),
             (404, 'not_found'),
         )
 
@@ -65,6 +114,51 @@ class ServicesTest(TestCase):
             )
             self.assertEqual(status_code, code, msg=fixture)
 
+    def test_booking_area_integrity_error(self):
+        user = User.objects.get(pk=2)
+
+        with open(f'{self.path}/booking_area/200_valid_constant_request.json') as file:
+            data = json.load(file)
+
+        fixtures = (
+            (400, OVERLAPPING_CONSTRAINT),
+            (500, 'bookings_area_user_id_fkey'),
+        )
+
+        for code, constraint_name in fixtures:
+            cause = Exception()
+            cause.diag = SimpleNamespace(constraint_name=constraint_name)
+            exc = IntegrityError()
+            exc.__cause__ = cause
+            with patch.object(BookingArea.objects, 'create', side_effect=exc):
+                status_code, response_data = booking_area(
+                    area_pk=data['area_pk'],
+                    data=data['data'],
+                    user=user,
+                )
+            self.assertEqual(status_code, code, msg=constraint_name)
+
+    @patch('utils.redis_cache.LOCK_WAIT', 0)
+    def test_booking_area_locked(self):
+        user = User.objects.get(pk=2)
+
+        with open(f'{self.path}/booking_area/200_valid_constant_request.json') as file:
+            data = json.load(file)
+
+        lock_key = AREA_BOOKING_LOCK.format(area_pk=data['area_pk'])
+        status_code, token = redis_cache.acquire_lock(key=lock_key)
+        self.assertIsNotNone(token)
+        self.addCleanup(redis_cache.release_lock, key=lock_key, token=token)
+
+        with patch.object(BookingArea.objects, 'create') as mock_create:
+            status_code, response_data = booking_area(
+                area_pk=data['area_pk'],
+                data=data['data'],
+                user=user,
+            )
+        self.assertEqual(status_code, 409)
+        mock_create.assert_not_called()
+
     def test_user_booking_history(self):
         user = User.objects.get(pk=2)
         status_code, response_data = user_booking_history(
@@ -80,6 +174,11 @@ class ServicesTest(TestCase):
         )
         print(response_data)
         self.assertEqual(status_code, 200)
+        self.assertEqual(len(response_data), 1)
+        self.assertEqual(
+            datetime.strptime(response_data[0]['booked_from'], TEMPORARY_DATE_FORMAT),
+            datetime(2024, 8, 1, 7, tzinfo=timezone.utc),
+        )
 
     def test_get_area_booking_temporary(self):
         status_code, response_data = get_area_booking_temporary(
@@ -88,6 +187,14 @@ class ServicesTest(TestCase):
         print(response_data)
         self.assertEqual(status_code, 200)
 
+    def test_get_areas_booking_temporary(self):
+        status_code, response_data = get_areas_booking_temporary(
+            start_date=datetime(2024, 8, 2, tzinfo=timezone.utc),
+            end_date=datetime(2024, 8, 4, tzinfo=timezone.utc),
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data, {2})
+
     def test_get_area_qr_data(self):
         path = f'{self.path}/get_area_qr_data'
         fixtures = (
@@ -128,3 +235,29 @@ class ServicesTest(TestCase):
                 )
 
             self.assertEqual(status_code, code, msg=fixture)
+
+
+class SerializeBookingTemporaryTest(SimpleTestCase):
+
+    def test_serialize_booking_temporary(self):
+        with open(f'{CUR_DIR}/fixtures/booking_temporary.json') as file:
+            booking = json.load(file)[0]['data']
+        booking = {
+            **booking,
+            'booked_from': datetime.fromisoformat(booking['booked_from']),
+            'booked_to': datetime.fromisoformat(booking['booked_to']),
+            'created_at': datetime.fromisoformat(booking['created_at']),
+        }
+
+        response_data = [
+            serialize_booking_temporary(
+                booking=redis_codec.decode(data=codec().encode(data=booking)),
+            )
+            for codec in (redis_codec.JsonCodec, redis_codec.MsgpackCodec)
+        ]
+        self.assertEqual(response_data[0], response_data[1])
+        self.assertEqual(response_data[0]['created_at'], '2024-07-19 12:40:10+0000')
+        self.assertEqual(
+            datetime.strptime(response_data[0]['booked_to'], TEMPORARY_DATE_FORMAT),
+            datetime(2024, 8, 3, 7, tzinfo=timezone.utc),
+        )
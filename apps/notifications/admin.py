@@ -1,9 +1,14 @@
-from django.contrib import admin
+from django.contrib import (
+    admin,
+    messages,
+)
 
 from solo.admin import SingletonModelAdmin
 
 from notifications.forms import EmailTemplateForm
 from notifications.models import (
+    EmailCampaign,
+    EmailOutbox,
     EmailTemplate,
     EmailSettings,
 )
@@ -20,3 +25,65 @@ class EmailTemplateAdmin(admin.ModelAdmin):
 @admin.register(EmailSettings)
 class EmailConfigurationAdmin(SingletonModelAdmin):
     pass
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = [
+        'email_type',
+        'recipient',
+        'status',
+        'attempts',
+        'created_at',
+        'next_attempt_at',
+        'sent_at',
+    ]
+    list_filter = [
+        'status',
+        'email_type',
+    ]
+    search_fields = [
+        'recipient__email',
+    ]
+    raw_id_fields = [
+        'recipient',
+    ]
+    readonly_fields = [
+        'attempts',
+        'error',
+        'created_at',
+        'next_attempt_at',
+        'locked_at',
+        'sent_at',
+    ]
+    actions = [
+        'requeue',
+    ]
+
+    @admin.action(description='Вернуть неотправленные письма в очередь')
+    def requeue(self, request, queryset):
+        count = queryset.requeue()
+        self.message_user(
+            request=request,
+            message=f'Возвращено в очередь писем: {count}',
+            level=messages.SUCCESS,
+        )
+
+
+@admin.register(EmailCampaign)
+class EmailCampaignAdmin(admin.ModelAdmin):
+    list_display = [
+        'name',
+        'email_type',
+        'sent',
+        'failed',
+        'created_at',
+        'finished_at',
+    ]
+    readonly_fields = [
+        'last_user_id',
+        'sent',
+        'failed',
+        'created_at',
+        'finished_at',
+    ]
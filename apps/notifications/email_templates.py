@@ -0,0 +1,104 @@
+'''
+Разбор и проверка шаблонов писем
+
+Шаблон проверяется при сохранении и при загрузке в локальный кэш
+процесса. Само письмо собирается через str.format_map: разбор строки
+в нем сделан на C и быстрее склейки заранее разобранных частей
+'''
+from string import Formatter
+
+from utils import redis_cache
+from utils.constants import (
+    EMAIL_PLACEHOLDERS,
+    EMAIL_TYPES,
+)
+
+
+TEMPLATE_KEY = 'email_template_{email_type}'
+
+
+def get_fields(text: str) -> set:
+    '''
+    Разбор подстановок текста шаблона
+
+    Поддерживаются только именованные подстановки вида {url}
+
+    Args:
+        text: текст шаблона
+
+    Returns:
+        Множество названий подстановок
+    '''
+
+    try:
+        parts = list(Formatter().parse(text))
+    except ValueError as exc:
+        raise ValueError(f'Некорректные фигурные скобки в шаблоне: {exc}')
+
+    fields = set()
+    for _, field, format_spec, _ in parts:
+        if field is not None:
+            if not field.isidentifier():
+                raise ValueError(
+                    f'Подстановка {{{field}}} не поддерживается, '
+                    f'используйте именованные подстановки вида {{url}}'
+                )
+            if '{' in format_spec:
+                raise ValueError(
+                    f'Вложенные подстановки в формате {{{field}}} не поддерживаются'
+                )
+            fields.add(field)
+    return fields
+
+
+def validate_template(email_type: str, text: str):
+    '''
+    Проверка подстановок в тексте шаблона
+
+    Args:
+        email_type: тип письма
+        text: текст шаблона
+    '''
+
+    allowed = EMAIL_PLACEHOLDERS.get(email_type, ())
+    unknown = get_fields(text=text) - set(allowed)
+    if unknown:
+        raise ValueError(
+            f'Неизвестные подстановки: {", ".join(sorted(unknown))}. '
+            f'Доступны: {", ".join(allowed) or "нет"}'
+        )
+
+
+class CompiledTemplate:
+    def __init__(self, email_type: str, subject: str, message: str):
+        self.email_type = email_type
+        self.subject = subject
+        self.message = message
+        self.fields = get_fields(text=message)
+
+    def __str__(self):
+        return self.email_type
+
+    def render(self, mail_data: dict) -> str:
+        missing = self.fields - mail_data.keys()
+        if missing:
+            raise KeyError(f'Нет данных для подстановок: {", ".join(sorted(missing))}')
+        return self.message.format_map(mail_data)
+
+
+def invalidate_templates(email_type: str = None):
+    '''
+    Сброс скомпилированных шаблонов в локальных кэшах всех процессов
+
+    Args:
+        email_type: тип измененного шаблона, шаблоны остальных
+            типов сбрасываются на случай смены типа
+    '''
+
+    email_types = {choice for choice, _ in EMAIL_TYPES}
+    if email_type:
+        email_types.add(email_type)
+    for email_type in email_types:
+        redis_cache.invalidate_local(
+            key=TEMPLATE_KEY.format(email_type=email_type),
+        )
@@ -0,0 +1,84 @@
+import signal
+import time
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import close_old_connections
+
+from config.settings import (
+    EMAIL_TIMEOUT,
+    EMAIL_OUTBOX_BATCH_SIZE,
+    EMAIL_OUTBOX_INTERVAL,
+    EMAIL_OUTBOX_LOCK_TIMEOUT,
+)
+
+from notifications.services import (
+    delivery,
+    process_outbox,
+)
+from utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Отправка писем из очереди EmailOutbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EMAIL_OUTBOX_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=EMAIL_OUTBOX_INTERVAL,
+            help='Пауза в секундах, если очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Отправить одну пачку и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        # Захват пачки должен пережить ее отправку, иначе письма
+        # захватит повторно и отправит второй раз другой обработчик
+        batch_timeout = options['batch_size'] * EMAIL_TIMEOUT
+        if EMAIL_OUTBOX_LOCK_TIMEOUT <= batch_timeout:
+            raise CommandError(
+                f'EMAIL_OUTBOX_LOCK_TIMEOUT ({EMAIL_OUTBOX_LOCK_TIMEOUT} с) должен быть больше '
+                f'времени отправки пачки {options["batch_size"]} * EMAIL_TIMEOUT ({batch_timeout} с)'
+            )
+
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        logger.info(
+            msg=f'Запуск обработчика очереди писем, '
+                f'размер пачки {options["batch_size"]}',
+        )
+        while self.running:
+            close_old_connections()
+            status_code, result = process_outbox(
+                batch_size=options['batch_size'],
+                lock_timeout=EMAIL_OUTBOX_LOCK_TIMEOUT,
+            )
+            if options['once']:
+                break
+            if status_code != 200 or not sum(result.values()):
+                time.sleep(options['interval'])
+
+        delivery.close()
+        logger.info(
+            msg='Обработчик очереди писем остановлен',
+        )
+
+    def stop(self, signum, frame):
+        # Текущая пачка дописывается, чтобы письма не зависли в отправке
+        self.running = False
@@ -0,0 +1,107 @@
+import signal
+import threading
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from config.settings import (
+    EMAIL_CAMPAIGN_CHUNK_SIZE,
+    EMAIL_CAMPAIGN_RATE,
+    EMAIL_CAMPAIGN_WORKERS,
+)
+
+from notifications.models import EmailCampaign
+from notifications.services import send_campaign
+from utils.constants import (
+    EMAIL_TYPES,
+    NEWSLETTER,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылка письма всем активным пользователям. '
+        'Повторный запуск с тем же названием продолжает рассылку '
+        'с последнего обработанного пользователя'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'name',
+            help='Название рассылки',
+        )
+        parser.add_argument(
+            '--email-type',
+            default=NEWSLETTER,
+            choices=[choice for choice, _ in EMAIL_TYPES],
+            help='Тип шаблона письма',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EMAIL_CAMPAIGN_CHUNK_SIZE,
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=EMAIL_CAMPAIGN_WORKERS,
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=EMAIL_CAMPAIGN_RATE,
+            help='Лимит писем в секунду, 0 - без лимита',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать рассылку заново с первого пользователя',
+        )
+
+    def handle(self, *args, **options):
+        campaign, created = EmailCampaign.objects.get_or_create(
+            name=options['name'],
+            defaults={
+                'email_type': options['email_type'],
+            },
+        )
+        if not created and campaign.email_type != options['email_type']:
+            raise CommandError(
+                f'Рассылка {campaign} уже идет с типом письма {campaign.email_type}',
+            )
+        if options['restart']:
+            campaign.last_user_id = 0
+            campaign.sent = 0
+            campaign.failed = 0
+            campaign.finished_at = None
+            campaign.save()
+        elif campaign.finished_at is not None:
+            raise CommandError(
+                f'Рассылка {campaign} завершена {campaign.finished_at}, '
+                f'для повторной отправки используйте --restart',
+            )
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+        status_code, result = send_campaign(
+            campaign=campaign,
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            rate=options['rate'],
+            stop=stop,
+        )
+        if status_code != 200:
+            raise CommandError(
+                f'Рассылка {campaign} прервана с кодом {status_code}, '
+                f'последний обработанный пользователь {campaign.last_user_id}',
+            )
+
+        self.stdout.write(
+            f'Рассылка {campaign}: отправлено {result["sent"]}, '
+            f'не отправлено {result["failed"]}, '
+            f'последний обработанный пользователь {campaign.last_user_id}',
+        )
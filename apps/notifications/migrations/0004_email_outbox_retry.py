@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 07:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_email_outbox'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emailoutbox',
+            name='email_outbox_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата следующей попытки'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['next_attempt_at'], name='email_outbox_pending_idx'),
+        ),
+    ]
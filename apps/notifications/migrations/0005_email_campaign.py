@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_email_outbox_retry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True, verbose_name='Название')),
+                ('email_type', models.CharField(choices=[('confirm_email', 'Подтверждение адреса электронной почты'), ('password_restore', 'Восстановление пароля'), ('newsletter', 'Рассылка всем пользователям')], max_length=64, verbose_name='Тип письма')),
+                ('last_user_id', models.BigIntegerField(default=0, verbose_name='Последний обработанный пользователь')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Отправлено')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Не отправлено')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+            ],
+            options={
+                'verbose_name': 'Рассылка',
+                'verbose_name_plural': 'Рассылки',
+                'db_table': 'email_campaigns',
+            },
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='email_type',
+            field=models.CharField(choices=[('confirm_email', 'Подтверждение адреса электронной почты'), ('password_restore', 'Восстановление пароля'), ('newsletter', 'Рассылка всем пользователям')], max_length=64, verbose_name='Тип письма'),
+        ),
+        migrations.AlterField(
+            model_name='emailtemplate',
+            name='email_type',
+            field=models.CharField(choices=[('confirm_email', 'Подтверждение адреса электронной почты'), ('password_restore', 'Восстановление пароля'), ('newsletter', 'Рассылка всем пользователям')], max_length=64, unique=True, verbose_name='Тип письма'),
+        ),
+    ]
@@ -1,10 +1,29 @@
-from django.db import models
+from datetime import timedelta
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import (
+    models,
+    transaction,
+)
 from django.forms import model_to_dict
+from django.utils import timezone
 
 from solo.models import SingletonModel
 
+from notifications.email_templates import validate_template
 from utils import redis_cache
-from utils.constants import EMAIL_TYPES
+from utils.constants import (
+    EMAIL_TYPES,
+    OUTBOX_FAILED,
+    OUTBOX_PENDING,
+    OUTBOX_PROCESSING,
+    OUTBOX_STATUSES,
+)
+
+
+User = get_user_model()
 
 
 class EmailTemplate(models.Model):
@@ -25,6 +44,15 @@ class EmailTemplate(models.Model):
     def __str__(self):
         return self.email_type
 
+    def clean(self):
+        try:
+            validate_template(
+                email_type=self.email_type,
+                text=self.message,
+            )
+        except ValueError as exc:
+            raise ValidationError({'message': str(exc)})
+
     class Meta:
         db_table = 'email_templates'
         verbose_name = 'Шаблон письма'
@@ -41,13 +69,199 @@ class EmailSettings(SingletonModel):
         return ''
 
     def save(self, *args, **kwargs):
-        redis_cache.set_key(
-            key='email_settings',
-            data=model_to_dict(self),
-            time=60*60,
-        )
         super().save(*args, **kwargs)
+        # После отката транзакции в redis не должно остаться
+        # несохраненных настроек, поэтому кэш обновляется после фиксации
+        transaction.on_commit(
+            partial(
+                redis_cache.refresh_through,
+                key='email_settings',
+                data=model_to_dict(self),
+                timeout=60*60,
+            ),
+        )
 
     class Meta:
         db_table = 'email_settings'
         verbose_name = 'Настройки email'
+
+
+class EmailOutboxQuerySet(models.QuerySet):
+    def claim(self, batch_size: int, lock_timeout: int) -> list:
+        '''
+        Захват пачки писем для отправки
+
+        Строки, захваченные другими обработчиками, пропускаются.
+        Письма, зависшие в отправке дольше lock_timeout секунд
+        (обработчик упал), захватываются повторно
+
+        Args:
+            batch_size: размер пачки
+            lock_timeout: время захвата в секундах
+
+        Returns:
+            Список захваченных писем
+        '''
+
+        now = timezone.now()
+        with transaction.atomic():
+            pks = list(
+                self.filter(
+                    models.Q(
+                        status=OUTBOX_PENDING,
+                        next_attempt_at__lte=now,
+                    )
+                    | models.Q(
+                        status=OUTBOX_PROCESSING,
+                        locked_at__lt=now - timedelta(seconds=lock_timeout),
+                    ),
+                ).order_by(
+                    'next_attempt_at',
+                ).select_for_update(
+                    skip_locked=True,
+                ).values_list(
+                    'pk',
+                    flat=True,
+                )[:batch_size]
+            )
+            self.filter(pk__in=pks).update(
+                status=OUTBOX_PROCESSING,
+                locked_at=now,
+                attempts=models.F('attempts') + 1,
+            )
+        return list(
+            self.filter(
+                pk__in=pks,
+            ).select_related(
+                'recipient',
+            ).order_by(
+                'next_attempt_at',
+            )
+        )
+
+    def requeue(self) -> int:
+        '''
+        Возврат неотправленных писем в очередь со сбросом попыток
+
+        Returns:
+            Число возвращенных писем
+        '''
+
+        return self.filter(
+            status__in=[OUTBOX_PENDING, OUTBOX_FAILED],
+        ).update(
+            status=OUTBOX_PENDING,
+            attempts=0,
+            error='',
+            next_attempt_at=timezone.now(),
+        )
+
+
+class EmailOutbox(models.Model):
+    email_type = models.CharField(
+        verbose_name='Тип письма',
+        max_length=64,
+        choices=EMAIL_TYPES,
+    )
+    mail_data = models.JSONField(
+        verbose_name='Данные письма',
+        default=dict,
+        blank=True,
+    )
+    recipient = models.ForeignKey(
+        verbose_name='Получатель',
+        to=User,
+        related_name='outbox_emails',
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=OUTBOX_STATUSES,
+        default=OUTBOX_PENDING,
+    )
+    attempts = models.PositiveIntegerField(
+        verbose_name='Попытки отправки',
+        default=0,
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True,
+    )
+    next_attempt_at = models.DateTimeField(
+        verbose_name='Дата следующей попытки',
+        default=timezone.now,
+    )
+    locked_at = models.DateTimeField(
+        verbose_name='Дата захвата обработчиком',
+        null=True,
+        blank=True,
+    )
+    sent_at = models.DateTimeField(
+        verbose_name='Дата отправки',
+        null=True,
+        blank=True,
+    )
+
+    objects = EmailOutboxQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.email_type} {self.recipient}'
+
+    class Meta:
+        db_table = 'email_outbox'
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Очередь писем'
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                name='email_outbox_pending_idx',
+                condition=models.Q(status__in=[OUTBOX_PENDING, OUTBOX_PROCESSING]),
+            ),
+        ]
+
+
+class EmailCampaign(models.Model):
+    name = models.CharField(
+        verbose_name='Название',
+        max_length=128,
+        unique=True,
+    )
+    email_type = models.CharField(
+        verbose_name='Тип письма',
+        max_length=64,
+        choices=EMAIL_TYPES,
+    )
+    last_user_id = models.BigIntegerField(
+        verbose_name='Последний обработанный пользователь',
+        default=0,
+    )
+    sent = models.PositiveIntegerField(
+        verbose_name='Отправлено',
+        default=0,
+    )
+    failed = models.PositiveIntegerField(
+        verbose_name='Не отправлено',
+        default=0,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Дата завершения',
+        null=True,
+        blank=True,
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'email_campaigns'
+        verbose_name = 'Рассылка'
+        verbose_name_plural = 'Рассылки'
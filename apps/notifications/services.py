@@ -1,23 +1,230 @@
-from django.core.mail import send_mail
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.core.mail import (
+    EmailMessage,
+    get_connection,
+)
 from django.contrib.auth import get_user_model
 from django.forms import model_to_dict
+from django.utils import timezone
 
 from config.settings import (
+    EMAIL_CONNECTION_IDLE_TIMEOUT,
     EMAIL_HOST_USER,
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_RETRY_BASE_DELAY,
+    EMAIL_RETRY_MAX_DELAY,
 )
 
+from notifications.email_templates import (
+    TEMPLATE_KEY,
+    CompiledTemplate,
+)
 from notifications.models import (
+    EmailCampaign,
+    EmailOutbox,
     EmailSettings,
     EmailTemplate,
 )
 from utils import redis_cache
-from utils.logger import get_logger
+from utils.constants import (
+    OUTBOX_FAILED,
+    OUTBOX_PENDING,
+    OUTBOX_PROCESSING,
+    OUTBOX_SENT,
+)
+from utils.logger import (
+    StructuredMessage,
+    get_logger,
+)
 
 
-User = get_user_model
+User = get_user_model()
 logger = get_logger(__name__)
 
 
+def is_connection_error(exc: Exception) -> bool:
+    # SMTPException наследуется от OSError, но отказ сервера принять
+    # конкретное письмо не лечится переподключением
+    if isinstance(exc, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+def is_permanent_error(exc: Exception) -> bool:
+    # Повторять имеет смысл все, кроме явного отказа сервера с кодом 5xx
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+def get_retry_delay(attempts: int) -> float:
+    '''
+    Задержка перед повторной отправкой письма
+
+    Экспоненциальный рост с разбросом в половину задержки, чтобы
+    письма, упавшие вместе, не повторялись одновременно
+
+    Args:
+        attempts: число сделанных попыток
+
+    Returns:
+        Задержка в секундах
+    '''
+
+    delay = min(EMAIL_RETRY_MAX_DELAY, EMAIL_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class EmailDelivery:
+    '''
+    Отправка писем через одно долгоживущее SMTP соединение на процесс
+
+    Соединение открывается при первой отправке и переиспользуется между
+    пачками. Соединение, простаивавшее дольше idle_timeout секунд,
+    закрывается заранее, потому что сервер все равно его разорвет.
+    При обрыве соединения письмо отправляется повторно один раз
+    через новое соединение
+    '''
+
+    def __init__(self, idle_timeout: float):
+        self.idle_timeout = idle_timeout
+        self.connection = None
+        self.used_at = 0
+        self.lock = threading.Lock()
+
+    def get_connection(self):
+        if self.connection is not None and time.monotonic() - self.used_at > self.idle_timeout:
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(
+                fail_silently=False,
+            )
+        self.connection.open()
+        return self.connection
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+        except Exception as exc:
+            logger.warning(
+                msg=f'Не удалось закрыть SMTP соединение: {exc}',
+            )
+        self.connection = None
+
+    def reset(self):
+        # Сокет родительского процесса в дочернем не используется
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def send_message(self, message: EmailMessage) -> (int, str):
+        for attempt in range(2):
+            try:
+                self.get_connection().send_messages([message])
+            except Exception as exc:
+                if is_connection_error(exc=exc):
+                    self.close()
+                    if not attempt:
+                        logger.warning(
+                            msg=f'Обрыв SMTP соединения, переподключение: {exc}',
+                        )
+                        continue
+                logger.error(
+                    msg=f'Не удалось отправить письмо {message.subject} '
+                        f'пользователю {", ".join(message.to)}: {exc}',
+                )
+                if is_permanent_error(exc=exc):
+                    return 500, str(exc)
+                return 503, str(exc)
+            finally:
+                self.used_at = time.monotonic()
+            return 200, ''
+
+    def send_messages(self, messages: list) -> list:
+        '''
+        Отправка пачки писем
+
+        Args:
+            messages: список объектов EmailMessage
+
+        Returns:
+            Список кодов статуса и ошибок в порядке писем,
+            503 - временная ошибка, письмо можно отправить повторно
+            [(200, ''), (503, 'Connection unexpectedly closed')]
+        '''
+
+        if not messages:
+            return []
+
+        started = time.monotonic()
+        with self.lock:
+            statuses = [
+                self.send_message(message=message)
+                for message in messages
+            ]
+        spent = time.monotonic() - started
+
+        sent = sum(status_code == 200 for status_code, _ in statuses)
+        logger.info(
+            msg=StructuredMessage(
+                'Отправлена пачка писем',
+                sent=sent,
+                failed=len(statuses) - sent,
+                seconds=round(spent, 3),
+                per_second=round(sent / spent, 1) if spent else None,
+            ),
+        )
+        return statuses
+
+
+delivery = EmailDelivery(
+    idle_timeout=EMAIL_CONNECTION_IDLE_TIMEOUT,
+)
+os.register_at_fork(after_in_child=delivery.reset)
+
+
+def get_email_settings() -> dict | None:
+    '''
+    Получение настроек email
+
+    Returns:
+        Объект EmailSettings или None
+    '''
+
+    logger.info(
+        msg='Получение настроек email',
+    )
+
+    status, email_settings = redis_cache.get(
+        key='email_settings',
+        model=EmailSettings,
+        timeout=60*60,
+        pk=1,
+        local=True,
+    )
+    if status != 200:
+        logger.error(
+            msg=f'Не удалось получить настройки email',
+        )
+        return None
+
+    logger.info(
+        msg='Настройки email получены',
+    )
+    return email_settings
+
+
 class Email:
     email_host_user = EMAIL_HOST_USER
 
@@ -26,14 +233,23 @@ class Email:
         self.mail_data = mail_data
         self.recipient = recipient
 
-    def _get_email_template(self):
+    def _get_email_template(self) -> CompiledTemplate | None:
         '''
-        Получение шаблона письма
+        Получение скомпилированного шаблона письма
+
+        Шаблон хранится в локальном кэше процесса и сбрасывается
+        при изменении или удалении EmailTemplate
 
         Returns:
-            Объект EmailTemplate или None
+            Объект CompiledTemplate или None
         '''
 
+        key = TEMPLATE_KEY.format(email_type=self.email_type)
+        redis_cache.local_cache.subscribe()
+        template = redis_cache.local_cache.get(key=key)
+        if template is not redis_cache.MISSING:
+            return template
+
         logger.info(
             msg=f'Поиск шаблона для письма {self.email_type}',
         )
@@ -45,37 +261,32 @@ class Email:
                     f'Ошибки: {exc}',
             )
             return None
-        return mail
-
-    @property
-    def get_send_email_settings(self) -> dict | None:
-        '''
-        Получение настроек email
-
-        Returns:
-            Объект EmailSettings или None
-        '''
 
-        logger.info(
-            msg='Получение настроек email',
-        )
+        if mail is None:
+            return None
 
-        status, email_settings = redis_cache.get(
-            key='email_settings',
-            model=EmailSettings,
-            timeout=60*60,
-            pk=1,
-        )
-        if status != 200:
+        try:
+            template = CompiledTemplate(
+                email_type=mail.email_type,
+                subject=mail.subject,
+                message=mail.message,
+            )
+        except ValueError as exc:
             logger.error(
-                msg=f'Не удалось получить настройки email',
+                msg=f'Не удалось разобрать шаблон для письма {self.email_type} '
+                    f'Ошибки: {exc}',
             )
             return None
 
-        logger.info(
-            msg='Настройки email получены',
+        redis_cache.local_cache.set(
+            key=key,
+            data=template,
         )
-        return email_settings
+        return template
+
+    @property
+    def get_send_email_settings(self) -> dict | None:
+        return get_email_settings()
 
     def formate_email_text(self) -> (int, dict):
         '''
@@ -108,7 +319,7 @@ class Email:
 
         subject = mail.subject
         try:
-            message = mail.message.format(**self.mail_data)
+            message = mail.render(mail_data=self.mail_data)
         except Exception as exc:
             logger.error(
                 msg=f'Не удалось сформатировать текст для письма {mail} '
@@ -125,9 +336,12 @@ class Email:
             'message': message,
         }
 
-    def send(self) -> int:
+    def enqueue(self) -> int:
         '''
-        Отправка письма
+        Добавление письма в очередь отправки
+
+        Письмо сохраняется в текущей транзакции, а отправляет его
+        обработчик process_email_outbox
 
         Returns:
             Код статуса
@@ -141,34 +355,490 @@ class Email:
             )
             return 403
 
+        logger.info(
+            msg=f'Добавление письма {self.email_type} '
+                f'пользователю {self.recipient} в очередь',
+        )
+        try:
+            EmailOutbox.objects.create(
+                email_type=self.email_type,
+                mail_data=self.mail_data,
+                recipient=self.recipient,
+            )
+        except Exception as exc:
+            logger.error(
+                msg=f'Не удалось добавить письмо {self.email_type} '
+                    f'пользователю {self.recipient} в очередь: {exc}',
+            )
+            return 500
+
+        logger.info(
+            msg=f'Письмо {self.email_type} пользователю {self.recipient} '
+                f'добавлено в очередь',
+        )
+        return 200
+
+    def get_message(self) -> (int, EmailMessage | None):
+        '''
+        Формирование письма для отправки
+
+        Returns:
+            Код статуса и объект EmailMessage или None
+        '''
+
+        email_settings = self.get_send_email_settings
+        if not email_settings or not email_settings['send_emails']:
+            logger.warning(
+                msg='Отправка писем отключена',
+            )
+            return 403, None
+
         status_code, email_text = self.formate_email_text()
         if status_code != 200:
             logger.error(
                 msg=f'Не удалось сформировать текст для письма {self.email_type} '
                     f'пользователю {self.recipient}'
             )
+            return status_code, None
+
+        return 200, EmailMessage(
+            subject=email_text['subject'],
+            body=email_text['message'],
+            from_email=self.email_host_user,
+            to=[self.recipient.email],
+        )
+
+    def send(self) -> int:
+        '''
+        Отправка письма
+
+        Returns:
+            Код статуса
+            200
+        '''
+
+        status_code, message = self.get_message()
+        if status_code != 200:
             return status_code
 
-        subject = email_text["subject"]
         logger.info(
-            msg=f'Отправка письма {subject} пользователю {self.recipient}',
+            msg=f'Отправка письма {message.subject} пользователю {self.recipient}',
+        )
+        (status_code, _), = delivery.send_messages(
+            messages=[message],
+        )
+        if status_code == 200:
+            logger.info(
+                msg=f'Письмо {message.subject} пользователю {self.recipient} успешно отправлено',
+            )
+        return status_code
+
+
+def process_outbox(batch_size: int, lock_timeout: int) -> (int, dict):
+    '''
+    Отправка пачки писем из очереди
+
+    Пока отправка отключена в EmailSettings, письма не захватываются.
+    Письма с временной ошибкой SMTP возвращаются в очередь с растущей
+    задержкой. После EMAIL_MAX_ATTEMPTS попыток, а также при ошибке,
+    которую повтор не исправит, письмо остается в очереди со статусом
+    failed, откуда его можно вернуть действием в админке.
+
+    Если обработчик упадет после отправки, но до сохранения статуса,
+    письмо будет отправлено повторно после lock_timeout. Статус
+    сохраняется, только пока письмо захвачено этим обработчиком
+
+    Args:
+        batch_size: размер пачки
+        lock_timeout: время захвата писем в секундах
+
+    Returns:
+        Код статуса и словарь данных
+        200,
+        {
+            "sent": 10,
+            "retried": 1,
+            "failed": 0
+        }
+    '''
+
+    result = {
+        'sent': 0,
+        'retried': 0,
+        'failed': 0,
+    }
+    email_settings = get_email_settings()
+    if not email_settings or not email_settings['send_emails']:
+        # Письма не захватываются и ждут включения отправки в очереди
+        logger.info(
+            msg=StructuredMessage(
+                'Отправка писем отключена, очередь не обрабатывается',
+                status=403,
+            ),
+        )
+        return 200, result
+
+    try:
+        emails = EmailOutbox.objects.claim(
+            batch_size=batch_size,
+            lock_timeout=lock_timeout,
+        )
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Не удалось получить письма из очереди',
+                status=500,
+                error=exc,
+            ),
         )
+        return 500, {}
+
+    if not emails:
+        return 200, result
+
+    logger.info(
+        msg=StructuredMessage(
+            'Отправка писем из очереди',
+            count=len(emails),
+        ),
+    )
+
+    statuses = {}
+    messages = {}
+    for outbox in emails:
+        email = Email(
+            email_type=outbox.email_type,
+            mail_data=outbox.mail_data,
+            recipient=outbox.recipient,
+        )
+        status_code, message = email.get_message()
+        if message is None:
+            statuses[outbox.pk] = (status_code, 'Не удалось сформировать письмо')
+        else:
+            messages[outbox.pk] = message
+
+    statuses.update(zip(
+        messages,
+        delivery.send_messages(
+            messages=list(messages.values()),
+        ),
+    ))
+
+    for outbox in emails:
+        status_code, error = statuses[outbox.pk]
+        if status_code == 200:
+            outbox.status = OUTBOX_SENT
+            outbox.sent_at = timezone.now()
+            outbox.error = ''
+            result['sent'] += 1
+        elif status_code == 403:
+            # Отправку отключили во время пачки: письмо ждет ее
+            # включения в очереди, и попытка не расходуется
+            outbox.status = OUTBOX_PENDING
+            outbox.attempts -= 1
+            outbox.next_attempt_at = timezone.now() + timedelta(
+                seconds=get_retry_delay(attempts=1),
+            )
+            result['retried'] += 1
+        else:
+            outbox.error = f'Код статуса {status_code}: {error}'
+            if status_code == 503 and outbox.attempts < EMAIL_MAX_ATTEMPTS:
+                outbox.status = OUTBOX_PENDING
+                outbox.next_attempt_at = timezone.now() + timedelta(
+                    seconds=get_retry_delay(attempts=outbox.attempts),
+                )
+                result['retried'] += 1
+            else:
+                outbox.status = OUTBOX_FAILED
+                result['failed'] += 1
+
         try:
-            send_mail(
-                subject=subject,
-                message=email_text['message'],
-                from_email=self.email_host_user,
-                recipient_list=[self.recipient],
+            # Статус сохраняется, только если письмо все еще захвачено
+            # этим обработчиком: после истечения захвата письмо
+            # принадлежит тому, кто захватил его повторно
+            updated = EmailOutbox.objects.filter(
+                pk=outbox.pk,
+                status=OUTBOX_PROCESSING,
+                locked_at=outbox.locked_at,
+            ).update(
+                status=outbox.status,
+                attempts=outbox.attempts,
+                sent_at=outbox.sent_at,
+                next_attempt_at=outbox.next_attempt_at,
+                error=outbox.error,
             )
         except Exception as exc:
             logger.error(
-                msg=f'Не удалось отправить письмо {subject} '
-                    f'пользователю {self.recipient}'
-                    f'Ошибки: {exc}',
+                msg=StructuredMessage(
+                    'Не удалось сохранить статус письма из очереди',
+                    outbox_pk=outbox.pk,
+                    error=exc,
+                ),
             )
-            return 500
+            continue
 
-        logger.info(
-            msg=f'Письмо {subject} пользователю {self.recipient} успешно отправлено',
+        if not updated:
+            logger.warning(
+                msg=StructuredMessage(
+                    'Захват письма истек до сохранения статуса',
+                    outbox_pk=outbox.pk,
+                    status=outbox.status,
+                    lock_timeout=lock_timeout,
+                ),
+            )
+
+    logger.info(
+        msg=StructuredMessage(
+            'Обработана пачка писем из очереди',
+            **result,
+        ),
+    )
+    return 200, result
+
+
+class Throttle:
+    '''
+    Ограничение частоты отправки для всех потоков
+
+    Вызовы wait() распределяются равномерно, не чаще rate в секунду
+    '''
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            send_at = max(self.next_at, now)
+            self.next_at = send_at + self.interval
+        time.sleep(send_at - now)
+
+
+class CampaignSender:
+    '''
+    Отправка писем рассылки пулом потоков
+
+    У каждого потока свое SMTP соединение, общая частота
+    ограничивается Throttle
+    '''
+
+    def __init__(self, workers: int, rate: float):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='campaign',
         )
-        return 200
+        self.throttle = Throttle(rate=rate)
+        self.local = threading.local()
+        self.deliveries = []
+
+    def get_delivery(self) -> EmailDelivery:
+        delivery = getattr(self.local, 'delivery', None)
+        if delivery is None:
+            delivery = self.local.delivery = EmailDelivery(
+                idle_timeout=EMAIL_CONNECTION_IDLE_TIMEOUT,
+            )
+            self.deliveries.append(delivery)
+        return delivery
+
+    def send(self, message: EmailMessage) -> (int, str):
+        self.throttle.wait()
+        return self.get_delivery().send_message(message=message)
+
+    def send_messages(self, messages: list) -> list:
+        return list(self.executor.map(self.send, messages))
+
+    def close(self):
+        self.executor.shutdown()
+        for delivery in self.deliveries:
+            delivery.close()
+
+
+def send_campaign(campaign: EmailCampaign, chunk_size: int, workers: int,
+                  rate: float, stop: threading.Event = None) -> (int, dict):
+    '''
+    Отправка рассылки всем активным пользователям
+
+    Пользователи читаются по возрастанию pk частями по chunk_size.
+    После каждой части в campaign сохраняется последний обработанный
+    пользователь, и повторный запуск продолжает с него. При падении
+    посреди части ее письма могут уйти повторно.
+
+    Письма с ошибкой отправки попадают в очередь EmailOutbox: временные
+    ошибки повторяет обработчик очереди, остальные остаются в статусе
+    failed и возвращаются действием в админке
+
+    Args:
+        campaign: рассылка
+        chunk_size: размер части пользователей
+        workers: число потоков отправки
+        rate: лимит писем в секунду, 0 - без лимита
+        stop: событие остановки после текущей части
+
+    Returns:
+        Код статуса и словарь данных
+        200,
+        {
+            "sent": 1000,
+            "failed": 2
+        }
+    '''
+
+    logger.info(
+        msg=StructuredMessage(
+            'Запуск рассылки',
+            campaign=campaign.name,
+            email_type=campaign.email_type,
+            last_user_id=campaign.last_user_id,
+        ),
+    )
+
+    users = User.objects.filter(
+        is_active=True,
+        pk__gt=campaign.last_user_id,
+    ).order_by(
+        'pk',
+    ).only(
+        'pk',
+        'email',
+        'nickname',
+    ).iterator(
+        chunk_size=chunk_size,
+    )
+
+    sender = CampaignSender(
+        workers=workers,
+        rate=rate,
+    )
+    try:
+        while chunk := list(islice(users, chunk_size)):
+            status_code = send_campaign_chunk(
+                campaign=campaign,
+                chunk=chunk,
+                sender=sender,
+            )
+            if status_code != 200:
+                return status_code, {}
+            if stop is not None and stop.is_set():
+                logger.warning(
+                    msg=StructuredMessage(
+                        'Рассылка остановлена',
+                        campaign=campaign.name,
+                        last_user_id=campaign.last_user_id,
+                    ),
+                )
+                return 200, {
+                    'sent': campaign.sent,
+                    'failed': campaign.failed,
+                }
+    except Exception as exc:
+        logger.error(
+            msg=f'Возникла ошибка при отправке рассылки {campaign}: {exc}',
+        )
+        return 500, {}
+    finally:
+        sender.close()
+
+    campaign.finished_at = timezone.now()
+    campaign.save(
+        update_fields=[
+            'finished_at',
+        ],
+    )
+    logger.info(
+        msg=StructuredMessage(
+            'Рассылка завершена',
+            campaign=campaign.name,
+            sent=campaign.sent,
+            failed=campaign.failed,
+        ),
+    )
+    return 200, {
+        'sent': campaign.sent,
+        'failed': campaign.failed,
+    }
+
+
+def send_campaign_chunk(campaign: EmailCampaign, chunk: list, sender: CampaignSender) -> int:
+    started = time.monotonic()
+    recipients = []
+    messages = []
+    failures = []
+    for user in chunk:
+        mail_data = {
+            'email': user.email,
+            'nickname': user.nickname,
+        }
+        email = Email(
+            email_type=campaign.email_type,
+            mail_data=mail_data,
+            recipient=user,
+        )
+        status_code, message = email.get_message()
+        if status_code in (403, 501):
+            # Отправка отключена или нет шаблона, остальным пользователям
+            # письмо тоже не уйдет
+            logger.error(
+                msg=StructuredMessage(
+                    'Рассылка прервана',
+                    campaign=campaign.name,
+                    status=status_code,
+                ),
+            )
+            return status_code
+        if message is None:
+            failures.append((user, mail_data, status_code, 'Не удалось сформировать письмо'))
+        else:
+            recipients.append((user, mail_data))
+            messages.append(message)
+
+    for (user, mail_data), (status_code, error) in zip(
+        recipients,
+        sender.send_messages(messages=messages),
+    ):
+        if status_code != 200:
+            failures.append((user, mail_data, status_code, error))
+
+    now = timezone.now()
+    EmailOutbox.objects.bulk_create([
+        EmailOutbox(
+            email_type=campaign.email_type,
+            mail_data=mail_data,
+            recipient=user,
+            status=OUTBOX_PENDING if status_code == 503 else OUTBOX_FAILED,
+            attempts=1,
+            error=f'Код статуса {status_code}: {error}',
+            next_attempt_at=now + timedelta(
+                seconds=get_retry_delay(attempts=1),
+            ),
+        )
+        for user, mail_data, status_code, error in failures
+    ])
+
+    campaign.last_user_id = chunk[-1].pk
+    campaign.sent += len(chunk) - len(failures)
+    campaign.failed += len(failures)
+    campaign.save(
+        update_fields=[
+            'last_user_id',
+            'sent',
+            'failed',
+        ],
+    )
+
+    spent = time.monotonic() - started
+    logger.info(
+        msg=StructuredMessage(
+            'Отправлена часть рассылки',
+            campaign=campaign.name,
+            last_user_id=campaign.last_user_id,
+            sent=len(chunk) - len(failures),
+            failed=len(failures),
+            per_second=round(len(chunk) / spent, 1) if spent else None,
+        ),
+    )
+    return 200
@@ -0,0 +1,21 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+)
+from django.dispatch import receiver
+
+from notifications.email_templates import invalidate_templates
+from notifications.models import EmailTemplate
+
+
+@receiver([post_save, post_delete], sender=EmailTemplate)
+def invalidate_email_templates(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(
+            invalidate_templates,
+            email_type=instance.email_type,
+        ),
+    )
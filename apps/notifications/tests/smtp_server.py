@@ -0,0 +1,72 @@
+import socketserver
+import threading
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        received = 0
+        self.reply('220 localhost')
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            name = command[:4].upper()
+            if name in ('EHLO', 'HELO', 'MAIL', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif name == 'RCPT':
+                if server.refuse and server.refuse in command:
+                    self.reply('550 No such user')
+                else:
+                    self.reply('250 OK')
+            elif name == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data.append(line)
+                server.messages.append(b''.join(data))
+                self.reply('250 OK')
+                received += 1
+                if server.drop_after and received >= server.drop_after:
+                    # Сервер молча рвет соединение, как при простое
+                    return
+            elif name == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    '''
+    Локальный SMTP сервер для тестов отправки писем
+
+    drop_after - после скольких писем сервер рвет соединение,
+    refuse - подстрока адреса, который сервер отклоняет
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.port = self.server_address[1]
+        self.reset()
+
+    def reset(self, drop_after: int = 0, refuse: str = None):
+        self.connections = 0
+        self.messages = []
+        self.drop_after = drop_after
+        self.refuse = refuse
+
+    def start(self):
+        threading.Thread(
+            target=self.serve_forever,
+            daemon=True,
+        ).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
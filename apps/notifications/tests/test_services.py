@@ -1,13 +1,50 @@
 import json
 import os
+import time
 
-from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from unittest.mock import patch
 
-from notifications.models import EmailSettings
-from notifications.services import Email
+from config.settings import EMAIL_MAX_ATTEMPTS
+
+from notifications.models import (
+    EmailCampaign,
+    EmailOutbox,
+    EmailSettings,
+    EmailTemplate,
+)
+from notifications.services import (
+    CampaignSender,
+    Email,
+    EmailDelivery,
+    Throttle,
+    get_retry_delay,
+    process_outbox,
+    send_campaign,
+)
+from notifications.tests.smtp_server import SMTPServer
+from utils import redis_cache
+from utils.constants import (
+    NEWSLETTER,
+    OUTBOX_FAILED,
+    OUTBOX_PENDING,
+    OUTBOX_PROCESSING,
+    OUTBOX_SENT,
+)
 
 
 CUR_DIR = os.path.dirname(__file__)
@@ -28,6 +65,9 @@ class ServicesTest(TestCase):
         )
         cls.settings = EmailSettings.get_solo()
 
+    def setUp(self):
+        redis_cache.local_cache.clear()
+
     def test_formate_email_text(self):
         path = f'{self.path}/formate_email_text'
         fixtures = (
@@ -71,7 +111,8 @@ class ServicesTest(TestCase):
                 data = json.load(file)
 
             self.settings.send_emails = data.get('send_emails')
-            self.settings.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.settings.save()
 
             email = Email(
                 email_type=data.get('email_type'),
@@ -80,4 +121,380 @@ class ServicesTest(TestCase):
             )
 
             status_code = email.send()
-            self.assertEqual(status_code, code, msg=fixture)
\ No newline at end of file
+            self.assertEqual(status_code, code, msg=fixture)
+
+    def test_enqueue(self):
+        path = f'{self.path}/enqueue'
+        fixtures = (
+            (200, 'valid_confirm_email'),
+            (403, 'enable_send_emails'),
+        )
+
+        for code, name in fixtures:
+            fixture = f'{code}_{name}'
+
+            with open(f'{path}/{fixture}_request.json') as file:
+                data = json.load(file)
+
+            self.settings.send_emails = data.get('send_emails')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.settings.save()
+
+            email = Email(
+                email_type=data.get('email_type'),
+                mail_data=data.get('mail_data'),
+                recipient=self.user,
+            )
+
+            status_code = email.enqueue()
+            self.assertEqual(status_code, code, msg=fixture)
+
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+        self.assertEqual(EmailOutbox.objects.get().status, OUTBOX_PENDING)
+
+    def test_settings_rollback(self):
+        self.settings.send_emails = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.settings.send_emails = False
+                    self.settings.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        status_code, data = redis_cache.get(
+            key='email_settings',
+        )
+        self.assertEqual(status_code, 200)
+        self.assertTrue(data['send_emails'])
+
+    def test_process_outbox(self):
+        self.settings.send_emails = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+        for email_type in ('confirm_email', 'invalid'):
+            EmailOutbox.objects.create(
+                email_type=email_type,
+                mail_data={'url': 'test_url'},
+                recipient=self.user,
+            )
+
+        status_code, response = process_outbox(
+            batch_size=10,
+            lock_timeout=60,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response, {'sent': 1, 'retried': 0, 'failed': 1})
+        self.assertEqual(
+            list(EmailOutbox.objects.order_by('pk').values_list('status', 'attempts')),
+            [(OUTBOX_SENT, 1), (OUTBOX_FAILED, 1)],
+        )
+
+    @patch('notifications.services.delivery.send_messages')
+    def test_retry(self, mock_send_messages):
+        mock_send_messages.return_value = [(503, 'Connection unexpectedly closed')]
+        self.settings.send_emails = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+        outbox = EmailOutbox.objects.create(
+            email_type='confirm_email',
+            mail_data={'url': 'test_url'},
+            recipient=self.user,
+        )
+
+        for attempt in range(1, EMAIL_MAX_ATTEMPTS + 1):
+            status_code, response = process_outbox(
+                batch_size=10,
+                lock_timeout=60,
+            )
+            outbox.refresh_from_db()
+            self.assertEqual(outbox.attempts, attempt)
+            if attempt < EMAIL_MAX_ATTEMPTS:
+                self.assertEqual(response['retried'], 1)
+                self.assertEqual(outbox.status, OUTBOX_PENDING)
+                self.assertGreater(outbox.next_attempt_at, timezone.now())
+                self.assertEqual(
+                    process_outbox(batch_size=10, lock_timeout=60)[1]['retried'],
+                    0,
+                )
+                EmailOutbox.objects.update(next_attempt_at=timezone.now())
+
+        self.assertEqual(response['failed'], 1)
+        self.assertEqual(outbox.status, OUTBOX_FAILED)
+        self.assertIn('Connection unexpectedly closed', outbox.error)
+
+        self.assertEqual(EmailOutbox.objects.requeue(), 1)
+        outbox.refresh_from_db()
+        self.assertEqual((outbox.status, outbox.attempts), (OUTBOX_PENDING, 0))
+
+    def test_process_outbox_disabled(self):
+        self.settings.send_emails = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+        outbox = EmailOutbox.objects.create(
+            email_type='confirm_email',
+            mail_data={'url': 'test_url'},
+            recipient=self.user,
+        )
+
+        status_code, response = process_outbox(
+            batch_size=10,
+            lock_timeout=60,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response, {'sent': 0, 'retried': 0, 'failed': 0})
+        outbox.refresh_from_db()
+        self.assertEqual((outbox.status, outbox.attempts), (OUTBOX_PENDING, 0))
+
+        # Отправку отключили после захвата пачки
+        self.settings.send_emails = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+        with patch('notifications.services.Email.get_message', return_value=(403, None)):
+            status_code, response = process_outbox(
+                batch_size=10,
+                lock_timeout=60,
+            )
+        self.assertEqual(response['retried'], 1)
+        outbox.refresh_from_db()
+        self.assertEqual((outbox.status, outbox.attempts), (OUTBOX_PENDING, 0))
+        self.assertGreater(outbox.next_attempt_at, timezone.now())
+
+    @patch('notifications.services.delivery.send_messages')
+    def test_process_outbox_lock_expired(self, mock_send_messages):
+        def send_messages(messages):
+            # Захват истек, и письмо повторно захватил другой обработчик
+            EmailOutbox.objects.update(locked_at=timezone.now())
+            return [(200, '')] * len(messages)
+
+        mock_send_messages.side_effect = send_messages
+        self.settings.send_emails = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+        outbox = EmailOutbox.objects.create(
+            email_type='confirm_email',
+            mail_data={'url': 'test_url'},
+            recipient=self.user,
+        )
+
+        status_code, response = process_outbox(
+            batch_size=10,
+            lock_timeout=60,
+        )
+        self.assertEqual(status_code, 200)
+        outbox.refresh_from_db()
+        self.assertEqual(outbox.status, OUTBOX_PROCESSING)
+        self.assertIsNone(outbox.sent_at)
+
+    def test_retry_delay(self):
+        for attempts, low, high in ((1, 15, 30), (2, 30, 60), (20, 1800, 3600)):
+            delay = get_retry_delay(attempts=attempts)
+            self.assertTrue(low <= delay <= high, msg=attempts)
+
+    def test_send_campaign(self):
+        self.settings.send_emails = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+        EmailTemplate.objects.create(
+            email_type=NEWSLETTER,
+            subject='Новые условия',
+            message='{nickname}, условия изменились',
+        )
+        users = [
+            User.objects.create_user(
+                email=f'campaign{number}@cc.com',
+                password='test123',
+            )
+            for number in range(4)
+        ]
+        User.objects.filter(pk=users[-1].pk).update(is_active=False)
+
+        # Рассылка уже дошла до первого пользователя
+        campaign = EmailCampaign.objects.create(
+            name='terms',
+            email_type=NEWSLETTER,
+            last_user_id=users[0].pk,
+        )
+        status_code, response = send_campaign(
+            campaign=campaign,
+            chunk_size=2,
+            workers=2,
+            rate=0,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response, {'sent': 2, 'failed': 0})
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [users[1].email, users[2].email],
+        )
+        self.assertIn(
+            f'{users[1].nickname}, условия изменились',
+            [message.body for message in mail.outbox],
+        )
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.last_user_id, users[2].pk)
+        self.assertIsNotNone(campaign.finished_at)
+
+    def test_claim(self):
+        for _ in range(3):
+            EmailOutbox.objects.create(
+                email_type='confirm_email',
+                recipient=self.user,
+            )
+
+        self.assertEqual(len(EmailOutbox.objects.claim(batch_size=2, lock_timeout=60)), 2)
+        self.assertEqual(len(EmailOutbox.objects.claim(batch_size=2, lock_timeout=60)), 1)
+        self.assertEqual(EmailOutbox.objects.claim(batch_size=2, lock_timeout=60), [])
+        self.assertEqual(
+            EmailOutbox.objects.filter(status=OUTBOX_PROCESSING).count(),
+            3,
+        )
+
+        # Обработчик упал, письма захватываются повторно
+        self.assertEqual(len(EmailOutbox.objects.claim(batch_size=5, lock_timeout=0)), 3)
+
+    def test_template_cache(self):
+        email = Email(
+            email_type='confirm_email',
+            mail_data={'url': 'test_url'},
+            recipient=self.user,
+        )
+        email.formate_email_text()
+        with self.assertNumQueries(0):
+            status_code, response = email.formate_email_text()
+        self.assertEqual(status_code, 200)
+
+        template = EmailTemplate.objects.get(email_type='confirm_email')
+        template.message = 'Новая ссылка {url}'
+        with self.captureOnCommitCallbacks(execute=True):
+            template.save()
+
+        status_code, response = email.formate_email_text()
+        self.assertEqual(response['message'], 'Новая ссылка test_url')
+
+    def test_template_placeholders(self):
+        fixtures = (
+            (True, 'Ссылка {url}'),
+            (True, 'Ссылка {url!s:>20} {{без подстановки}}'),
+            (False, 'Ссылка {token}'),
+            (False, 'Ссылка {}'),
+            (False, 'Ссылка {url.host}'),
+            (False, 'Ссылка {url'),
+        )
+
+        for valid, message in fixtures:
+            template = EmailTemplate(
+                email_type='confirm_email',
+                subject='Подтверждение',
+                message=message,
+            )
+            if valid:
+                template.clean()
+            else:
+                with self.assertRaises(ValidationError, msg=message):
+                    template.clean()
+
+
+class DeliveryTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = SMTPServer()
+        cls.server.start()
+        cls.settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=cls.server.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.reset()
+        self.delivery = EmailDelivery(
+            idle_timeout=60,
+        )
+
+    def tearDown(self):
+        self.delivery.close()
+
+    def get_messages(self, count: int) -> list:
+        return [
+            EmailMessage(
+                subject=f'Письмо {number}',
+                body='Текст',
+                from_email='test@cc.com',
+                to=[f'user{number}@cc.com'],
+            )
+            for number in range(count)
+        ]
+
+    def test_connection_reuse(self):
+        for _ in range(2):
+            statuses = self.delivery.send_messages(
+                messages=self.get_messages(count=5),
+            )
+            self.assertEqual(statuses, [(200, '')] * 5)
+
+        self.assertEqual(len(self.server.messages), 10)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_reconnect(self):
+        self.server.reset(
+            drop_after=2,
+        )
+        statuses = self.delivery.send_messages(
+            messages=self.get_messages(count=5),
+        )
+        self.assertEqual(statuses, [(200, '')] * 5)
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_refused(self):
+        self.server.reset(
+            refuse='user1@',
+        )
+        statuses = self.delivery.send_messages(
+            messages=self.get_messages(count=3),
+        )
+        self.assertEqual(
+            [status_code for status_code, _ in statuses],
+            [200, 500, 200],
+        )
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_campaign_sender(self):
+        sender = CampaignSender(
+            workers=3,
+            rate=0,
+        )
+        statuses = sender.send_messages(
+            messages=self.get_messages(count=9),
+        )
+        sender.close()
+        self.assertEqual(statuses, [(200, '')] * 9)
+        self.assertEqual(len(self.server.messages), 9)
+        self.assertLessEqual(self.server.connections, 3)
+
+    def test_throttle(self):
+        throttle = Throttle(rate=50)
+        started = time.monotonic()
+        for _ in range(11):
+            throttle.wait()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
@@ -1,7 +1,10 @@
 import uuid
 
 from django.contrib.auth import authenticate
-from django.db import IntegrityError
+from django.db import (
+    IntegrityError,
+    transaction,
+)
 from django.http import QueryDict
 from django.urls import reverse
 
@@ -626,7 +629,7 @@ def update(data: QueryDict, user: CustomUser) -> (int, dict):
 
 def send_user_email(user: CustomUser, email_type: str, host: str) -> int:
     '''
-    Отправка письма по типу
+    Постановка письма по типу в очередь отправки
 
     Args:
         user: пользователь
@@ -645,8 +648,24 @@ def send_user_email(user: CustomUser, email_type: str, host: str) -> int:
 
     url_hash = str(uuid.uuid4())
     user.url_hash = url_hash
+    path = reverse(email_type, args=(url_hash,))
+    url = f'{SITE_PROTOCOL}://{host}{path}'
+    mail_data = {
+        'url': url,
+    }
+    email = Email(
+        email_type=email_type,
+        mail_data=mail_data,
+        recipient=user,
+    )
+
+    # Хэш и письмо с ним сохраняются вместе
     try:
-        user.save()
+        with transaction.atomic():
+            user.save()
+            status = email.enqueue()
+            if status != 200:
+                transaction.set_rollback(True)
     except Exception as exc:
         logger.error(
             msg=f'Не удалось получить данные для формирования текста письма {email_type} '
@@ -654,23 +673,10 @@ def send_user_email(user: CustomUser, email_type: str, host: str) -> int:
         )
         return 500
 
-    path = reverse(email_type, args=(user.url_hash,))
-    url = f'{SITE_PROTOCOL}://{host}{path}'
-    mail_data = {
-        'url': url,
-    }
-
     logger.info(
-        msg=f'Данные для формирования текста письма {email_type} '
-            f'пользователю {user} получены: {mail_data}',
-    )
-
-    email = Email(
-        email_type=email_type,
-        mail_data=mail_data,
-        recipient=user,
+        msg=f'Письмо {email_type} пользователю {user} с данными {mail_data} '
+            f'поставлено в очередь со статусом {status}',
     )
-    status = email.send()
     return status
 
 
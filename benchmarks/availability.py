@@ -0,0 +1,86 @@
+'''
+Сравнение проверки дат бронирования: линейный проход по временным
+броням с разбором дат через strptime против is_period_free
+(тот же проход по fromisoformat с остановкой на первом пересечении)
+
+Запуск: python benchmarks/availability.py
+'''
+import os
+import random
+import sys
+import timeit
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'apps'))
+
+from bookings.availability import is_period_free  # noqa: E402
+
+
+INTERVALS = 10_000
+QUERIES = 50
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S%z'
+
+
+def linear_booking_dates(temporary: list, start_date: datetime, end_date: datetime, user_id: int) -> bool:
+    for booking in temporary:
+        booked_from = datetime.strptime(booking['booked_from'], DATE_FORMAT)
+        booked_to = datetime.strptime(booking['booked_to'], DATE_FORMAT)
+        if booked_from <= end_date and booked_to >= start_date:
+            if booking['user_id'] != user_id:
+                return False
+    return True
+
+
+def make_bookings() -> list:
+    random.seed(0)
+    start = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    bookings = []
+    for i in range(INTERVALS):
+        booked_from = start + timedelta(hours=6 * i)
+        booked_to = booked_from + timedelta(hours=random.randint(1, 5))
+        bookings.append({
+            'booked_from': booked_from.strftime(DATE_FORMAT),
+            'booked_to': booked_to.strftime(DATE_FORMAT),
+            'user_id': random.randint(1, 100),
+        })
+    return bookings
+
+
+def main():
+    bookings = make_bookings()
+    random.seed(1)
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    queries = []
+    for _ in range(QUERIES):
+        start = first + timedelta(days=random.randint(0, INTERVALS // 4))
+        queries.append((start, start + timedelta(hours=1)))
+
+    linear = timeit.timeit(
+        lambda: [
+            linear_booking_dates(bookings, start, end, 0)
+            for start, end in queries
+        ],
+        number=1,
+    ) / QUERIES
+    # Временные брони приходят из redis на каждый запрос, поэтому
+    # в замер входит и разбор дат, и сама проверка
+    fast = timeit.timeit(
+        lambda: [
+            is_period_free(start=start, end=end, temporary=bookings, user_id=0)
+            for start, end in queries
+        ],
+        number=1,
+    ) / QUERIES
+
+    print(f'Интервалов: {INTERVALS}, проверок: {QUERIES}')
+    print(f'Линейный проход (strptime): {linear * 1e6:10.1f} мкс/проверка')
+    print(f'is_period_free (fromisoformat): {fast * 1e6:6.1f} мкс/проверка')
+    print(f'Ускорение: {linear / fast:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+'''
+Сравнение кодеков значений redis на временных бронях: JSON со строками
+дат и разбором через fromisoformat против кодеков utils.redis_codec
+
+Запуск: python benchmarks/codec.py
+'''
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.redis_codec import (  # noqa: E402
+    JsonCodec,
+    MsgpackCodec,
+)
+
+
+BOOKINGS = 1_000
+REPEAT = 20
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S%z'
+
+
+def make_bookings() -> list:
+    random.seed(0)
+    start = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    bookings = []
+    for _ in range(BOOKINGS):
+        booked_from = start + timedelta(hours=random.randrange(24 * 365))
+        bookings.append({
+            'area': random.randrange(1, 100),
+            'booked_from': booked_from,
+            'booked_to': booked_from + timedelta(days=random.randrange(1, 10)),
+            'user_id': random.randrange(1, 1000),
+            'created_at': start,
+        })
+    return bookings
+
+
+def strftime_dumps(bookings: list) -> list:
+    return [
+        json.dumps(obj={
+            **booking,
+            'booked_from': booking['booked_from'].strftime(DATE_FORMAT),
+            'booked_to': booking['booked_to'].strftime(DATE_FORMAT),
+            'created_at': booking['created_at'].strftime(DATE_FORMAT),
+        }).encode()
+        for booking in bookings
+    ]
+
+
+def strftime_loads(values: list) -> list:
+    periods = []
+    for value in values:
+        booking = json.loads(s=value)
+        periods.append((
+            datetime.fromisoformat(booking['booked_from']),
+            datetime.fromisoformat(booking['booked_to']),
+        ))
+    return periods
+
+
+def codec_dumps(codec, bookings: list) -> list:
+    return [codec.encode(data=booking) for booking in bookings]
+
+
+def codec_loads(codec, values: list) -> list:
+    periods = []
+    for value in values:
+        booking = codec.loads(data=value[len(codec.prefix):])
+        booked_from, booked_to = booking['booked_from'], booking['booked_to']
+        if isinstance(booked_from, str):
+            booked_from = datetime.fromisoformat(booked_from)
+            booked_to = datetime.fromisoformat(booked_to)
+        periods.append((booked_from, booked_to))
+    return periods
+
+
+def main():
+    bookings = make_bookings()
+    variants = (
+        ('json + strftime', strftime_dumps, strftime_loads),
+        ('JsonCodec', *[
+            lambda data, func=func, codec=JsonCodec(): func(codec, data)
+            for func in (codec_dumps, codec_loads)
+        ]),
+        ('MsgpackCodec', *[
+            lambda data, func=func, codec=MsgpackCodec(): func(codec, data)
+            for func in (codec_dumps, codec_loads)
+        ]),
+    )
+
+    print(f'Броней: {BOOKINGS}, повторов: {REPEAT}')
+    for name, dumps, loads in variants:
+        values = dumps(bookings)
+        size = sum(map(len, values)) / BOOKINGS
+        encode = timeit.timeit(lambda: dumps(bookings), number=REPEAT)
+        decode = timeit.timeit(lambda: loads(values), number=REPEAT)
+        print(
+            f'{name:>16}: запись {encode / REPEAT / BOOKINGS * 1e6:6.2f} мкс, '
+            f'чтение {decode / REPEAT / BOOKINGS * 1e6:6.2f} мкс, '
+            f'{size:5.1f} байт',
+        )
+
+
+if __name__ == '__main__':
+    main()
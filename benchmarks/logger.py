@@ -0,0 +1,80 @@
+'''
+Сравнение стоимости форматирования записи лога: поиск иерархии
+функции через inspect.stack() против обхода кадров sys._getframe
+и форматтера с отключенной иерархией
+
+Запуск: python benchmarks/logger.py
+'''
+import inspect
+import io
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.logger import CustomFormatter  # noqa: E402
+
+
+RECORDS = 2_000
+STACK_DEPTH = 40
+FORMAT = '%(asctime)s %(levelname)s %(message)s %(name)s.%(funcName)s %(func_hierarchy)s'
+
+
+class InspectFormatter(CustomFormatter):
+
+    def get_func_hierarchy(self, record) -> str:
+        stack = inspect.stack()
+
+        record_file = record.pathname
+
+        for frame in stack[1:]:
+            if frame.filename == record_file:
+                function_name = frame.function
+                if function_name != record.funcName:
+                    return function_name
+        return ""
+
+
+def make_logger(formatter: logging.Formatter) -> logging.Logger:
+    logger = logging.getLogger(f'benchmark.{type(formatter).__name__}.{id(formatter)}')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(formatter)
+    logger.handlers = [handler]
+    return logger
+
+
+def service(logger: logging.Logger):
+    for _ in range(RECORDS):
+        logger.info(
+            msg='Получение списка всех площадок',
+        )
+
+
+def view(logger: logging.Logger, depth: int = STACK_DEPTH):
+    # Имитация стека Django/DRF над сервисом
+    if depth:
+        return view(logger, depth - 1)
+    return timeit.timeit(lambda: service(logger), number=1)
+
+
+def main():
+    formatters = (
+        ('inspect.stack()', InspectFormatter(FORMAT)),
+        ('sys._getframe', CustomFormatter(FORMAT)),
+        ('без иерархии', CustomFormatter(FORMAT, func_hierarchy=False)),
+    )
+
+    print(f'Записей: {RECORDS}, глубина стека: {STACK_DEPTH}')
+    for name, formatter in formatters:
+        logger = make_logger(formatter=formatter)
+        view(logger)
+        spent = view(logger)
+        print(f'{name:>16}: {spent / RECORDS * 1e6:8.1f} мкс/запись')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import os
+
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from utils import redis_cache
+from utils.logger import pipeline
+from utils.response_patterns import generate_response
+
+
+class ProcessStatsView(APIView):
+    '''
+    Статистика процесса, обработавшего запрос: конвейер логов
+    и насыщение пула соединений redis
+
+    Счетчики свои у каждого воркера gunicorn, поэтому в ответе
+    есть pid воркера
+    '''
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        status, data = generate_response(
+            status_code=200,
+            data={
+                'pid': os.getpid(),
+                'logs': pipeline.get_stats(),
+                'redis_pool': redis_cache.get_pool_stats(),
+            },
+        )
+        return Response(
+            status=status,
+            data=data,
+        )
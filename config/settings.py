@@ -57,6 +57,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework_simplejwt',
@@ -180,6 +181,80 @@ REDIS_HOST = os.environ.get(
     'REDIS_HOST', '127.0.0.1'
 )
 
+REDIS_MAX_CONNECTIONS = int(os.environ.get(
+    'REDIS_MAX_CONNECTIONS', '50'
+))
+
+REDIS_BLOCKING_POOL = os.environ.get(
+    'REDIS_BLOCKING_POOL', 'True'
+)
+REDIS_BLOCKING_POOL = REDIS_BLOCKING_POOL == 'True'
+
+REDIS_POOL_TIMEOUT = float(os.environ.get(
+    'REDIS_POOL_TIMEOUT', '5'
+))
+
+REDIS_SOCKET_TIMEOUT = float(os.environ.get(
+    'REDIS_SOCKET_TIMEOUT', '2'
+))
+
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.environ.get(
+    'REDIS_SOCKET_CONNECT_TIMEOUT', '1'
+))
+
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get(
+    'REDIS_HEALTH_CHECK_INTERVAL', '30'
+))
+
+REDIS_RETRY_ON_TIMEOUT = os.environ.get(
+    'REDIS_RETRY_ON_TIMEOUT', 'True'
+)
+REDIS_RETRY_ON_TIMEOUT = REDIS_RETRY_ON_TIMEOUT == 'True'
+
+# json или msgpack, значения другого кодека продолжают читаться,
+# поэтому msgpack включается после выкладки читающего кода
+REDIS_CODEC = os.environ.get(
+    'REDIS_CODEC', 'json'
+)
+
+LOCAL_CACHE_SIZE = 256
+LOCAL_CACHE_TIMEOUT = 60
+
+
+# Logging
+
+LOG_FUNC_HIERARCHY = os.environ.get(
+    'LOG_FUNC_HIERARCHY', 'True'
+)
+LOG_FUNC_HIERARCHY = LOG_FUNC_HIERARCHY == 'True'
+
+LOG_LEVEL = os.environ.get(
+    'LOG_LEVEL', 'DEBUG'
+)
+
+LOG_JSON = os.environ.get(
+    'LOG_JSON', 'False'
+)
+LOG_JSON = LOG_JSON == 'True'
+
+LOG_SAMPLING_RATES = {} if DEBUG else {
+    'utils.redis_cache': 0.01,
+    'areas.services': 0.1,
+    'areas.cache': 0.1,
+}
+
+LOG_RATE_LIMIT = int(os.environ.get(
+    'LOG_RATE_LIMIT', '0' if DEBUG else '100'
+))
+
+LOG_RATE_PERIOD = int(os.environ.get(
+    'LOG_RATE_PERIOD', '60'
+))
+
+LOG_QUEUE_SIZE = int(os.environ.get(
+    'LOG_QUEUE_SIZE', '10000'
+))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -245,6 +320,59 @@ EMAIL_PORT = os.environ.get(
 )
 EMAIL_USE_TLS = True
 
+EMAIL_TIMEOUT = int(os.environ.get(
+    'EMAIL_TIMEOUT', '10'
+))
+
+# SMTP соединение обработчика очереди переиспользуется между пачками,
+# простаивающее дольше этого времени переоткрывается
+EMAIL_CONNECTION_IDLE_TIMEOUT = int(os.environ.get(
+    'EMAIL_CONNECTION_IDLE_TIMEOUT', '60'
+))
+
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get(
+    'EMAIL_OUTBOX_BATCH_SIZE', '50'
+))
+
+EMAIL_OUTBOX_INTERVAL = float(os.environ.get(
+    'EMAIL_OUTBOX_INTERVAL', '1'
+))
+
+# Через сколько секунд письмо, захваченное упавшим обработчиком,
+# снова становится доступно для отправки. Отправка пачки может занять
+# до EMAIL_OUTBOX_BATCH_SIZE * EMAIL_TIMEOUT секунд, и захват не должен
+# истечь раньше, иначе письма пачки захватит и отправит другой обработчик
+EMAIL_OUTBOX_LOCK_TIMEOUT = int(os.environ.get(
+    'EMAIL_OUTBOX_LOCK_TIMEOUT', str(2 * EMAIL_OUTBOX_BATCH_SIZE * EMAIL_TIMEOUT)
+))
+
+# Повторная отправка при временных ошибках SMTP: задержка удваивается
+# от EMAIL_RETRY_BASE_DELAY до EMAIL_RETRY_MAX_DELAY секунд
+EMAIL_MAX_ATTEMPTS = int(os.environ.get(
+    'EMAIL_MAX_ATTEMPTS', '5'
+))
+
+EMAIL_RETRY_BASE_DELAY = int(os.environ.get(
+    'EMAIL_RETRY_BASE_DELAY', '30'
+))
+
+EMAIL_RETRY_MAX_DELAY = int(os.environ.get(
+    'EMAIL_RETRY_MAX_DELAY', '3600'
+))
+
+# Рассылка всем пользователям: лимит писем в секунду на все потоки
+EMAIL_CAMPAIGN_RATE = float(os.environ.get(
+    'EMAIL_CAMPAIGN_RATE', '10'
+))
+
+EMAIL_CAMPAIGN_WORKERS = int(os.environ.get(
+    'EMAIL_CAMPAIGN_WORKERS', '4'
+))
+
+EMAIL_CAMPAIGN_CHUNK_SIZE = int(os.environ.get(
+    'EMAIL_CAMPAIGN_CHUNK_SIZE', '500'
+))
+
 # Site
 
 SITE_PROTOCOL = os.environ.get(
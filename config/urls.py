@@ -26,6 +26,7 @@ from drf_spectacular.views import (
 )
 
 from config import settings
+from config.api import ProcessStatsView
 
 
 urlpatterns = [
@@ -34,6 +35,7 @@ urlpatterns = [
     path('api/v1/users/', include('users.urls')),
     path('api/v1/areas/', include('areas.urls')),
     path('api/v1/bookings/', include('bookings.urls')),
+    path('api/v1/stats/', ProcessStatsView.as_view(), name='process_stats'),
 ]
 
 if settings.DEBUG:
@@ -1,12 +1,35 @@
 CONFIRM_EMAIL = 'confirm_email'
 PASSWORD_RESTORE = 'password_restore'
+NEWSLETTER = 'newsletter'
+
+OUTBOX_PENDING = 'pending'
+OUTBOX_PROCESSING = 'processing'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'
+
+
+SEARCH_CONFIG = 'russian'
 
 
 EMAIL_TYPES = (
     (CONFIRM_EMAIL, 'Подтверждение адреса электронной почты'),
     (PASSWORD_RESTORE, 'Восстановление пароля'),
+    (NEWSLETTER, 'Рассылка всем пользователям'),
 )
 
+OUTBOX_STATUSES = (
+    (OUTBOX_PENDING, 'Ожидает отправки'),
+    (OUTBOX_PROCESSING, 'Отправляется'),
+    (OUTBOX_SENT, 'Отправлено'),
+    (OUTBOX_FAILED, 'Не отправлено'),
+)
+
+EMAIL_PLACEHOLDERS = {
+    CONFIRM_EMAIL: ('url',),
+    PASSWORD_RESTORE: ('url',),
+    NEWSLETTER: ('email', 'nickname'),
+}
+
 CONTACT_TYPES = (
     ('Email', 'Адрес электронной почты'),
     ('Phone', 'Телефон'),
@@ -1,21 +1,113 @@
+import atexit
+import copy
+import fcntl
 import gzip
-import inspect
+import importlib
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
 import shutil
+import sys
+import threading
+import time
 import datetime
+from typing import (
+    Any,
+    Callable,
+)
+
+from config.settings import (
+    LOG_FUNC_HIERARCHY,
+    LOG_JSON,
+    LOG_LEVEL,
+    LOG_QUEUE_SIZE,
+    LOG_RATE_LIMIT,
+    LOG_RATE_PERIOD,
+    LOG_SAMPLING_RATES,
+)
 
 
 LOG_DIR = 'logs'
 LOG_DIR_ARCHIVE = 'archive'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(message)s %(name)s.%(funcName)s %(func_hierarchy)s'
+
+
+class StructuredMessage:
+    '''
+    Сообщение лога с полями
+
+    Вместо f-строки сервис передает текст и поля, например
+    StructuredMessage('Площадка получена', area_pk=1, status=200).
+    Сообщение рендерится только при форматировании записи
+    обработчиком, поэтому отброшенная по уровню запись ничего
+    не стоит, а JsonFormatter пишет поля отдельными ключами
+    '''
+
+    __slots__ = ('message', 'fields')
+
+    def __init__(self, message: str, **fields):
+        self.message = message
+        self.fields = fields
+
+    @classmethod
+    def snapshot_value(cls, value):
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        if isinstance(value, dict):
+            return {
+                cls.snapshot_value(key): cls.snapshot_value(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, tuple):
+            return tuple(cls.snapshot_value(item) for item in value)
+        if isinstance(value, (list, set)):
+            return [cls.snapshot_value(item) for item in value]
+        return str(value)
+
+    def snapshot(self) -> 'StructuredMessage':
+        '''
+        Копия сообщения, в которой поля не ссылаются на объекты вызова
+
+        Запись уходит в поток слушателя, и вызывающий код может изменить
+        переданные словари и объекты до форматирования. Строки, числа,
+        bool и None остаются как есть, словари и списки копируются,
+        остальные объекты заменяются на str(), как их записал бы
+        JsonFormatter
+        '''
+
+        return StructuredMessage(
+            self.message,
+            **{
+                key: self.snapshot_value(value)
+                for key, value in self.fields.items()
+            },
+        )
+
+    def __str__(self):
+        if not self.fields:
+            return self.message
+
+        fields = ' '.join(f'{key}={value}' for key, value in self.fields.items())
+        return f'{self.message} {fields}'
 
 
 class CustomFormatter(logging.Formatter):
 
+    def __init__(self, *args, func_hierarchy: bool = LOG_FUNC_HIERARCHY, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.func_hierarchy = func_hierarchy
+
     def get_func_hierarchy(self, record) -> str:
         '''
         Получение иерархии функции
 
+        Кадры стека перебираются через sys._getframe от вызова логгера
+        наружу до первой подходящей функции, без чтения исходников,
+        как это делает inspect.stack()
+
         Args:
             record: запись
 
@@ -23,23 +115,486 @@ class CustomFormatter(logging.Formatter):
             Название фукнции
         '''
 
-        stack = inspect.stack()
-
-        record_file = record.pathname
-
-        for frame in stack[1:]:
-            if frame.filename == record_file:
-                function_name = frame.function
-                if function_name != record.funcName:
-                    return function_name
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == record.pathname and code.co_name != record.funcName:
+                return code.co_name
+            frame = frame.f_back
         return ""
 
+    def set_func_hierarchy(self, record):
+        if not hasattr(record, 'func_hierarchy'):
+            if self.func_hierarchy:
+                record.func_hierarchy = self.get_func_hierarchy(record)
+            else:
+                record.func_hierarchy = ""
+
     def format(self, record):
-        record.func_hierarchy = self.get_func_hierarchy(record)
+        self.set_func_hierarchy(record)
 
         return super().format(record)
 
 
+class JsonFormatter(CustomFormatter):
+    '''
+    Форматирование записи в одну строку JSON
+
+    Поля StructuredMessage записываются отдельными ключами
+    {
+      "time": "2024-07-19 12:40:10,428",
+      "level": "INFO",
+      "logger": "areas.services",
+      "function": "get_area",
+      "func_hierarchy": "",
+      "message": "Площадка получена",
+      "area_pk": 1,
+      "status": 200
+    }
+    '''
+
+    def format(self, record):
+        self.set_func_hierarchy(record)
+
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'function': record.funcName,
+            'func_hierarchy': record.func_hierarchy,
+        }
+        if isinstance(record.msg, StructuredMessage):
+            message = record.msg.message
+            data['message'] = message % record.args if record.args else message
+            for key, value in record.msg.fields.items():
+                data.setdefault(key, value)
+        else:
+            data['message'] = record.getMessage()
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class AppFilter(logging.Filter):
+
+    def __init__(self, app: str):
+        super().__init__()
+        self.app = app
+
+    def filter(self, record):
+        return getattr(record, 'app', None) == self.app
+
+
+class SamplingFilter(logging.Filter):
+    '''
+    Выборка записей ниже WARNING по доле для имени логгера
+
+    Доля ищется по имени логгера и его родителям, например
+    {"utils.redis_cache": 0.01} пропускает 1% info-записей
+    utils.redis_cache, а предупреждения и ошибки проходят всегда
+    '''
+
+    def __init__(self, rates: dict, level: int = logging.WARNING):
+        super().__init__()
+        self.rates = rates
+        self.level = level
+        self.logger_rates = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def get_rate(self, name: str) -> float:
+        rate = self.logger_rates.get(name)
+        if rate is not None:
+            return rate
+
+        rate = 1.0
+        parts = name.split('.')
+        for index in range(len(parts), 0, -1):
+            prefix = '.'.join(parts[:index])
+            if prefix in self.rates:
+                rate = self.rates[prefix]
+                break
+        with self.lock:
+            self.logger_rates[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+
+        rate = self.get_rate(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        with self.lock:
+            self.dropped += 1
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    '''
+    Ограничение числа записей ниже WARNING с одного места вызова
+
+    Сообщения собираются f-строками, поэтому шаблоном сообщения
+    считается место вызова (файл и строка). С каждого места
+    пропускается не больше limit записей за period секунд,
+    и объем логов не растет вместе с трафиком
+    '''
+
+    def __init__(self, limit: int, period: float, level: int = logging.WARNING):
+        super().__init__()
+        self.limit = limit
+        self.period = period
+        self.level = level
+        self.windows = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.level or not self.limit:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                self.windows[key] = [now, 1]
+                return True
+
+            if window[1] < self.limit:
+                window[1] += 1
+                return True
+            self.dropped += 1
+            return False
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    '''
+    Постановка записей в очередь конвейера логов
+
+    Иерархия функции и текст исключения вычисляются здесь, в потоке
+    вызова, потому что в потоке слушателя стека вызова уже нет.
+    StructuredMessage не рендерится, а уходит в слушатель снимком полей.
+    Если очередь заполнена, запись отбрасывается и учитывается
+    в счетчике пропущенных
+    '''
+
+    def __init__(self, pipeline: 'LogPipeline', app: str):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.app = app
+        self.formatter = CustomFormatter(LOG_FORMAT)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.app = self.app
+        if self.formatter.func_hierarchy:
+            record.func_hierarchy = self.formatter.get_func_hierarchy(record)
+        else:
+            record.func_hierarchy = ""
+
+        if isinstance(record.msg, StructuredMessage):
+            record.msg = record.msg.snapshot()
+        else:
+            record.message = record.getMessage()
+            record.msg = record.message
+            record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.put(record)
+
+
+def get_original(module: str, name: str) -> Any:
+    '''
+    Получение объекта стандартной библиотеки без monkey patching gevent
+
+    Args:
+        module: название модуля
+        name: название объекта
+
+    Returns:
+        Исходный объект модуля
+    '''
+
+    try:
+        from gevent import monkey
+    except ImportError:
+        return getattr(importlib.import_module(module), name)
+    return monkey.get_original(module, name)
+
+
+class LogQueue:
+    '''
+    Ограниченная очередь записей логов на примитивах ОС
+
+    В воркере gevent записи ставят гринлеты, а забирает поток ОС
+    слушателя, поэтому очередь построена на исходном SimpleQueue,
+    а не на queue.Queue с заменёнными gevent блокировками. Запись
+    никогда не ждет: при переполнении put_nowait сразу бросает queue.Full
+    '''
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.queue = get_original('queue', 'SimpleQueue')()
+
+    def put_nowait(self, item: Any):
+        if self.maxsize > 0 and self.queue.qsize() >= self.maxsize:
+            raise queue.Full
+        self.queue.put_nowait(item)
+
+    def put(self, item: Any, block: bool = True, timeout: float = None):
+        self.queue.put(item)
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        return self.queue.get(block, timeout)
+
+    def qsize(self) -> int:
+        return self.queue.qsize()
+
+
+class NativeThread:
+    '''
+    Поток ОС в обход monkey patching gevent
+
+    После patch_thread threading.Thread запускается гринлетом в потоке
+    хаба, и запись в файлы и сжатие при ротации блокировали бы запросы.
+    Поток запускается исходным _thread.start_new_thread
+    '''
+
+    def __init__(self, target: Callable):
+        self.target = target
+        self.ident = None
+        self.finished = get_original('_thread', 'allocate_lock')()
+
+    def start(self):
+        self.finished.acquire()
+        get_original('_thread', 'start_new_thread')(self.run, ())
+
+    def run(self):
+        self.ident = get_original('_thread', 'get_ident')()
+        try:
+            self.target()
+        finally:
+            self.finished.release()
+
+    def join(self):
+        with self.finished:
+            pass
+
+
+class LogQueueListener(logging.handlers.QueueListener):
+
+    def start(self):
+        self._thread = NativeThread(target=self._monitor)
+        self._thread.start()
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    '''
+    Общий для процесса конвейер логов
+
+    Логгеры модулей только ставят записи в ограниченную очередь,
+    форматирование, запись в файлы и сжатие при ротации выполняет
+    один поток ОС слушателя, в воркере gevent он не делит поток с хабом.
+    Поток запускается первой записью процесса, а не при импорте:
+    после fork (воркеры gunicorn) очередь и поток создаются заново
+    '''
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.handlers = {}
+        self.targets = []
+        self.sampling_filter = SamplingFilter(rates=LOG_SAMPLING_RATES)
+        self.rate_limit_filter = RateLimitFilter(
+            limit=LOG_RATE_LIMIT,
+            period=LOG_RATE_PERIOD,
+        )
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        # Блокировку мог держать поток родителя, которого нет после fork
+        self.sampling_filter.lock = threading.Lock()
+        self.rate_limit_filter.lock = threading.Lock()
+        self.queue = LogQueue(maxsize=self.maxsize)
+        self.listener = None
+        self.dropped = 0
+        self.reported = 0
+        for handler in self.handlers.values():
+            handler.queue = self.queue
+
+    def start(self):
+        with self.lock:
+            if self.listener is not None:
+                return
+            self.listener = LogQueueListener(
+                self.queue,
+                *self.targets,
+                respect_handler_level=True,
+            )
+            self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def put(self, record: logging.LogRecord):
+        if self.listener is None:
+            self.start()
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return
+
+        if self.dropped != self.reported:
+            with self.lock:
+                dropped = self.dropped - self.reported
+                self.reported = self.dropped
+            if not self.put_dropped(app=record.app, dropped=dropped):
+                with self.lock:
+                    self.reported -= dropped
+
+    def put_dropped(self, app: str, dropped: int) -> bool:
+        record = logging.makeLogRecord({
+            'name': __name__,
+            'levelno': logging.WARNING,
+            'levelname': logging.getLevelName(logging.WARNING),
+            'msg': f'Очередь логов переполнена, пропущено записей: {dropped}',
+            'funcName': 'put',
+            'app': app,
+            'func_hierarchy': '',
+        })
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            return False
+        return True
+
+    def get_handler(self, app: str) -> LogQueueHandler:
+        '''
+        Получение обработчика очереди для приложения
+
+        Файловый обработчик приложения создается один раз
+        и добавляется к обработчикам слушателя
+
+        Args:
+            app: название приложения (имя файла лога)
+
+        Returns:
+            Объект LogQueueHandler
+        '''
+
+        with self.lock:
+            if app in self.handlers:
+                return self.handlers[app]
+
+            if not self.targets:
+                console_handler = logging.StreamHandler()
+                console_handler.setFormatter(CustomFormatter(LOG_FORMAT))
+                self.targets.append(console_handler)
+            self.targets.append(get_file_handler(app=app))
+
+            handler = LogQueueHandler(
+                pipeline=self,
+                app=app,
+            )
+            handler.addFilter(self.sampling_filter)
+            handler.addFilter(self.rate_limit_filter)
+            self.handlers[app] = handler
+            if self.listener is not None:
+                self.listener.handlers = tuple(self.targets)
+            return handler
+
+    def get_stats(self) -> dict:
+        '''
+        Получение статистики конвейера логов процесса
+
+        Returns:
+            Словарь данных
+            {
+                "queued": 0,
+                "dropped": 0,
+                "sampled": 120,
+                "rate_limited": 3
+            }
+        '''
+
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': self.dropped,
+            'sampled': self.sampling_filter.dropped,
+            'rate_limited': self.rate_limit_filter.dropped,
+        }
+
+
+class SharedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    '''
+    Ротация файла лога, общего для нескольких процессов
+
+    Файл пишут мастер и воркеры gunicorn, и в полночь ротацию начинает
+    каждый из них. Ротация выполняется под flock на файл блокировки:
+    первый процесс архивирует файл, остальные видят, что файл по пути
+    уже другой, и только переоткрывают его
+    '''
+
+    def __init__(self, filename: str, *args, **kwargs):
+        super().__init__(filename, *args, **kwargs)
+        directory, name = os.path.split(self.baseFilename)
+        self.lock_filename = os.path.join(directory, f'.{name}.lock')
+
+    def is_rotated(self) -> bool:
+        if self.stream is None:
+            return False
+
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return True
+
+        opened = os.fstat(self.stream.fileno())
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+    def reopen(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if not self.delay:
+            self.stream = self._open()
+
+        current_time = int(time.time())
+        rollover_at = self.computeRollover(current_time)
+        while rollover_at <= current_time:
+            rollover_at += self.interval
+        self.rolloverAt = rollover_at
+
+    def doRollover(self):
+        with open(self.lock_filename, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self.is_rotated():
+                    self.reopen()
+                else:
+                    super().doRollover()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 def namer(name):
     name = name.replace('.log.', '-')
     path, name = name.split('logs/')
@@ -57,39 +612,47 @@ def rotator(source, dest):
     os.remove(source)
 
 
+def get_file_handler(app: str) -> logging.Handler:
+    if not os.path.exists(LOG_DIR):
+        os.makedirs(LOG_DIR)
+
+    file_handler = SharedTimedRotatingFileHandler(
+        f"{LOG_DIR}/{app}.log",
+        when='midnight',
+        interval=1,
+        atTime=datetime.time(23, 59, 59),
+    )
+    file_handler.suffix = "%Y-%m-%d"
+    file_handler.namer = namer
+    file_handler.rotator = rotator
+    if LOG_JSON:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(CustomFormatter(LOG_FORMAT))
+    file_handler.addFilter(AppFilter(app=app))
+    return file_handler
+
+
+pipeline = LogPipeline(maxsize=LOG_QUEUE_SIZE)
+os.register_at_fork(after_in_child=pipeline.reset)
+atexit.register(pipeline.stop)
+
+
 def get_logger(name: str, app: str = 'booking') -> logging.Logger:
     '''
     Получение логгера
 
     Args:
         name: название модуля
+        app: название приложения (имя файла лога)
 
     Returns:
         Объект логгера
     '''
 
     logger = logging.getLogger(name)
-    console_handler = logging.StreamHandler()
-    logger.setLevel(logging.DEBUG)
-    formatter = CustomFormatter(
-        '%(asctime)s %(levelname)s %(message)s %(name)s.%(funcName)s %(func_hierarchy)s'
-    )
-    console_handler.setFormatter(formatter)
-
-    if not os.path.exists(LOG_DIR):
-        os.makedirs(LOG_DIR)
-
-    file_handler = logging.handlers.TimedRotatingFileHandler(
-        f"{LOG_DIR}/{app}.log",
-        when='midnight',
-        interval=1,
-        atTime=datetime.time(23, 59, 59),
-    )
-    file_handler.suffix = "%Y-%m-%d"
-    file_handler.namer = namer
-    file_handler.rotator = rotator
-    file_handler.setFormatter(formatter)
-    logger.handlers = [console_handler, file_handler]
+    logger.setLevel(LOG_LEVEL)
+    logger.handlers = [pipeline.get_handler(app=app)]
     return logger
 
 
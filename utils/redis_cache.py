@@ -1,105 +1,1215 @@
-import json
+import math
+import os
+import random
 import redis
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from typing import Any
 
 from django.contrib.auth import get_user_model
 from django.forms import model_to_dict
 
 from config.settings import (
+    LOCAL_CACHE_SIZE,
+    LOCAL_CACHE_TIMEOUT,
+    REDIS_BLOCKING_POOL,
+    REDIS_CODEC,
+    REDIS_HEALTH_CHECK_INTERVAL,
     REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
     REDIS_PORT,
+    REDIS_RETRY_ON_TIMEOUT,
+    REDIS_SOCKET_CONNECT_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
 )
 
-from utils.logger import get_logger
+from utils import redis_codec
+from utils.logger import (
+    StructuredMessage,
+    get_logger,
+)
 
 
 User = get_user_model()
 logger = get_logger(__name__)
-redis_client = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=1)
+
+POOL_WAIT_THRESHOLD = 0.01
+
+codec = redis_codec.get_codec(name=REDIS_CODEC)
+
+
+class PoolStatsMixin:
+    '''
+    Счетчики насыщения пула соединений redis
+
+    waited - сколько раз соединение ждали дольше POOL_WAIT_THRESHOLD,
+    exhausted - сколько раз свободного соединения не нашлось совсем
+    '''
+
+    waited = 0
+    exhausted = 0
+
+    def get_connection(self, command_name, *keys, **options):
+        started = time.monotonic()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError:
+            if self.get_in_use() >= self.max_connections:
+                self.exhausted += 1
+                logger.warning(
+                    msg=StructuredMessage(
+                        'Нет свободных соединений в пуле redis',
+                        max_connections=self.max_connections,
+                    ),
+                )
+            raise
+
+        if time.monotonic() - started > POOL_WAIT_THRESHOLD:
+            self.waited += 1
+        return connection
+
+
+class StatsConnectionPool(PoolStatsMixin, redis.ConnectionPool):
+
+    def get_created(self) -> int:
+        return self._created_connections
+
+    def get_in_use(self) -> int:
+        return len(self._in_use_connections)
+
+
+class StatsBlockingConnectionPool(PoolStatsMixin, redis.BlockingConnectionPool):
+
+    def get_created(self) -> int:
+        return len(self._connections)
+
+    def get_in_use(self) -> int:
+        available = [
+            connection for connection in list(self.pool.queue)
+            if connection is not None
+        ]
+        return len(self._connections) - len(available)
+
+
+def get_connection_pool() -> redis.ConnectionPool:
+    '''
+    Создание пула соединений redis по настройкам
+
+    Блокирующий пул ограничивает число соединений на воркер,
+    а при нехватке ждет освобождения до REDIS_POOL_TIMEOUT.
+    Под gevent ожидание идет в gevent.queue и не блокирует
+    остальные гринлеты
+
+    Returns:
+        Объект пула соединений
+    '''
+
+    kwargs = {
+        'host': REDIS_HOST,
+        'port': REDIS_PORT,
+        'db': 1,
+        'max_connections': REDIS_MAX_CONNECTIONS,
+        'socket_timeout': REDIS_SOCKET_TIMEOUT,
+        'socket_connect_timeout': REDIS_SOCKET_CONNECT_TIMEOUT,
+        'health_check_interval': REDIS_HEALTH_CHECK_INTERVAL,
+        'retry_on_timeout': REDIS_RETRY_ON_TIMEOUT,
+    }
+    if not REDIS_BLOCKING_POOL:
+        return StatsConnectionPool(**kwargs)
+
+    try:
+        from gevent import monkey
+        from gevent.queue import LifoQueue
+    except ImportError:
+        pass
+    else:
+        if monkey.is_module_patched('socket'):
+            kwargs['queue_class'] = LifoQueue
+
+    return StatsBlockingConnectionPool(
+        timeout=REDIS_POOL_TIMEOUT,
+        **kwargs,
+    )
+
+
+connection_pool = get_connection_pool()
+redis_client = redis.StrictRedis(connection_pool=connection_pool)
+
+MISSING = object()
+INVALIDATE_CHANNEL = 'redis_cache_invalidate'
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 0.05
+LOCK_WAIT_ATTEMPTS = 20
+STALE_TIMEOUT = 24*60*60
+XFETCH_BETA = 1.0
+MGET_CHUNK = 1000
+SECONDS_IN_DAY = 24*60*60
+
+ACQUIRE_PERIOD_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local timeout = tonumber(ARGV[2])
+local period_from = tonumber(ARGV[4])
+local period_to = tonumber(ARGV[5])
+local key = KEYS[1]
+local periods = KEYS[2]
+local index = KEYS[3]
+
+redis.call('ZREMRANGEBYSCORE', index, '-inf', now)
+if redis.call('HLEN', periods) > redis.call('ZCARD', index) then
+    for _, member in ipairs(redis.call('HKEYS', periods)) do
+        if not redis.call('ZSCORE', index, member) then
+            redis.call('HDEL', periods, member)
+        end
+    end
+end
+
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', index, '(' .. now, '+inf')) do
+    local period = redis.call('HGET', periods, member)
+    if period then
+        local separator = string.find(period, ':', 1, true)
+        local booked_from = tonumber(string.sub(period, 1, separator - 1))
+        local booked_to = tonumber(string.sub(period, separator + 1))
+        if booked_from <= period_to and booked_to >= period_from then
+            return 0
+        end
+    end
+end
+
+redis.call('SET', key, ARGV[3], 'EX', timeout)
+redis.call('HSET', periods, key, ARGV[4] .. ':' .. ARGV[5])
+if redis.call('TTL', periods) < timeout then
+    redis.call('EXPIRE', periods, timeout)
+end
+local buckets = #KEYS - tonumber(ARGV[6])
+for i = 3, buckets do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now)
+    redis.call('ZADD', KEYS[i], now + timeout, key)
+end
+local member = ARGV[4] .. ':' .. ARGV[5] .. ':' .. key
+for i = buckets + 1, #KEYS do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now)
+    redis.call('ZADD', KEYS[i], now + timeout, member)
+    if redis.call('TTL', KEYS[i]) < timeout then
+        redis.call('EXPIRE', KEYS[i], timeout)
+    end
+end
+return 1
+'''
+acquire_period_script = redis_client.register_script(ACQUIRE_PERIOD_SCRIPT)
+
+RELEASE_LOCK_SCRIPT = '''
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+'''
+release_lock_script = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+GET_INDEXED_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local index = KEYS[1]
+
+redis.call('ZREMRANGEBYSCORE', index, '-inf', now)
+return redis.call('ZRANGEBYSCORE', index, '(' .. now, '+inf')
+'''
+get_indexed_script = redis_client.register_script(GET_INDEXED_SCRIPT)
+
+GET_PERIOD_INDEXED_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local period_from = tonumber(ARGV[2])
+local period_to = tonumber(ARGV[3])
+
+local keys = {}
+local seen = {}
+for _, bucket in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', bucket, '-inf', now)
+    for _, member in ipairs(redis.call('ZRANGEBYSCORE', bucket, '(' .. now, '+inf')) do
+        local first = string.find(member, ':', 1, true)
+        local second = string.find(member, ':', first + 1, true)
+        local booked_from = tonumber(string.sub(member, 1, first - 1))
+        local booked_to = tonumber(string.sub(member, first + 1, second - 1))
+        local key = string.sub(member, second + 1)
+        if not seen[key] and booked_from <= period_to and booked_to >= period_from then
+            seen[key] = true
+            keys[#keys + 1] = key
+        end
+    end
+end
+return keys
+'''
+get_period_indexed_script = redis_client.register_script(GET_PERIOD_INDEXED_SCRIPT)
+
+
+class LocalCache:
+    '''
+    Локальный для процесса LRU-кэш с TTL перед redis
+
+    Используется для маленьких горячих ключей (настройки-синглтоны),
+    чтобы при попадании не было обращения к redis и разбора JSON.
+    Ключи сбрасываются во всех воркерах сообщением в канал
+    INVALIDATE_CHANNEL, TTL ограничивает устаревание, если сообщение
+    потерялось. Возвращаемые значения нельзя изменять
+    '''
+
+    def __init__(self, maxsize: int, timeout: int):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.subscriber_pid = None
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return MISSING
+
+            data, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.items[key]
+                return MISSING
+
+            self.items.move_to_end(key)
+            return data
+
+    def set(self, key: str, data: Any):
+        with self.lock:
+            self.items[key] = (data, time.monotonic() + self.timeout)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def subscribe(self):
+        '''
+        Запуск потока, сбрасывающего ключи по сообщениям из redis
+
+        Поток запускается один раз в каждом процессе
+        '''
+
+        pid = os.getpid()
+        if self.subscriber_pid == pid:
+            return
+
+        with self.lock:
+            if self.subscriber_pid == pid:
+                return
+            self.subscriber_pid = pid
+            self.items.clear()
+
+        threading.Thread(
+            target=self.listen,
+            name='redis-cache-invalidate',
+            daemon=True,
+        ).start()
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Сообщения, отправленные до подписки, потеряны
+                self.clear()
+                while True:
+                    # get_message ждет через poll и не упирается
+                    # в socket_timeout пула на простое канала
+                    message = pubsub.get_message(timeout=self.timeout)
+                    if message is not None:
+                        self.delete(key=message['data'].decode())
+            except Exception as exc:
+                logger.error(
+                    msg=StructuredMessage(
+                        'Возникла ошибка при получении сообщений из канала',
+                        channel=INVALIDATE_CHANNEL,
+                        error=exc,
+                    ),
+                )
+                self.clear()
+                time.sleep(1)
+
+
+local_cache = LocalCache(
+    maxsize=LOCAL_CACHE_SIZE,
+    timeout=LOCAL_CACHE_TIMEOUT,
+)
 
 
 def set_key(key: str, data: Any, time: int = None) -> int:
+    value = codec.encode(data=data)
     logger.info(
-        msg=f'Добавление данных {data} в redis по ключу {key}',
+        msg=StructuredMessage(
+            'Добавление данных в redis',
+            key=key,
+            size=len(value),
+        ),
     )
 
-    data_json = json.dumps(obj=data)
     try:
         if time is None:
-            redis_client.set(name=key, value=data_json)
+            redis_client.set(name=key, value=value)
         else:
-            redis_client.setex(name=key, time=time, value=data_json)
+            redis_client.setex(name=key, time=time, value=value)
     except Exception as exc:
         logger.error(
-            msg=f'Возникла ошибка при добавлении данных {data} '
-                f'в redis по ключу {key}: {exc}',
+            msg=StructuredMessage(
+                'Возникла ошибка при добавлении данных в redis',
+                key=key,
+                size=len(value),
+                error=exc,
+            ),
         )
         return 500
 
     logger.info(
-        msg=f'Успешно добавлены данные {data} в redis по ключу {key}',
+        msg=StructuredMessage(
+            'Успешно добавлены данные в redis',
+            key=key,
+        ),
     )
     return 200
 
 
-def get(key: str, model: Any = None, timeout: int = None, **kwargs) -> (int, Any):
+def add_key(key: str, data: Any, time: int = None) -> (int, bool):
+    logger.info(
+        msg=StructuredMessage(
+            'Добавление данных в redis, если ключ не существует',
+            key=key,
+        ),
+    )
+
+    try:
+        added = redis_client.set(
+            name=key,
+            value=codec.encode(data=data),
+            ex=time,
+            nx=True,
+        )
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при добавлении данных в redis',
+                key=key,
+                error=exc,
+            ),
+        )
+        return 500, False
+
+    return 200, bool(added)
+
+
+def get(key: str, model: Any = None, timeout: int = None,
+        local: bool = False, **kwargs) -> (int, Any):
+    '''
+    Получение данных из redis
+
+    Args:
+        key: ключ
+        model: модель, из которой данные берутся при отсутствии ключа
+        timeout: время жизни ключа, заполненного из модели
+        local: хранить данные в локальном кэше процесса
+        kwargs: фильтры для get_or_create модели
+
+    Returns:
+        Код статуса и данные или None, если ключа нет
+    '''
+
+    if local:
+        local_cache.subscribe()
+        data = local_cache.get(key=key)
+        if data is not MISSING:
+            return 200, data
+
+    status, data = get_remote(
+        key=key,
+        model=model,
+        timeout=timeout,
+        **kwargs,
+    )
+    if local and status == 200 and data is not None:
+        local_cache.set(
+            key=key,
+            data=data,
+        )
+    return status, data
+
+
+def get_remote(key: str, model: Any = None, timeout: int = None, **kwargs) -> (int, Any):
+    if model:
+        return get_through(
+            key=key,
+            model=model,
+            timeout=timeout,
+            **kwargs,
+        )
+
     logger.info(
-        msg=f'Получение данных из redis по ключу {key}',
+        msg=StructuredMessage(
+            'Получение данных из redis',
+            key=key,
+        ),
     )
 
     try:
         data = redis_client.get(name=key)
     except Exception as exc:
         logger.error(
-            msg=f'Возникла ошибка при получении данных из redis '
-                f'по ключу {key}: {exc}',
+            msg=StructuredMessage(
+                'Возникла ошибка при получении данных из redis',
+                key=key,
+                error=exc,
+            ),
         )
         return 500, None
 
-    if model and data is None:
+    if data is None:
+        logger.info(
+            msg=StructuredMessage(
+                'Данные не существуют в redis',
+                key=key,
+            ),
+        )
+        return 200, None
+
+    logger.info(
+        msg=StructuredMessage(
+            'Успешно получены данные из redis',
+            key=key,
+        ),
+    )
+    return 200, redis_codec.decode(data=data)
+
+
+def should_refresh(ttl: int, delta: bytes | None) -> bool:
+    '''
+    Вероятностное досрочное обновление ключа (XFetch)
+
+    Чем ближе истечение ключа и чем дольше его пересчет,
+    тем выше вероятность обновить его заранее
+
+    Args:
+        ttl: оставшееся время жизни ключа в мс (PTTL)
+        delta: длительность последнего пересчета в секундах
+
+    Returns:
+        True, если ключ нужно пересчитать сейчас
+    '''
+
+    if ttl <= 0 or not delta:
+        return False
+    return -float(delta) * XFETCH_BETA * math.log(1 - random.random()) >= ttl / 1000
+
+
+def get_through(key: str, model: Any, timeout: int = None, **kwargs) -> (int, Any):
+    '''
+    Получение данных из redis с заполнением из модели
+
+    Ключ пересчитывает только процесс, захвативший блокировку
+    {key}_lock (SET NX), остальные в это время получают устаревшую
+    копию {key}_stale или ждут заполнения ключа
+
+    Args:
+        key: ключ
+        model: модель
+        timeout: время жизни ключа
+        kwargs: фильтры для get_or_create модели
+
+    Returns:
+        Код статуса и данные
+    '''
+
+    logger.info(
+        msg=StructuredMessage(
+            'Получение данных из redis',
+            key=key,
+        ),
+    )
+
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.get(key)
+        pipeline.pttl(key)
+        pipeline.get(f'{key}_delta')
+        data, ttl, delta = pipeline.execute()
+    except Exception as exc:
         logger.error(
-            msg=f'Данные по ключу {key} не существуют в redis',
+            msg=StructuredMessage(
+                'Возникла ошибка при получении данных из redis',
+                key=key,
+                error=exc,
+            ),
+        )
+        return 500, None
+
+    if data is not None:
+        if not should_refresh(ttl=ttl, delta=delta):
+            return 200, redis_codec.decode(data=data)
+
+        status, token = acquire_lock(key=f'{key}_lock')
+        if token is None:
+            return 200, redis_codec.decode(data=data)
+
+        logger.info(
+            msg=StructuredMessage(
+                'Досрочное обновление данных',
+                key=key,
+                ttl=ttl,
+            ),
+        )
+        status, filled = fill_from_model(
+            key=key,
+            model=model,
+            timeout=timeout,
+            token=token,
+            **kwargs,
+        )
+        if status != 200:
+            return 200, redis_codec.decode(data=data)
+        return status, filled
+
+    logger.error(
+        msg=StructuredMessage(
+            'Данные не существуют в redis',
+            key=key,
+        ),
+    )
+    status, token = acquire_lock(key=f'{key}_lock')
+    if token is not None or status != 200:
+        return fill_from_model(
+            key=key,
+            model=model,
+            timeout=timeout,
+            token=token,
+            **kwargs,
         )
+
+    for _ in range(LOCK_WAIT_ATTEMPTS):
         try:
-            data, created = model.objects.get_or_create(**kwargs)
+            data = redis_client.get(key) or redis_client.get(f'{key}_stale')
         except Exception as exc:
             logger.error(
-                msg=f'Возникла ошибка при получении данных из redis '
-                    f'по ключу {key}: {exc}',
+                msg=StructuredMessage(
+                    'Возникла ошибка при получении данных из redis',
+                    key=key,
+                    error=exc,
+                ),
             )
-            return 500, None
+            break
+
+        if data is not None:
+            return 200, redis_codec.decode(data=data)
+        time.sleep(LOCK_WAIT)
+
+    return fill_from_model(
+        key=key,
+        model=model,
+        timeout=timeout,
+        **kwargs,
+    )
+
+
+def set_through(key: str, data: Any, timeout: int = None) -> int:
+    '''
+    Запись данных, которые читаются через get_through
 
-        data = model_to_dict(data)
-        set_key(
+    Вместе с ключом перезаписывается устаревшая копия {key}_stale,
+    иначе после истечения ключа процессы, ждущие блокировку,
+    получали бы данные до изменения
+
+    Args:
+        key: ключ
+        data: данные
+        timeout: время жизни ключа
+
+    Returns:
+        Код статуса
+    '''
+
+    value = codec.encode(data=data)
+    logger.info(
+        msg=StructuredMessage(
+            'Добавление данных в redis',
             key=key,
-            data=data,
-            time=timeout,
+            size=len(value),
+        ),
+    )
+
+    try:
+        pipeline = redis_client.pipeline()
+        pipeline.set(key, value, ex=timeout)
+        pipeline.set(f'{key}_stale', value, ex=STALE_TIMEOUT)
+        pipeline.execute()
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при добавлении данных в redis',
+                key=key,
+                size=len(value),
+                error=exc,
+            ),
         )
-        return 200, data
+        return 500
 
     logger.info(
-        msg=f'Успешно получены данные из redis по ключу {key}'
+        msg=StructuredMessage(
+            'Успешно добавлены данные в redis',
+            key=key,
+        ),
+    )
+    return 200
+
+
+def refresh_through(key: str, data: Any, timeout: int = None) -> int:
+    '''
+    Обновление ключа и его устаревшей копии в redis
+    со сбросом ключа в локальных кэшах всех процессов
+
+    Args:
+        key: ключ
+        data: данные
+        timeout: время жизни ключа
+
+    Returns:
+        Код статуса
+    '''
+
+    status = set_through(
+        key=key,
+        data=data,
+        timeout=timeout,
+    )
+    invalidate_local(
+        key=key,
     )
-    return 200, json.loads(s=data)
+    return status
 
 
-def get_matching_keys(key_pattern: str) -> (int, list):
+def fill_from_model(key: str, model: Any, timeout: int = None,
+                    token: str = None, **kwargs) -> (int, Any):
+    started = time.monotonic()
+    try:
+        data, created = model.objects.get_or_create(**kwargs)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при получении данных из redis',
+                key=key,
+                error=exc,
+            ),
+        )
+        if token is not None:
+            release_lock(key=f'{key}_lock', token=token)
+        return 500, None
+
+    data = model_to_dict(data)
+    value = codec.encode(data=data)
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.set(key, value, ex=timeout)
+        pipeline.set(f'{key}_stale', value, ex=STALE_TIMEOUT)
+        pipeline.set(f'{key}_delta', time.monotonic() - started, ex=STALE_TIMEOUT)
+        if token is not None:
+            release_lock_script(
+                keys=[f'{key}_lock'],
+                args=[token],
+                client=pipeline,
+            )
+        pipeline.execute()
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при добавлении данных в redis',
+                key=key,
+                error=exc,
+            ),
+        )
+
+    return 200, data
+
+
+def acquire_lock(key: str) -> (int, str | None):
+    '''
+    Захват блокировки на LOCK_TIMEOUT секунд
+
+    Args:
+        key: ключ блокировки
+
+    Returns:
+        Код статуса и токен владельца или None, если блокировка занята
+    '''
+
+    token = uuid.uuid4().hex
+    try:
+        acquired = redis_client.set(key, token, nx=True, ex=LOCK_TIMEOUT)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при захвате блокировки',
+                key=key,
+                error=exc,
+            ),
+        )
+        return 500, None
+
+    return 200, token if acquired else None
+
+
+def wait_lock(key: str) -> (int, str | None):
+    '''
+    Захват блокировки с ожиданием до LOCK_WAIT_ATTEMPTS попыток
+
+    Args:
+        key: ключ блокировки
+
+    Returns:
+        Код статуса и токен владельца или None, если блокировка
+        так и не освободилась
+    '''
+
+    for _ in range(LOCK_WAIT_ATTEMPTS):
+        status, token = acquire_lock(key=key)
+        if status != 200 or token is not None:
+            return status, token
+        time.sleep(LOCK_WAIT)
+    return 200, None
+
+
+def release_lock(key: str, token: str) -> int:
+    try:
+        release_lock_script(keys=[key], args=[token])
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при освобождении блокировки',
+                key=key,
+                error=exc,
+            ),
+        )
+        return 500
+    return 200
+
+
+def get_pool_stats() -> dict:
+    '''
+    Получение статистики пула соединений redis процесса
+
+    Returns:
+        Словарь данных
+        {
+            "max_connections": 50,
+            "created": 12,
+            "in_use": 3,
+            "waited": 0,
+            "exhausted": 0
+        }
+    '''
+
+    pool = redis_client.connection_pool
+    return {
+        'max_connections': pool.max_connections,
+        'created': pool.get_created(),
+        'in_use': pool.get_in_use(),
+        'waited': pool.waited,
+        'exhausted': pool.exhausted,
+    }
+
+
+def invalidate_local(key: str) -> int:
+    '''
+    Сброс ключа в локальных кэшах всех процессов
+
+    Args:
+        key: ключ
+
+    Returns:
+        Код статуса
+    '''
+
+    local_cache.delete(key=key)
+    try:
+        redis_client.publish(INVALIDATE_CHANNEL, key)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при сбросе ключа в локальных кэшах',
+                key=key,
+                error=exc,
+            ),
+        )
+        return 500
+    return 200
+
+
+def incr(key: str) -> (int, int):
+    logger.info(
+        msg=StructuredMessage(
+            'Увеличение счетчика в redis',
+            key=key,
+        ),
+    )
+
+    try:
+        value = redis_client.incr(name=key)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при увеличении счетчика в redis',
+                key=key,
+                error=exc,
+            ),
+        )
+        return 500, None
+
     logger.info(
-        msg=f'Получение списка подходящих ключей из redis '
-            f'по шаблону {key_pattern}',
+        msg=StructuredMessage(
+            'Счетчик в redis увеличен',
+            key=key,
+            value=value,
+        ),
     )
+    return 200, value
+
 
+def add_stats(key: str, mapping: dict) -> int:
     try:
-        matching_keys = redis_client.keys(key_pattern)
+        with redis_client.pipeline(transaction=False) as pipe:
+            for field, amount in mapping.items():
+                pipe.hincrbyfloat(name=key, key=field, amount=amount)
+            pipe.execute()
     except Exception as exc:
         logger.error(
-            msg=f'Возникла ошибка при получении списка подходящих '
-                f'ключей из redis по шаблону {key_pattern}: {exc}',
+            msg=StructuredMessage(
+                'Возникла ошибка при обновлении статистики в redis',
+                key=key,
+                mapping=mapping,
+                error=exc,
+            ),
+        )
+        return 500
+    return 200
+
+
+def get_stats(key: str) -> (int, dict):
+    try:
+        stats = redis_client.hgetall(name=key)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при получении статистики из redis',
+                key=key,
+                error=exc,
+            ),
+        )
+        return 500, {}
+
+    return 200, {
+        field.decode(): float(value)
+        for field, value in stats.items()
+    }
+
+
+def get_many(keys: list) -> (int, list):
+    logger.info(
+        msg=StructuredMessage(
+            'Получение данных из redis по ключам',
+            count=len(keys),
+        ),
+    )
+
+    if not keys:
+        return 200, []
+
+    try:
+        values = redis_client.mget(keys)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при получении данных из redis по ключам',
+                keys=keys,
+                error=exc,
+            ),
         )
         return 500, []
 
     logger.info(
-        msg=f'Получен список подходящих ключей из redis '
-            f'по шаблону {key_pattern}',
+        msg=StructuredMessage(
+            'Успешно получены данные из redis по ключам',
+            count=len(keys),
+        ),
+    )
+    return 200, [
+        MISSING if value is None else redis_codec.decode(data=value)
+        for value in values
+    ]
+
+
+def set_many(mapping: dict, timeout: int = None) -> int:
+    logger.info(
+        msg=StructuredMessage(
+            'Добавление данных в redis по ключам',
+            keys=list(mapping),
+        ),
+    )
+
+    try:
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key, data in mapping.items():
+                value = codec.encode(data=data)
+                if timeout is None:
+                    pipe.set(name=key, value=value)
+                else:
+                    pipe.setex(name=key, time=timeout, value=value)
+            pipe.execute()
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при добавлении данных в redis по ключам',
+                keys=list(mapping),
+                error=exc,
+            ),
+        )
+        return 500
+
+    logger.info(
+        msg=StructuredMessage(
+            'Успешно добавлены данные в redis по ключам',
+            keys=list(mapping),
+        ),
+    )
+    return 200
+
+
+def get_day_buckets(day_index: str, period: tuple) -> list:
+    '''
+    Получение ключей корзин по дням (UTC) для периода
+
+    Args:
+        day_index: префикс корзин
+        period: начало и конец периода (включительно)
+
+    Returns:
+        Список ключей {day_index}{день}
+    '''
+
+    period_from, period_to = period
+    first = math.floor(period_from.timestamp() / SECONDS_IN_DAY)
+    last = math.floor(period_to.timestamp() / SECONDS_IN_DAY)
+    return [f'{day_index}{day}' for day in range(first, last + 1)]
+
+
+def mget_values(keys: list) -> list:
+    '''
+    Получение значений существующих ключей частями по MGET_CHUNK
+
+    Args:
+        keys: ключи
+
+    Returns:
+        Список значений без декодирования, отсутствующие ключи пропускаются
+    '''
+
+    values = []
+    for i in range(0, len(keys), MGET_CHUNK):
+        values.extend(
+            value for value in redis_client.mget(keys[i:i + MGET_CHUNK])
+            if value is not None
+        )
+    return values
+
+
+def get_indexed(index: str) -> (int, list):
+    '''
+    Получение данных по индексу (sorted set ключей по времени истечения)
+
+    Просроченные ключи удаляются из индекса скриптом, значения живых
+    ключей читаются отдельным MGET: скрипт обращается только к ключам
+    из KEYS, как того требуют Redis Cluster и прокси
+
+    Args:
+        index: ключ индекса
+
+    Returns:
+        Код статуса и список данных
+    '''
+
+    logger.info(
+        msg=StructuredMessage(
+            'Получение данных из redis по индексу',
+            index=index,
+        ),
+    )
+
+    try:
+        keys = get_indexed_script(keys=[index], args=[time.time()])
+        values = mget_values(keys=keys)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при получении данных из redis по индексу',
+                index=index,
+                error=exc,
+            ),
+        )
+        return 500, []
+
+    logger.info(
+        msg=StructuredMessage(
+            'Успешно получены данные из redis по индексу',
+            index=index,
+            count=len(values),
+        ),
+    )
+    return 200, [redis_codec.decode(data=value) for value in values]
+
+
+def get_period_indexed(day_index: str, period: tuple) -> (int, list):
+    '''
+    Получение данных, чей период пересекается с периодом
+
+    Ключи с периодами хранятся в корзинах по дням (UTC) {day_index}{день},
+    поэтому читаются только корзины дней периода, а не все ключи.
+    Имена корзин вычисляются здесь и передаются скрипту в KEYS
+
+    Args:
+        day_index: префикс корзин по дням, переданный в acquire_period
+        period: начало и конец периода (включительно)
+
+    Returns:
+        Код статуса и список данных
+    '''
+
+    period_from, period_to = period
+    logger.info(
+        msg=StructuredMessage(
+            'Получение данных из redis по индексу на период',
+            index=day_index,
+            period_from=period_from,
+            period_to=period_to,
+        ),
+    )
+
+    args = [
+        time.time(),
+        period_from.timestamp(),
+        period_to.timestamp(),
+    ]
+    try:
+        keys = get_period_indexed_script(
+            keys=get_day_buckets(day_index=day_index, period=period),
+            args=args,
+        )
+        values = mget_values(keys=keys)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при получении данных из redis по индексу на период',
+                index=day_index,
+                period_from=period_from,
+                period_to=period_to,
+                error=exc,
+            ),
+        )
+        return 500, []
+
+    logger.info(
+        msg=StructuredMessage(
+            'Успешно получены данные из redis по индексу на период',
+            index=day_index,
+            period_from=period_from,
+            period_to=period_to,
+            count=len(values),
+        ),
+    )
+    return 200, [redis_codec.decode(data=value) for value in values]
+
+
+def acquire_period(key: str, data: Any, timeout: int, period: tuple,
+                   index: str, indexes: list = None, day_index: str = None) -> (int, bool):
+    '''
+    Атомарный захват периода, если он не пересекается с захваченными
+
+    Все ключи, включая корзины по дням, передаются скрипту в KEYS.
+    В Redis Cluster они должны попадать в один слот, поэтому ключ,
+    индексы и day_index нужно строить с общим hash tag, например
+    {temporary}temporary_area1
+
+    Args:
+        key: ключ данных
+        data: данные
+        timeout: время жизни в секундах
+        period: начало и конец периода (включительно)
+        index: индекс, в котором проверяется пересечение
+        indexes: дополнительные индексы ключа
+        day_index: префикс корзин по дням для get_period_indexed
+
+    Returns:
+        Код статуса и признак захвата
+    '''
+
+    period_from, period_to = period
+    logger.info(
+        msg=StructuredMessage(
+            'Захват периода в redis',
+            key=key,
+            index=index,
+            period_from=period_from,
+            period_to=period_to,
+        ),
+    )
+
+    buckets = get_day_buckets(day_index=day_index, period=period) if day_index else []
+    keys = [key, f'{index}_periods', index, *(indexes or []), *buckets]
+    args = [
+        time.time(),
+        timeout,
+        codec.encode(data=data),
+        period_from.timestamp(),
+        period_to.timestamp(),
+        len(buckets),
+    ]
+    try:
+        acquired = acquire_period_script(keys=keys, args=args)
+    except Exception as exc:
+        logger.error(
+            msg=StructuredMessage(
+                'Возникла ошибка при захвате периода в redis',
+                key=key,
+                index=index,
+                period_from=period_from,
+                period_to=period_to,
+                error=exc,
+            ),
+        )
+        return 500, False
+
+    if not acquired:
+        logger.warning(
+            msg=StructuredMessage(
+                'Период пересекается с существующими',
+                key=key,
+                index=index,
+                period_from=period_from,
+                period_to=period_to,
+            ),
+        )
+        return 200, False
+
+    logger.info(
+        msg=StructuredMessage(
+            'Успешно захвачен период в redis',
+            key=key,
+            index=index,
+            period_from=period_from,
+            period_to=period_to,
+        ),
     )
-    return 200, matching_keys
+    return 200, True
@@ -0,0 +1,170 @@
+'''
+Кодеки значений redis
+
+Значение в redis начинается с версионного префикса кодека, поэтому
+во время переключения REDIS_CODEC старые и новые значения читаются
+одновременно: decode выбирает кодек по префиксу, а не по настройке.
+Значения JSON хранятся без префикса, как до появления кодеков.
+'''
+import json
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from datetime import (
+    date,
+    datetime,
+)
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+EXT_DATETIME = 1
+EXT_DATE = 2
+EXT_DECIMAL = 3
+
+
+class Codec(ABC):
+    '''
+    Базовый кодек
+
+    Числа всегда записываются как JSON без префикса, чтобы с ключом
+    продолжали работать INCR и чтение через float()
+    '''
+
+    name = None
+    prefix = b''
+
+    def encode(self, data: Any) -> bytes:
+        if type(data) in (int, float):
+            return json.dumps(obj=data).encode()
+        return self.prefix + self.dumps(data=data)
+
+    @abstractmethod
+    def dumps(self, data: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        pass
+
+
+class JsonCodec(Codec):
+    '''
+    JSON, даты и Decimal записываются строками и обратно не разбираются
+    '''
+
+    name = 'json'
+
+    @staticmethod
+    def default(obj: Any) -> Any:
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        if isinstance(obj, Decimal):
+            return str(obj)
+        raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(obj=data, default=self.default).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(s=data)
+
+
+class MsgpackCodec(Codec):
+    '''
+    msgpack, datetime, date и Decimal восстанавливаются без разбора строк
+
+    Datetime с часовым поясом хранится как Timestamp и читается в UTC,
+    наивный datetime, date и Decimal - как extension types
+    '''
+
+    name = 'msgpack'
+    prefix = b'\x00mp1'
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImproperlyConfigured('Для кодека msgpack нужен пакет msgpack')
+
+    @staticmethod
+    def default(obj: Any) -> Any:
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+        if isinstance(obj, date):
+            return msgpack.ExtType(EXT_DATE, obj.isoformat().encode())
+        if isinstance(obj, Decimal):
+            return msgpack.ExtType(EXT_DECIMAL, str(obj).encode())
+        raise TypeError(f'Object of type {type(obj).__name__} is not msgpack serializable')
+
+    @staticmethod
+    def ext_hook(code: int, data: bytes) -> Any:
+        if code == EXT_DATETIME:
+            return datetime.fromisoformat(data.decode())
+        if code == EXT_DATE:
+            return date.fromisoformat(data.decode())
+        if code == EXT_DECIMAL:
+            return Decimal(data.decode())
+        return msgpack.ExtType(code, data)
+
+    def dumps(self, data: Any) -> bytes:
+        # datetime=True пакует только datetime с часовым поясом,
+        # наивные уходят в default
+        return msgpack.packb(
+            data,
+            default=self.default,
+            datetime=True,
+        )
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(
+            data,
+            ext_hook=self.ext_hook,
+            timestamp=3,
+        )
+
+
+CODECS = {
+    codec.name: codec
+    for codec in (JsonCodec, MsgpackCodec)
+}
+
+
+@lru_cache(maxsize=None)
+def get_codec(name: str) -> Codec:
+    '''
+    Получение кодека по названию
+
+    Args:
+        name: название кодека (json, msgpack)
+
+    Returns:
+        Экземпляр кодека
+    '''
+
+    if name not in CODECS:
+        raise ImproperlyConfigured(f'Неизвестный кодек redis: {name}')
+    return CODECS[name]()
+
+
+def decode(data: bytes) -> Any:
+    '''
+    Декодирование значения из redis по префиксу кодека
+
+    Args:
+        data: значение из redis
+
+    Returns:
+        Декодированные данные
+    '''
+
+    if data.startswith(MsgpackCodec.prefix):
+        return get_codec(name=MsgpackCodec.name).loads(data=data[len(MsgpackCodec.prefix):])
+    return get_codec(name=JsonCodec.name).loads(data=data)
@@ -1,3 +1,12 @@
+from typing import Any
+
+from django.utils.cache import get_conditional_response as get_not_modified_response
+from django.utils.http import (
+    http_date,
+    quote_etag,
+)
+
+
 status_messages = {
     200: 'Успешный успех',
     201: 'Создано',
@@ -7,9 +16,11 @@ status_messages = {
     403: 'Доступ запрещен',
     404: 'Не найдено',
     406: 'Учетные данные уже существуют',
+    409: 'Конфликт',
     410: 'Не существует',
     500: 'Ошибка сервера',
     501: 'Не поддерживается',
+    503: 'Сервис временно недоступен',
 }
 
 
@@ -42,3 +53,56 @@ def generate_response(status_code: int, data: dict | None = None) -> (int, dict)
             'data': data if data else {}
         }
     )
+
+
+def set_validators(response: Any, validators: dict) -> Any:
+    '''
+    Установка заголовков ETag и Last-Modified
+
+    Args:
+        response: ответ
+        validators: валидаторы ответа
+            {
+              "etag": "15-1721392810",
+              "last_modified": 1721392810.428
+            }
+
+    Returns:
+        Ответ с заголовками
+    '''
+
+    if validators.get('etag'):
+        response['ETag'] = quote_etag(validators['etag'])
+    if validators.get('last_modified'):
+        response['Last-Modified'] = http_date(int(validators['last_modified']))
+    return response
+
+
+def get_conditional_response(request: Any, validators: dict) -> Any | None:
+    '''
+    Проверка заголовков If-None-Match и If-Modified-Since
+
+    Args:
+        request: запрос
+        validators: валидаторы ответа
+
+    Returns:
+        Ответ 304 Not Modified или None, если клиенту нужны данные
+    '''
+
+    if not validators:
+        return None
+
+    etag = validators.get('etag')
+    last_modified = validators.get('last_modified')
+    response = get_not_modified_response(
+        request=request,
+        etag=quote_etag(etag) if etag else None,
+        last_modified=int(last_modified) if last_modified else None,
+    )
+    if response is None:
+        return None
+    return set_validators(
+        response=response,
+        validators=validators,
+    )
@@ -0,0 +1,300 @@
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import unittest
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from utils import logger
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.started = threading.Event()
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def emit(self, record):
+        self.started.set()
+        self.unblocked.wait(timeout=5)
+        self.records.append(record)
+
+
+def make_record(msg, **kwargs) -> logging.LogRecord:
+    return logging.makeLogRecord({
+        'name': 'test',
+        'levelno': logging.INFO,
+        'levelname': 'INFO',
+        'msg': msg,
+        'app': 'test',
+        'func_hierarchy': '',
+        **kwargs,
+    })
+
+
+class LogPipelineTest(SimpleTestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        self.pipeline = logger.LogPipeline(maxsize=1)
+        self.pipeline.targets.append(self.handler)
+        self.addCleanup(self.pipeline.stop)
+
+    def test_put(self):
+        self.assertIsNone(self.pipeline.listener)
+
+        self.pipeline.put(make_record(msg='first'))
+        self.assertIsNotNone(self.pipeline.listener)
+
+        self.pipeline.stop()
+        self.assertEqual([record.msg for record in self.handler.records], ['first'])
+
+    def test_put_full(self):
+        self.handler.unblocked.clear()
+        self.pipeline.put(make_record(msg='first'))
+        self.assertTrue(self.handler.started.wait(timeout=5))
+
+        self.pipeline.put(make_record(msg='second'))
+        self.pipeline.put(make_record(msg='third'))
+        self.assertEqual(self.pipeline.get_stats()['dropped'], 1)
+
+        self.handler.unblocked.set()
+        self.pipeline.stop()
+        self.assertEqual([record.msg for record in self.handler.records], ['first', 'second'])
+
+    def test_reset(self):
+        self.pipeline.put(make_record(msg='first'))
+        listener = self.pipeline.listener
+        self.pipeline.stop()
+
+        self.pipeline.reset()
+        self.assertIsNone(self.pipeline.listener)
+
+        self.pipeline.put(make_record(msg='second'))
+        self.assertIsNotNone(self.pipeline.listener)
+        self.assertIsNot(self.pipeline.listener, listener)
+        self.assertIs(self.pipeline.listener.queue, self.pipeline.queue)
+
+    def test_reset_after_fork(self):
+        queue = logger.pipeline.queue
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            reset = logger.pipeline.listener is None and logger.pipeline.queue is not queue
+            os.write(write_fd, b'1' if reset else b'0')
+            os._exit(0)
+
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_fd, 'rb') as file:
+            self.assertEqual(file.read(), b'1')
+
+
+    @unittest.skipUnless(importlib.util.find_spec('gevent'), 'gevent не установлен')
+    def test_listener_native_thread(self):
+        # Хаб в цикле спит без переключения гринлетов: запись дойдет
+        # до обработчика, только если слушатель работает в потоке ОС
+        code = textwrap.dedent('''
+            from gevent import monkey
+            monkey.patch_all()
+
+            import logging
+            from utils import logger
+
+            get_ident = logger.get_original('_thread', 'get_ident')
+            sleep = logger.get_original('time', 'sleep')
+            idents = []
+
+            class IdentHandler(logging.Handler):
+                def emit(self, record):
+                    idents.append(get_ident())
+
+            pipeline = logger.LogPipeline(maxsize=10)
+            pipeline.targets.append(IdentHandler())
+            pipeline.put(logging.makeLogRecord({'msg': 'test', 'levelno': logging.INFO}))
+            for _ in range(500):
+                if idents:
+                    break
+                sleep(0.01)
+
+            hub = get_ident()
+            pipeline.stop()
+            print(bool(idents) and idents[0] != hub)
+        ''')
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+        )
+        self.assertEqual(result.stdout.strip(), 'True', msg=result.stderr)
+
+
+class SharedTimedRotatingFileHandlerTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.filename = os.path.join(self.directory, 'test.log')
+
+    def get_handler(self) -> logger.SharedTimedRotatingFileHandler:
+        handler = logger.SharedTimedRotatingFileHandler(
+            self.filename,
+            when='midnight',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_rollover(self):
+        first = self.get_handler()
+        second = self.get_handler()
+        first.emit(make_record(msg='first'))
+        second.emit(make_record(msg='second'))
+
+        first.doRollover()
+        second.doRollover()
+        self.assertFalse(second.is_rotated())
+
+        first.emit(make_record(msg='third'))
+        second.emit(make_record(msg='fourth'))
+
+        archives = [name for name in os.listdir(self.directory) if name.startswith('test.log.')]
+        self.assertEqual(len(archives), 1)
+        with open(os.path.join(self.directory, archives[0])) as file:
+            self.assertEqual(file.read(), 'first\nsecond\n')
+        with open(self.filename) as file:
+            self.assertEqual(file.read(), 'third\nfourth\n')
+
+
+class StructuredMessageTest(SimpleTestCase):
+
+    def test_prepare(self):
+        handler = logger.LogQueueHandler(
+            pipeline=logger.LogPipeline(maxsize=1),
+            app='test',
+        )
+        data = {'areas': [1]}
+        message = logger.StructuredMessage(
+            'Площадки получены',
+            data=data,
+            period=(1, 2),
+            error=ValueError('Ошибка'),
+        )
+
+        record = handler.prepare(make_record(msg=message))
+        data['areas'].append(2)
+
+        self.assertIsNot(record.msg, message)
+        self.assertEqual(record.msg.fields, {
+            'data': {'areas': [1]},
+            'period': (1, 2),
+            'error': 'Ошибка',
+        })
+        self.assertEqual(str(record.msg), "Площадки получены data={'areas': [1]} period=(1, 2) error=Ошибка")
+
+
+class JsonFormatterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.formatter = logger.JsonFormatter()
+
+    def format(self, record: logging.LogRecord) -> dict:
+        return json.loads(self.formatter.format(record))
+
+    def test_format_structured(self):
+        message = logger.StructuredMessage(
+            'Площадка %s получена',
+            area_pk=1,
+            level='field',
+            error=ValueError('Ошибка'),
+        )
+
+        data = self.format(make_record(msg=message, args=('Test',)))
+        self.assertEqual(data['message'], 'Площадка Test получена')
+        self.assertEqual(data['area_pk'], 1)
+        self.assertEqual(data['level'], 'INFO')
+        self.assertEqual(data['error'], 'Ошибка')
+        self.assertEqual(data['logger'], 'test')
+
+    def test_format_message(self):
+        data = self.format(make_record(msg='Площадка %s получена', args=('Test',)))
+        self.assertEqual(data['message'], 'Площадка Test получена')
+        self.assertNotIn('exc_info', data)
+
+    def test_format_exception(self):
+        try:
+            raise ValueError('Ошибка')
+        except ValueError:
+            record = make_record(msg='Ошибка', exc_info=sys.exc_info())
+
+        data = self.format(record)
+        self.assertIn('ValueError: Ошибка', data['exc_info'])
+
+
+class SamplingFilterTest(SimpleTestCase):
+
+    def test_filter(self):
+        log_filter = logger.SamplingFilter(rates={'test': 0.25})
+        record = make_record(msg='Площадка получена', name='test.services')
+        passed = sum(log_filter.filter(record) for _ in range(10000))
+        self.assertAlmostEqual(passed / 10000, 0.25, delta=0.03)
+        self.assertEqual(log_filter.dropped, 10000 - passed)
+
+        self.assertTrue(log_filter.filter(make_record(msg='Площадка получена', name='other')))
+        warning = make_record(
+            msg='Площадка не найдена',
+            name='test.services',
+            levelno=logging.WARNING,
+        )
+        self.assertTrue(all(log_filter.filter(warning) for _ in range(100)))
+
+    def test_filter_threads(self):
+        log_filter = logger.SamplingFilter(rates={'test': 0})
+        record = make_record(msg='Площадка получена')
+
+        def run():
+            for _ in range(10000):
+                log_filter.filter(record)
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(log_filter.dropped, 80000)
+
+
+class RateLimitFilterTest(SimpleTestCase):
+
+    @patch('utils.logger.time.monotonic')
+    def test_filter(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        log_filter = logger.RateLimitFilter(limit=2, period=10)
+        record = make_record(msg='Площадка получена', pathname='services.py', lineno=1)
+        other = make_record(msg='Площадка получена', pathname='services.py', lineno=2)
+
+        self.assertEqual([log_filter.filter(record) for _ in range(5)], [True, True, False, False, False])
+        self.assertTrue(log_filter.filter(other))
+        self.assertEqual(log_filter.dropped, 3)
+
+        mock_monotonic.return_value = 109
+        self.assertFalse(log_filter.filter(record))
+
+        mock_monotonic.return_value = 110
+        self.assertTrue(log_filter.filter(record))
+
+        warning = make_record(msg='Площадка не найдена', levelno=logging.WARNING)
+        self.assertTrue(all(log_filter.filter(warning) for _ in range(10)))
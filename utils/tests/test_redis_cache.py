@@ -0,0 +1,355 @@
+import redis
+import time
+from datetime import (
+    datetime,
+    timezone,
+)
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from bookings.models import BookingSettings
+
+from utils import redis_cache
+
+
+class GetIndexedTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = 'test_index'
+        self.addCleanup(self.clear)
+
+    def clear(self):
+        keys = redis_cache.redis_client.zrange(self.index, 0, -1)
+        redis_cache.redis_client.delete(self.index, *keys)
+
+    def add(self, key: str, data: dict, expires_at: float):
+        redis_cache.redis_client.set(key, redis_cache.codec.encode(data=data))
+        redis_cache.redis_client.zadd(self.index, {key: expires_at})
+
+    def test_get_indexed(self):
+        now = time.time()
+        self.add(key='test_live', data={'id': 1}, expires_at=now + 60)
+        self.add(key='test_expired', data={'id': 2}, expires_at=now - 1)
+        redis_cache.redis_client.zadd(self.index, {'test_evicted': now + 60})
+
+        status_code, response_data = redis_cache.get_indexed(
+            index=self.index,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data, [{'id': 1}])
+        self.assertIsNone(redis_cache.redis_client.zscore(self.index, 'test_expired'))
+
+    def test_get_indexed_many(self):
+        expires_at = time.time() + 60
+        for i in range(2500):
+            self.add(key=f'test_{i}', data=i, expires_at=expires_at)
+
+        status_code, response_data = redis_cache.get_indexed(
+            index=self.index,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(sorted(response_data), list(range(2500)))
+
+    def test_get_indexed_empty(self):
+        status_code, response_data = redis_cache.get_indexed(
+            index=self.index,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data, [])
+
+
+class GetPeriodIndexedTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = 'test_area'
+        self.day_index = 'test_day'
+        self.addCleanup(self.clear)
+
+    def clear(self):
+        keys = redis_cache.redis_client.zrange(self.index, 0, -1)
+        buckets = redis_cache.redis_client.scan_iter(match=f'{self.day_index}*')
+        redis_cache.redis_client.delete(self.index, f'{self.index}_periods', *keys, *buckets)
+
+    def acquire(self, key: str, start: int, end: int):
+        period = (
+            datetime(2024, 8, start, 7, tzinfo=timezone.utc),
+            datetime(2024, 8, end, 7, tzinfo=timezone.utc),
+        )
+        status_code, acquired = redis_cache.acquire_period(
+            key=key,
+            data={'key': key},
+            timeout=60,
+            period=period,
+            index=self.index,
+            day_index=self.day_index,
+        )
+        self.assertTrue(acquired, msg=key)
+
+    def test_get_period_indexed(self):
+        self.acquire(key='test_first', start=1, end=3)
+        self.acquire(key='test_second', start=5, end=20)
+
+        fixtures = (
+            ((2, 2), {'test_first'}),
+            ((3, 5), {'test_first', 'test_second'}),
+            ((4, 4), set()),
+            ((10, 11), {'test_second'}),
+            ((21, 25), set()),
+        )
+
+        for (start, end), keys in fixtures:
+            status_code, response_data = redis_cache.get_period_indexed(
+                day_index=self.day_index,
+                period=(
+                    datetime(2024, 8, start, 7, tzinfo=timezone.utc),
+                    datetime(2024, 8, end, 7, tzinfo=timezone.utc),
+                ),
+            )
+            self.assertEqual(status_code, 200)
+            self.assertEqual(len(response_data), len(keys), msg=(start, end))
+            self.assertEqual({data['key'] for data in response_data}, keys, msg=(start, end))
+
+
+class BulkTest(SimpleTestCase):
+
+    def setUp(self):
+        self.keys = ['test_first', 'test_second', 'test_missing']
+        self.addCleanup(redis_cache.redis_client.delete, *self.keys)
+
+    def test_get_many(self):
+        status_code = redis_cache.set_many(
+            mapping={
+                'test_first': {'id': 1},
+                'test_second': [2],
+            },
+        )
+        self.assertEqual(status_code, 200)
+
+        status_code, response_data = redis_cache.get_many(
+            keys=['test_second', 'test_missing', 'test_first'],
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data[0], [2])
+        self.assertIs(response_data[1], redis_cache.MISSING)
+        self.assertEqual(response_data[2], {'id': 1})
+
+    def test_get_many_empty(self):
+        status_code, response_data = redis_cache.get_many(
+            keys=[],
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data, [])
+
+    def test_set_many_timeout(self):
+        redis_cache.set_many(
+            mapping={'test_first': 1},
+        )
+        redis_cache.set_many(
+            mapping={'test_second': 2},
+            timeout=60,
+        )
+        self.assertEqual(redis_cache.redis_client.ttl('test_first'), -1)
+        self.assertTrue(0 < redis_cache.redis_client.ttl('test_second') <= 60)
+
+
+class LocalCacheTest(SimpleTestCase):
+
+    def test_lru(self):
+        local_cache = redis_cache.LocalCache(maxsize=2, timeout=60)
+        local_cache.set(key='first', data=1)
+        local_cache.set(key='second', data=2)
+        self.assertEqual(local_cache.get(key='first'), 1)
+
+        local_cache.set(key='third', data=3)
+        self.assertIs(local_cache.get(key='second'), redis_cache.MISSING)
+        self.assertEqual(local_cache.get(key='first'), 1)
+        self.assertEqual(local_cache.get(key='third'), 3)
+
+    @patch('utils.redis_cache.time.monotonic')
+    def test_timeout(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        local_cache = redis_cache.LocalCache(maxsize=2, timeout=10)
+        local_cache.set(key='first', data=1)
+
+        mock_monotonic.return_value = 109
+        self.assertEqual(local_cache.get(key='first'), 1)
+
+        mock_monotonic.return_value = 110
+        self.assertIs(local_cache.get(key='first'), redis_cache.MISSING)
+        self.assertNotIn('first', local_cache.items)
+
+    def test_invalidate_local(self):
+        local_cache = redis_cache.LocalCache(maxsize=3, timeout=1)
+        local_cache.subscribe()
+        local_cache.set(key='test_probe', data=0)
+
+        def subscribed():
+            # Поток слушателя очищает кэш после подписки, поэтому
+            # пробный ключ исчезает, только когда поток уже слушает канал
+            redis_cache.redis_client.publish(redis_cache.INVALIDATE_CHANNEL, 'test_probe')
+            return local_cache.get(key='test_probe') is redis_cache.MISSING
+
+        self.wait(subscribed)
+
+        local_cache.set(key='test_local', data=1)
+        local_cache.set(key='test_other', data=2)
+        status_code = redis_cache.invalidate_local(key='test_local')
+        self.assertEqual(status_code, 200)
+
+        self.wait(lambda: local_cache.get(key='test_local') is redis_cache.MISSING)
+        self.assertEqual(local_cache.get(key='test_other'), 2)
+
+    def wait(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            time.sleep(0.02)
+        self.fail('Условие не выполнено за 2 секунды')
+
+
+class MockManager:
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_or_create(self, **kwargs):
+        self.calls += 1
+        return BookingSettings(pk=1, temporary_timeout=self.calls), True
+
+
+class MockModel:
+
+    def __init__(self):
+        self.objects = MockManager()
+
+
+class GetThroughTest(SimpleTestCase):
+
+    def setUp(self):
+        self.key = 'test_settings'
+        self.model = MockModel()
+        self.addCleanup(
+            redis_cache.redis_client.delete,
+            self.key,
+            f'{self.key}_stale',
+            f'{self.key}_delta',
+            f'{self.key}_lock',
+        )
+
+    def get(self) -> (int, dict):
+        return redis_cache.get(
+            key=self.key,
+            model=self.model,
+            timeout=60,
+            pk=1,
+        )
+
+    def test_get_missing(self):
+        status_code, response_data = redis_cache.get(
+            key=self.key,
+        )
+        self.assertEqual(status_code, 200)
+        self.assertIsNone(response_data)
+
+    def test_get_through(self):
+        status_code, response_data = self.get()
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data['temporary_timeout'], 1)
+        self.assertIsNotNone(redis_cache.redis_client.get(f'{self.key}_stale'))
+        self.assertIsNotNone(redis_cache.redis_client.get(f'{self.key}_delta'))
+        self.assertIsNone(redis_cache.redis_client.get(f'{self.key}_lock'))
+
+        status_code, response_data = self.get()
+        self.assertEqual(response_data['temporary_timeout'], 1)
+        self.assertEqual(self.model.objects.calls, 1)
+
+    def test_get_through_stale(self):
+        self.get()
+        redis_cache.redis_client.delete(self.key)
+        status_code, token = redis_cache.acquire_lock(key=f'{self.key}_lock')
+        self.assertIsNotNone(token)
+
+        status_code, response_data = self.get()
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data['temporary_timeout'], 1)
+        self.assertEqual(self.model.objects.calls, 1)
+
+    def test_lock(self):
+        key = f'{self.key}_lock'
+        status_code, token = redis_cache.acquire_lock(key=key)
+        self.assertEqual(status_code, 200)
+        self.assertIsNotNone(token)
+        self.assertTrue(0 < redis_cache.redis_client.ttl(key) <= redis_cache.LOCK_TIMEOUT)
+
+        status_code, other_token = redis_cache.acquire_lock(key=key)
+        self.assertEqual(status_code, 200)
+        self.assertIsNone(other_token)
+
+        redis_cache.release_lock(key=key, token='other')
+        self.assertIsNotNone(redis_cache.redis_client.get(key))
+
+        redis_cache.release_lock(key=key, token=token)
+        self.assertIsNone(redis_cache.redis_client.get(key))
+
+    @patch('utils.redis_cache.random.random')
+    def test_should_refresh(self, mock_random):
+        mock_random.return_value = 0.5
+        self.assertFalse(redis_cache.should_refresh(ttl=-2, delta=b'0.2'))
+        self.assertFalse(redis_cache.should_refresh(ttl=100, delta=None))
+        # -0.2 * ln(0.5) ~ 0.139 с
+        self.assertTrue(redis_cache.should_refresh(ttl=100, delta=b'0.2'))
+        self.assertFalse(redis_cache.should_refresh(ttl=200, delta=b'0.2'))
+
+        mock_random.return_value = 0.0
+        self.assertFalse(redis_cache.should_refresh(ttl=100, delta=b'0.2'))
+
+    @patch('utils.redis_cache.should_refresh')
+    def test_get_through_refresh(self, mock_should_refresh):
+        mock_should_refresh.return_value = True
+        self.get()
+
+        status_code, response_data = self.get()
+        self.assertEqual(response_data['temporary_timeout'], 2)
+        self.assertEqual(self.model.objects.calls, 2)
+
+    def test_set_through(self):
+        self.get()
+        status_code = redis_cache.set_through(
+            key=self.key,
+            data={'temporary_timeout': 10},
+            timeout=60,
+        )
+        self.assertEqual(status_code, 200)
+        redis_cache.redis_client.delete(self.key)
+        redis_cache.acquire_lock(key=f'{self.key}_lock')
+
+        status_code, response_data = self.get()
+        self.assertEqual(response_data, {'temporary_timeout': 10})
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def test_exhausted(self):
+        connection_pool = redis_cache.redis_client.connection_pool
+        pool = redis_cache.StatsBlockingConnectionPool(
+            max_connections=1,
+            timeout=0.05,
+            connection_class=connection_pool.connection_class,
+            **connection_pool.connection_kwargs,
+        )
+        self.addCleanup(pool.disconnect)
+
+        connection = pool.get_connection('GET')
+        self.assertEqual(pool.get_created(), 1)
+        self.assertEqual(pool.get_in_use(), 1)
+
+        with self.assertRaises(redis.ConnectionError):
+            pool.get_connection('GET')
+        self.assertEqual(pool.exhausted, 1)
+
+        pool.release(connection)
+        self.assertEqual(pool.get_in_use(), 0)
+        pool.release(pool.get_connection('GET'))
+        self.assertEqual(pool.get_created(), 1)
+        self.assertEqual(pool.exhausted, 1)